@@ -0,0 +1,122 @@
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from .helpers import gather_bounded
+
+OPERATIONS = ['copy', 'move', 'delete']
+
+
+def _parse(op):
+    """Return `(operation, index, destination, scope)` for an operation."""
+    op = tuple(op)
+    if not op or op[0] not in OPERATIONS:
+        raise AlgoliaException('Unknown index operation: %r' % (op,))
+    if op[0] == 'delete' and len(op) == 2:
+        return op[0], op[1], None, None
+    if op[0] == 'copy' and len(op) in (3, 4):
+        return op[0], op[1], op[2], op[3] if len(op) == 4 else None
+    if op[0] == 'move' and len(op) == 3:
+        return op[0], op[1], op[2], None
+    raise AlgoliaException('Invalid index operation: %r' % (op,))
+
+
+class IndexOperations(object):
+    """
+    Copy, move and delete many indices.
+
+    Operations are `('copy', src, dst)`, `('copy', src, dst, scope)`,
+    `('move', src, dst)` or `('delete', name)` tuples. Up to `concurrency` of
+    them are sent at a time, and with `wait` their tasks are waited for
+    together. An operation on an index already used by a previous one only
+    starts once the previous one is done (published with `wait`), so that
+    `[('copy', 'a', 'b'), ('delete', 'a')]` does what it says.
+
+    A failed operation does not stop the others, but those depending on it
+    are skipped. `run` returns a result per operation, in order, with its
+    `taskID` and `error` (None when it succeeded).
+    """
+
+    def __init__(self, client, concurrency=8, wait=True, loop=None):
+        self.client = client
+        self.concurrency = concurrency
+        self.wait = wait
+        self.loop = loop or asyncio.get_event_loop()
+
+    @asyncio.coroutine
+    def run(self, operations):
+        ops = [_parse(op) for op in operations]
+        sem = asyncio.Semaphore(self.concurrency, loop=self.loop)
+        last = {}
+        tasks = []
+        for op in ops:
+            names = [n for n in op[1:3] if n is not None]
+            after = [last[n] for n in names if n in last]
+            task = asyncio.ensure_future(self._run(op, after, sem),
+                                         loop=self.loop)
+            for name in names:
+                last[name] = task
+            tasks.append(task)
+        return (yield from asyncio.gather(*tasks, loop=self.loop))
+
+    @asyncio.coroutine
+    def _run(self, op, after, sem):
+        operation, index, destination, scope = op
+        res = {'operation': operation, 'index': index,
+               'destination': destination, 'taskID': None, 'error': None}
+        if after:
+            previous = yield from asyncio.gather(*after, loop=self.loop)
+            failed = [p for p in previous if p['error'] is not None]
+            if failed:
+                res['error'] = AlgoliaException(
+                    'Skipped after the failed %s of %s'
+                    % (failed[0]['operation'], failed[0]['index']))
+                return res
+
+        try:
+            yield from sem.acquire()
+            try:
+                answer = yield from self._send(operation, index, destination,
+                                               scope)
+            finally:
+                sem.release()
+            res['taskID'] = answer['taskID']
+            if self.wait:
+                yield from self.client.init_index(index).wait_task_async(
+                    answer['taskID'])
+        except Exception as e:
+            res['error'] = e
+        return res
+
+    @asyncio.coroutine
+    def _send(self, operation, index, destination, scope):
+        if operation == 'copy':
+            return (yield from self.client.copy_index_async(
+                index, destination, scope=scope))
+        if operation == 'move':
+            return (yield from self.client.move_index_async(index,
+                                                            destination))
+        return (yield from self.client.delete_index_async(index))
+
+
+@asyncio.coroutine
+def list_all_indexes(client, hits_per_page=100, concurrency=4,
+                     request_options=None):
+    """
+    List the indices of an application by pages of `hits_per_page`, fetching
+    up to `concurrency` pages at a time once the first one tells their number.
+    """
+    @asyncio.coroutine
+    def page(n):
+        return (yield from client._base._req(
+            True, '/1/indexes', 'GET', request_options,
+            {'page': n, 'hitsPerPage': hits_per_page}))
+
+    first = yield from page(0)
+    nb_pages = first.get('nbPages', 1)
+    pages = yield from gather_bounded([page(n) for n in range(1, nb_pages)],
+                                      concurrency)
+    items = list(first['items'])
+    for res in pages:
+        items.extend(res['items'])
+    return {'items': items, 'nbPages': nb_pages}
@@ -0,0 +1,339 @@
+from collections import OrderedDict
+
+import asyncio
+
+from .helpers import chunks
+from .transport import api_error
+
+# Largest number of objects fetched by a single `get_objects` call.
+MAX_BATCH_SIZE = 1000
+
+# Write methods modifying the settings or synonyms of an index.
+CONFIG_WRITE_METHODS = [
+    'batch_synonyms',
+    'clear_synonyms',
+    'copy_synonyms',
+    'delete_synonym',
+    'save_synonym',
+    'set_settings',
+]
+
+# Write methods modifying the rules of an index.
+RULES_WRITE_METHODS = [
+    'batch_rules',
+    'clear_rules',
+    'copy_rules',
+    'delete_rule',
+]
+
+
+def _arg(args, kwargs, i, name):
+    if len(args) > i:
+        return args[i]
+    return kwargs.get(name)
+
+
+def written_object_ids(method, args, kwargs):
+    """
+    Return the objectIDs an index write method called with `args` and
+    `kwargs` modifies, or None when it may modify any object.
+    """
+    if method in ('save_object', 'partial_update_object'):
+        return [_arg(args, kwargs, 0, 'obj' if method == 'save_object'
+                     else 'partial_object').get('objectID')]
+    if method == 'add_object':
+        content = _arg(args, kwargs, 0, 'content')
+        return [_arg(args, kwargs, 1, 'object_id') or content.get('objectID')]
+    if method in ('add_objects', 'save_objects', 'partial_update_objects'):
+        return [o.get('objectID') for o in _arg(args, kwargs, 0, 'objects')]
+    if method == 'delete_object':
+        return [_arg(args, kwargs, 0, 'object_id')]
+    if method == 'delete_objects':
+        return list(_arg(args, kwargs, 0, 'objects'))
+    if method == 'batch':
+        requests = _arg(args, kwargs, 0, 'requests')
+        if isinstance(requests, dict):
+            requests = requests['requests']
+        ids = []
+        for req in requests:
+            if 'objectID' in req:
+                ids.append(req['objectID'])
+            elif 'objectID' in req.get('body', {}):
+                ids.append(req['body']['objectID'])
+            elif req.get('action') != 'addObject':
+                return None
+        return ids
+    return None
+
+
+class ObjectCache(object):
+    """
+    Cache of the objects of an index read with `get_object(s)_async`.
+
+    Objects are fresh for `ttl` seconds. For `stale_ttl` more seconds they
+    are still returned, a refresh being fetched in the background. Missing
+    objects are remembered for `negative_ttl` seconds. Lookups missing the
+    cache within `window` seconds of each other are fetched together with a
+    single `get_objects` call. Writes made through the index invalidate the
+    objects they modify once acknowledged; as the indexing itself is
+    asynchronous, a read made before the task is published may still cache
+    the previous version.
+    """
+
+    def __init__(self, index, ttl=60, stale_ttl=300, negative_ttl=10,
+                 window=0.002, max_size=10000, loop=None):
+        self.index = index
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.window = window
+        self.max_size = max_size
+        self.loop = loop or asyncio.get_event_loop()
+        self.stats = {'hits': 0, 'negative_hits': 0, 'stale_hits': 0,
+                      'misses': 0, 'fetches': 0}
+
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._flush_handle = None
+        self._versions = {}
+        self._epoch = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @asyncio.coroutine
+    def get(self, object_id):
+        """Return a copy of an object, like `get_object`."""
+        value = yield from self._lookup(str(object_id))
+        if value is None:
+            raise api_error(404, 'ObjectID does not exist')
+        return dict(value)
+
+    @asyncio.coroutine
+    def get_many(self, object_ids):
+        """Return copies of several objects, like `get_objects`."""
+        values = yield from asyncio.gather(
+            *[self._lookup(str(i)) for i in object_ids], loop=self.loop)
+        return {'results': [None if v is None else dict(v) for v in values]}
+
+    def invalidate(self, object_ids=None):
+        """Forget the given objects, or all of them."""
+        if object_ids is None:
+            self._entries.clear()
+            self._epoch += 1
+            return
+        for object_id in object_ids:
+            key = str(object_id)
+            self._entries.pop(key, None)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def on_write(self, method, args, kwargs, res):
+        if method not in CONFIG_WRITE_METHODS + RULES_WRITE_METHODS:
+            self.invalidate(written_object_ids(method, args, kwargs))
+
+    @asyncio.coroutine
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = self.loop.time() - fetched_at
+            if value is None:
+                if age < self.negative_ttl:
+                    self.stats['negative_hits'] += 1
+                    return None
+            elif age < self.ttl:
+                self.stats['hits'] += 1
+                self._entries.move_to_end(key)
+                return value
+            elif age < self.ttl + self.stale_ttl:
+                self.stats['stale_hits'] += 1
+                self._fetch(key)
+                return value
+
+        self.stats['misses'] += 1
+        # Several lookups may wait on the same fetch, do not let the
+        # cancellation of one of them cancel it.
+        return (yield from asyncio.shield(self._fetch(key), loop=self.loop))
+
+    def _fetch(self, key):
+        if key in self._pending:
+            return self._pending[key]
+
+        fut = asyncio.Future(loop=self.loop)
+        # Background refreshes are never awaited, retrieve their errors.
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._pending[key] = fut
+        if self._flush_handle is None:
+            self._flush_handle = self.loop.call_later(self.window, self._flush)
+        return fut
+
+    def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for keys in chunks(pending, MAX_BATCH_SIZE):
+            asyncio.ensure_future(
+                self._load(keys, [pending[k] for k in keys]), loop=self.loop)
+
+    @asyncio.coroutine
+    def _load(self, keys, futures):
+        epoch = self._epoch
+        versions = [self._versions.get(k, 0) for k in keys]
+        self.stats['fetches'] += 1
+        try:
+            res = yield from self.index._base.get_objects(keys)
+        except Exception as e:
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        now = self.loop.time()
+        for key, version, fut, value in zip(keys, versions, futures,
+                                            res['results']):
+            # Drop the answers of fetches overtaken by a write.
+            if epoch == self._epoch and version == self._versions.get(key, 0):
+                self._store(key, value, now)
+            if not fut.done():
+                fut.set_result(value)
+
+    def _store(self, key, value, now):
+        self._entries[key] = (value, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class SettingsCache(object):
+    """
+    Snapshot of the settings and synonyms of an index.
+
+    The snapshot is loaded on first use and refreshed in the background once
+    older than `interval` seconds, readers getting the previous snapshot in
+    the meantime; concurrent refreshes share a single pair of requests.
+    Settings and synonyms written through the index are applied to the
+    snapshot right away, which is refreshed again once the write's task is
+    published.
+    """
+
+    def __init__(self, index, interval=60, loop=None):
+        self.index = index
+        self.interval = interval
+        self.loop = loop or asyncio.get_event_loop()
+        self.settings = None
+        self.synonyms = None
+        self.refreshed_at = None
+        self.stats = {'hits': 0, 'refreshes': 0}
+
+        self._refreshing = None
+        self._version = 0
+        self._started_at = None
+
+    @asyncio.coroutine
+    def get_settings(self):
+        yield from self._ensure_loaded()
+        return dict(self.settings)
+
+    @asyncio.coroutine
+    def get_synonyms(self):
+        """Return the list of the synonyms of the index."""
+        yield from self._ensure_loaded()
+        return [dict(s) for s in self.synonyms.values()]
+
+    @asyncio.coroutine
+    def search_synonyms(self, page=0, hits_per_page=100):
+        """Answer a `search_synonyms` call without query nor types."""
+        synonyms = yield from self.get_synonyms()
+        synonyms.sort(key=lambda s: s['objectID'])
+        start = page * hits_per_page
+        return {'hits': synonyms[start:start + hits_per_page],
+                'nbHits': len(synonyms)}
+
+    def refresh(self):
+        """Start a refresh unless one is running, and return it."""
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._refresh(),
+                                                     loop=self.loop)
+            # Background refreshes are never awaited, retrieve their errors.
+            self._refreshing.add_done_callback(
+                lambda f: f.cancelled() or f.exception())
+        return self._refreshing
+
+    def on_write(self, method, args, kwargs, res):
+        if method not in CONFIG_WRITE_METHODS:
+            return
+        self._version += 1
+        if self.settings is not None:
+            self._apply(method, args, kwargs)
+        task_id = res.get('taskID') if isinstance(res, dict) else None
+        refresh = asyncio.ensure_future(self._refresh_after(task_id),
+                                        loop=self.loop)
+        refresh.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    @asyncio.coroutine
+    def _ensure_loaded(self):
+        if self.settings is None:
+            yield from asyncio.shield(self.refresh(), loop=self.loop)
+            return
+        self.stats['hits'] += 1
+        if self.loop.time() - self.refreshed_at >= self.interval:
+            self.refresh()
+
+    @asyncio.coroutine
+    def _refresh(self):
+        try:
+            version = self._version
+            started_at = self.loop.time()
+            self.stats['refreshes'] += 1
+            settings, synonyms = yield from asyncio.gather(
+                self.index._base.get_settings(), self._load_synonyms(),
+                loop=self.loop)
+            # Drop snapshots overtaken by a write, a refresh follows it.
+            if version == self._version or self.settings is None:
+                self.settings = settings
+                self.synonyms = synonyms
+                self.refreshed_at = self.loop.time()
+                self._started_at = started_at
+        finally:
+            self._refreshing = None
+
+    @asyncio.coroutine
+    def _load_synonyms(self):
+        synonyms = {}
+        page = 0
+        while True:
+            res = yield from self.index._base.search_synonyms(
+                '', page=page, hits_per_page=1000)
+            for hit in res['hits']:
+                hit.pop('_highlightResult', None)
+                synonyms[hit['objectID']] = hit
+            if len(res['hits']) < 1000:
+                return synonyms
+            page += 1
+
+    @asyncio.coroutine
+    def _refresh_after(self, task_id):
+        if task_id is not None:
+            yield from self.index.wait_task_async(task_id)
+        published_at = self.loop.time()
+        if self._refreshing is not None:
+            yield from asyncio.shield(self._refreshing, loop=self.loop)
+        # Writes published together share the first refresh following them.
+        if self._started_at is None or self._started_at < published_at:
+            yield from self.refresh()
+
+    def _apply(self, method, args, kwargs):
+        if method == 'set_settings':
+            self.settings.update(_arg(args, kwargs, 0, 'settings'))
+        elif method == 'save_synonym':
+            object_id = _arg(args, kwargs, 1, 'object_id')
+            content = _arg(args, kwargs, 0, 'content')
+            self.synonyms[object_id] = dict(content, objectID=object_id)
+        elif method == 'batch_synonyms':
+            if _arg(args, kwargs, 2, 'replace_existing_synonyms'):
+                self.synonyms = {}
+            for synonym in _arg(args, kwargs, 0, 'synonyms'):
+                self.synonyms[synonym['objectID']] = dict(synonym)
+        elif method == 'delete_synonym':
+            self.synonyms.pop(_arg(args, kwargs, 0, 'object_id'), None)
+        elif method == 'clear_synonyms':
+            self.synonyms = {}
@@ -0,0 +1,111 @@
+import collections
+import time
+
+from algoliasearch.helpers import AlgoliaException
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenException(AlgoliaException):
+    """Raised without any request when the circuits of all hosts are open."""
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker of a host for one kind of operation.
+
+    The circuit opens after `failures` consecutive failures, or when at
+    least `min_requests` of the last `window` requests were made and
+    `error_rate` of them failed. Requests are then refused for
+    `reset_timeout` seconds, after which a single probe request is let
+    through: the circuit closes if it succeeds and opens again otherwise.
+
+    `allow` returns a token to give back to `success`, `failure` or `cancel`
+    with the outcome of the request, so that the outcome of a request sent
+    before the probe does not decide it.
+    """
+
+    def __init__(self, key, failures=5, error_rate=0.5, window=20,
+                 min_requests=10, reset_timeout=30):
+        self.key = key
+        self.failures = failures
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.reset_timeout = reset_timeout
+
+        self.state = CLOSED
+        self.opened_at = None
+        self.consecutive_failures = 0
+        self.trips = 0
+        self._outcomes = collections.deque(maxlen=window)
+        # Token of the probe in flight.
+        self._probe = None
+
+    def allow(self):
+        """
+        Return a token when a request may be sent, starting probes, and False
+        otherwise.
+        """
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and \
+                time.time() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and self._probe is None:
+            self._probe = object()
+            return self._probe
+        return False
+
+    def _end_probe(self, token):
+        """Return whether `token` is the one of the probe, ending it."""
+        if token is None or token is not self._probe:
+            return False
+        self._probe = None
+        return True
+
+    def success(self, token=None):
+        self._outcomes.append(True)
+        self.consecutive_failures = 0
+        # Only the probe closes the circuit, not requests sent before it
+        # opened.
+        if self._end_probe(token) and self.state == HALF_OPEN:
+            self.state = CLOSED
+            self._outcomes.clear()
+
+    def failure(self, token=None):
+        self._outcomes.append(False)
+        self.consecutive_failures += 1
+        probe = self._end_probe(token)
+        if (probe and self.state == HALF_OPEN) or self._should_trip():
+            self._trip()
+
+    def cancel(self, token=None):
+        """Forget a request which was cancelled before completing."""
+        self._end_probe(token)
+
+    def _should_trip(self):
+        if self.state != CLOSED:
+            return False
+        if self.consecutive_failures >= self.failures:
+            return True
+        if len(self._outcomes) < self.min_requests:
+            return False
+        failed = len([o for o in self._outcomes if not o])
+        return failed >= self.error_rate * len(self._outcomes)
+
+    def _trip(self):
+        self.state = OPEN
+        self.opened_at = time.time()
+        self.trips += 1
+
+    def to_dict(self):
+        host, kind = self.key
+        return {
+            'host': host,
+            'kind': kind,
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'trips': self.trips,
+        }
@@ -17,7 +17,6 @@ CLIENT_ASYNC_METHODS = [
     'delete_user_key',
     'get_logs',
     'get_user_key_acl',
-    'list_indexes',
     'list_user_keys',
     'move_index',
     'multiple_queries',
@@ -33,8 +32,15 @@ CLIENT_FORWARD_METHODS = [
 
 
 class ClientAsync(object):
-    def __init__(self, app_id, api_key, hosts_array=None, http_search=False):
-        t = Transport(http_search)
+    def __init__(self, app_id, api_key, hosts_array=None, http_search=False,
+                 http2=False, transport=None):
+        if transport is not None:
+            t = transport
+        elif http2:
+            from .http2 import Http2Transport
+            t = Http2Transport(http_search)
+        else:
+            t = Transport(http_search)
         self._base = Client(app_id, api_key, hosts_array, t)
         t.headers['User-Agent'] += USER_AGENT
 
@@ -45,20 +51,113 @@ class ClientAsync(object):
         for method in CLIENT_FORWARD_METHODS:
             setattr(self, method, gen_forward(self, method))
 
+        for method in ['list_indexes', 'index_operations']:
+            setattr(self, method, gen_sync(self, method))
+
     def init_index(self, name):
         return IndexAsync(self._base, name)
 
+    @asyncio.coroutine
+    def list_indexes_async(self, request_options=None, hits_per_page=None,
+                           concurrency=4):
+        """
+        List the indices. With `hits_per_page`, they are listed by pages of
+        that size, `concurrency` pages at a time.
+        """
+        if hits_per_page is None:
+            return (yield from self._base.list_indexes(request_options))
+        from .admin import list_all_indexes
+        return (yield from list_all_indexes(self, hits_per_page, concurrency,
+                                            request_options))
+
+    @asyncio.coroutine
+    def index_operations_async(self, operations, concurrency=8, wait=True):
+        """
+        Run many copies, moves and deletions of indices concurrently, see
+        `admin.IndexOperations`, returning a result per operation.
+        """
+        from .admin import IndexOperations
+        return (yield from IndexOperations(self, concurrency, wait).run(
+            operations))
+
     def set_extra_headers(self, **kwargs):
         hstr = {k: str(v) for k, v in kwargs.items()}
         self._base._transport.headers.update(hstr)
 
+    def enable_scheduler(self, limits=None, total=None):
+        """
+        Queue requests by class and priority with a `RequestScheduler`, see
+        `scheduler.DEFAULT_LIMITS` for the classes and their budgets.
+        """
+        from .scheduler import RequestScheduler
+        transport = self._base._transport
+        if transport.scheduler is None:
+            transport.scheduler = RequestScheduler(limits, total)
+        return transport.scheduler
+
+    def enable_circuit_breaker(self, **kwargs):
+        """
+        Skip the hosts failing repeatedly for reads or writes, raising a
+        `CircuitOpenException` when all of them are, see
+        `circuit.CircuitBreaker` for the options.
+        """
+        self._base._transport.circuit_breaker = kwargs
+
+    def enable_profiling(self, **kwargs):
+        """
+        Time the phases of each request and detect the loop being blocked
+        with a `Profiler` built with `kwargs`. Enable it before the first
+        request to split the connection times out of the server times.
+        """
+        from .profiler import Profiler
+        transport = self._base._transport
+        if transport.profiler is None:
+            transport.profiler = Profiler(**kwargs)
+        return transport.profiler
+
+    def tail_logs(self, type='all', since=None, **kwargs):
+        """
+        Return a `LogTailer` iterating over the log entries of `type` as
+        they are written.
+        """
+        from .logs import LogTailer
+        return LogTailer(self, type, since, **kwargs)
+
+    def set_regions(self, regions, local=None, write_hosts=None,
+                    callback=None):
+        """
+        Route reads to the hosts of the `local` region, failing over to the
+        nearest other region, with a `RegionRouter`. `write_hosts` replaces
+        the hosts writes are sent to, the primary's.
+        """
+        from .regions import RegionRouter
+        transport = self._base._transport
+        if transport.regions is not None:
+            transport.listeners.remove(transport.regions.observe)
+        transport.regions = RegionRouter(regions, local, callback)
+        transport.listeners.append(transport.regions.observe)
+        if write_hosts is not None:
+            transport.write_hosts = write_hosts
+        return transport.regions
+
+    def circuit_states(self):
+        return self._base._transport.circuit_states()
+
+    def host_ranking(self, is_search=True):
+        return self._base._transport.host_ranking(is_search)
+
     @asyncio.coroutine
     def set_conn_timeout(self, t):
         yield from self._base._transport.set_conn_timeout(t)
 
     @asyncio.coroutine
     def close(self):
-        yield from self._base._transport.close()
+        transport = self._base._transport
+        while getattr(transport, 'closables', None):
+            yield from transport.closables.pop().close()
+        if getattr(transport, 'profiler', None) is not None:
+            transport.profiler.close()
+        yield from transport.close()
 
     @asyncio.coroutine
     def __aenter__(self):
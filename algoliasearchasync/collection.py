@@ -0,0 +1,293 @@
+import json
+import random
+import string
+import time
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException, safe
+
+from .export import _dumps, read_records
+from .helpers import BatchReader, throughput
+
+KINDS = ['synonyms', 'rules']
+
+# Largest page size of the synonyms and rules search endpoints.
+PAGE_SIZE = 1000
+
+
+def chunks_by_size(items, max_items, max_bytes):
+    """
+    Split `items` into lists of at most `max_items` elements whose JSON
+    encoding takes at most `max_bytes`, unless a single element is larger.
+    """
+    chunk, size = [], 0
+    for item in items:
+        item_size = len(_dumps(item).encode('utf-8')) + 1
+        if chunk and (len(chunk) == max_items or size + item_size > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(item)
+        size += item_size
+    if chunk:
+        yield chunk
+
+
+def _clean(item):
+    return {k: v for k, v in item.items() if k != '_highlightResult'}
+
+
+def _replica_name(replica):
+    """Return the index name of an entry of the `replicas` setting."""
+    if replica.startswith('virtual(') and replica.endswith(')'):
+        return replica[len('virtual('):-1]
+    return replica
+
+
+def _canonical(item):
+    return json.dumps(item, sort_keys=True)
+
+
+class CollectionTransfer(object):
+    """
+    Export and import the synonyms or the rules of an index as NDJSON.
+
+    Exports fetch pages of `PAGE_SIZE` items with up to `concurrency` pages
+    in flight. Imports send batches of at most `batch_size` items and
+    `max_bytes` bytes, `concurrency` of them at a time. With `diff`, the
+    current items are exported first and only the new or modified ones are
+    sent.
+    """
+
+    def __init__(self, index, kind, concurrency=4, batch_size=1000,
+                 max_bytes=1000000, forward_to_replicas=False):
+        if kind not in KINDS:
+            raise AlgoliaException('Unknown collection: %s' % kind)
+
+        self.index = index
+        self.kind = kind
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.forward_to_replicas = forward_to_replicas
+
+    @asyncio.coroutine
+    def _req(self, is_search, path, meth, params=None, data=None):
+        return (yield from self.index._base._req(
+            is_search, '/%s%s' % (self.kind, path), meth, None, params, data))
+
+    @asyncio.coroutine
+    def _write(self, action, args, path, meth, params, data=None):
+        res = yield from self._req(False, path, meth, params, data)
+        # Named like the index methods, e.g. `batch_rules` or
+        # `delete_synonym`.
+        kind = self.kind[:-1] if action == 'delete' else self.kind
+        self.index._written('%s_%s' % (action, kind), args, {}, res)
+        return res['taskID']
+
+    @asyncio.coroutine
+    def _page(self, page):
+        res = yield from self._req(True, '/search', 'POST', data={
+            'query': '', 'page': page, 'hitsPerPage': PAGE_SIZE})
+        return [_clean(h) for h in res['hits']], res['nbHits']
+
+    @asyncio.coroutine
+    def iter_pages_async(self, callback):
+        """Call `callback` with each page of items, in order."""
+        items, nb_hits = yield from self._page(0)
+        callback(items)
+        nb_pages = (nb_hits + PAGE_SIZE - 1) // PAGE_SIZE
+
+        pending = {}
+        sem = asyncio.Semaphore(self.concurrency)
+
+        @asyncio.coroutine
+        def fetch(page):
+            try:
+                return (yield from self._page(page))[0]
+            finally:
+                sem.release()
+
+        next_page = 1
+        try:
+            for page in range(1, nb_pages):
+                yield from sem.acquire()
+                pending[page] = asyncio.ensure_future(fetch(page))
+                # Hand the pages over in order as soon as possible.
+                while next_page in pending and pending[next_page].done():
+                    callback(pending.pop(next_page).result())
+                    next_page += 1
+            while next_page < nb_pages:
+                callback((yield from pending.pop(next_page)))
+                next_page += 1
+        finally:
+            for fut in pending.values():
+                fut.cancel()
+
+    @asyncio.coroutine
+    def fetch_all_async(self):
+        """Return the items of the collection by objectID."""
+        items = {}
+
+        def add(page):
+            for item in page:
+                items[item['objectID']] = item
+
+        yield from self.iter_pages_async(add)
+        return items
+
+    @asyncio.coroutine
+    def export_async(self, path):
+        """Write the items of the collection to `path`, one per line."""
+        start = time.time()
+        stats = {'exported': 0}
+        f = open(path, 'w', encoding='utf-8')
+
+        def write(page):
+            f.write(''.join(_dumps(item) + '\n' for item in page))
+            stats['exported'] += len(page)
+
+        try:
+            yield from self.iter_pages_async(write)
+        finally:
+            f.close()
+
+        stats['elapsed'] = time.time() - start
+        return stats
+
+    @asyncio.coroutine
+    def import_async(self, source, diff=False, replace=False,
+                     delete_missing=False, wait=False):
+        """
+        Save the items of `source`, an NDJSON file, an iterable or an
+        asynchronous iterable.
+
+        Batches are sent as `source` is read, which is read no further
+        than `concurrency` batches ahead of the API. `replace` uploads the
+        items to a temporary index whose collection is then copied over the
+        one of this index, and of its replicas with `forward_to_replicas`,
+        so that it is never incomplete. `delete_missing`, only allowed with
+        `diff`, deletes the items absent from `source` instead.
+        """
+        if delete_missing and not diff:
+            raise AlgoliaException('delete_missing requires diff')
+        if diff and replace:
+            raise AlgoliaException('diff and replace are exclusive')
+        if isinstance(source, str):
+            source = read_records(source)
+        if replace:
+            return (yield from self._replace(source))
+
+        start = time.time()
+        params = {'forwardToReplicas': self.forward_to_replicas}
+        current = (yield from self.fetch_all_async()) if diff else None
+        task_ids = []
+
+        sends = []
+        sem = asyncio.Semaphore(self.concurrency)
+
+        @asyncio.coroutine
+        def send(action, args, path, meth, data=None):
+            try:
+                return (yield from self._write(action, args, path, meth,
+                                               params, data))
+            finally:
+                sem.release()
+
+        @asyncio.coroutine
+        def submit(*args):
+            yield from sem.acquire()
+            # Stop reading once a write failed.
+            for fut in sends:
+                if fut.done():
+                    fut.result()
+            sends.append(asyncio.ensure_future(send(*args)))
+
+        reader = BatchReader(source)
+        pending, seen = [], set()
+        uploaded, unchanged, batches = 0, 0, 0
+        try:
+            while True:
+                batch = yield from reader.read(self.batch_size)
+                for item in batch:
+                    if 'objectID' not in item:
+                        raise AlgoliaException('Items must have an objectID')
+                    item = _clean(item)
+                    if delete_missing:
+                        seen.add(item['objectID'])
+                    old = current.get(item['objectID']) if diff else None
+                    if old is not None and \
+                            _canonical(old) == _canonical(item):
+                        unchanged += 1
+                        continue
+                    pending.append(item)
+
+                chunks = list(chunks_by_size(pending, self.batch_size,
+                                             self.max_bytes))
+                # Keep the last chunk until the next items fill it up.
+                pending = chunks.pop() if batch and chunks else []
+                for chunk in chunks:
+                    uploaded += len(chunk)
+                    batches += 1
+                    yield from submit('batch', (chunk,), '/batch', 'POST',
+                                      chunk)
+                if not batch:
+                    break
+
+            deleted = sorted(set(current) - seen) if delete_missing else []
+            for object_id in deleted:
+                yield from submit('delete', (object_id,),
+                                  '/%s' % safe(object_id), 'DELETE')
+            task_ids += yield from asyncio.gather(*sends)
+        finally:
+            for fut in sends:
+                fut.cancel()
+
+        if wait:
+            yield from asyncio.gather(
+                *[self.index.wait_task_async(t) for t in set(task_ids)])
+
+        elapsed = time.time() - start
+        return {
+            'uploaded': uploaded,
+            'unchanged': unchanged,
+            'deleted': len(deleted),
+            'batches': batches,
+            'elapsed': elapsed,
+            'items_per_second': throughput(uploaded, elapsed),
+            'taskIDs': task_ids,
+        }
+
+    @asyncio.coroutine
+    def _replace(self, source):
+        from .index import IndexAsync
+
+        base = self.index._base
+        client = base.client
+        suffix = ''.join(random.choice(string.ascii_letters) for _ in range(10))
+        tmp_name = '%s_tmp_%s' % (base.index_name, suffix)
+        tmp = CollectionTransfer(IndexAsync(client, tmp_name), self.kind,
+                                 self.concurrency, self.batch_size,
+                                 self.max_bytes)
+        try:
+            stats = yield from tmp.import_async(source, wait=True)
+            names = [base.index_name]
+            if self.forward_to_replicas:
+                settings = yield from base.get_settings()
+                names += [_replica_name(r)
+                          for r in settings.get('replicas') or []]
+            copies = yield from asyncio.gather(*[
+                client.copy_index(tmp_name, name, scope=[self.kind])
+                for name in names])
+            yield from asyncio.gather(
+                *[tmp.index.wait_task_async(c['taskID']) for c in copies])
+            # The copies are published, hooks need not wait for them.
+            self.index._written('copy_%s' % self.kind, (tmp_name,), {}, {})
+        finally:
+            try:
+                yield from client.delete_index(tmp_name)
+            except Exception:
+                pass
+
+        stats['taskIDs'] = stats['taskIDs'] + [c['taskID'] for c in copies]
+        return stats
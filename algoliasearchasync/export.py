@@ -0,0 +1,198 @@
+import gzip
+import json
+import os
+import time
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException, CustomJSONEncoder
+
+FORMATS = ['ndjson', 'ndjson.gz', 'columnar']
+
+
+def _dumps(obj):
+    return json.dumps(obj, cls=CustomJSONEncoder, separators=(',', ':'))
+
+
+def encode_ndjson(hits):
+    return ''.join(_dumps(h) + '\n' for h in hits).encode('utf-8')
+
+
+def encode_columnar(hits):
+    """Encode a page of hits as a single block of columns."""
+    columns = {}
+    missing = {}
+    for i, hit in enumerate(hits):
+        for k in hit:
+            if k not in columns:
+                columns[k] = [None] * i
+                missing[k] = list(range(i))
+        for k, column in columns.items():
+            if k in hit:
+                column.append(hit[k])
+            else:
+                column.append(None)
+                missing[k].append(i)
+
+    block = {'n': len(hits), 'columns': columns,
+             'missing': {k: v for k, v in missing.items() if v}}
+    return (_dumps(block) + '\n').encode('utf-8')
+
+
+def decode_columnar(line):
+    block = json.loads(line)
+    hits = [{} for _ in range(block['n'])]
+    for k, column in block['columns'].items():
+        skip = set(block['missing'].get(k, []))
+        for i, value in enumerate(column):
+            if i not in skip:
+                hits[i][k] = value
+    return hits
+
+
+ENCODERS = {
+    'ndjson': encode_ndjson,
+    'ndjson.gz': lambda hits: gzip.compress(encode_ndjson(hits)),
+    'columnar': lambda hits: gzip.compress(encode_columnar(hits)),
+}
+
+
+def read_records(path, format='ndjson'):
+    """Iterate over the records of a file written by `IndexExporter`."""
+    if format not in FORMATS:
+        raise AlgoliaException('Unknown export format: %s' % format)
+
+    opener = open if format == 'ndjson' else gzip.open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if format == 'columnar':
+                for hit in decode_columnar(line):
+                    yield hit
+            else:
+                yield json.loads(line)
+
+
+class IndexExporter(object):
+    """
+    Stream the content of an index to a file.
+
+    Pages are fetched with `browse_from` and handed to a writer through a
+    queue of at most `queue_size` pages, encoding and disk writes happening in
+    an executor so that they overlap with the network. When `checkpoint` is
+    given, the browse cursor and the output size are saved there after each
+    page and an interrupted export resumes from them.
+    """
+
+    def __init__(self, index, path, format='ndjson', params=None,
+                 checkpoint=None, queue_size=8, loop=None):
+        if format not in FORMATS:
+            raise AlgoliaException('Unknown export format: %s' % format)
+
+        self.index = index
+        self.path = path
+        self.format = format
+        self.params = params
+        self.checkpoint = checkpoint
+        self.queue_size = queue_size
+        self.loop = loop or asyncio.get_event_loop()
+
+    def load_checkpoint(self):
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return None
+        with open(self.checkpoint) as f:
+            return json.load(f)
+
+    def save_checkpoint(self, state):
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.checkpoint)
+
+    @asyncio.coroutine
+    def run_async(self):
+        state = self.load_checkpoint()
+        if state is None:
+            state = {'cursor': None, 'objects': 0, 'pages': 0, 'bytes': 0,
+                     'done': False}
+        if state['done']:
+            return state
+
+        # Drop anything written after the last checkpoint.
+        f = open(self.path, 'ab')
+        f.truncate(state['bytes'])
+
+        queue = asyncio.Queue(maxsize=self.queue_size, loop=self.loop)
+        writer = asyncio.ensure_future(self._write(f, queue, state),
+                                       loop=self.loop)
+        start = time.time()
+        try:
+            cursor = state['cursor']
+            while not writer.done():
+                params = None if cursor else self.params
+                answer = yield from self.index.browse_from_async(params,
+                                                                 cursor)
+                cursor = answer.get('cursor')
+                yield from self._put(queue, (answer['hits'], cursor), writer)
+                if not cursor:
+                    break
+            yield from self._put(queue, None, writer)
+            yield from writer
+        finally:
+            writer.cancel()
+            try:
+                yield from writer
+            except asyncio.CancelledError:
+                pass
+            f.close()
+
+        state['elapsed'] = time.time() - start
+        return state
+
+    @asyncio.coroutine
+    def _put(self, queue, item, writer):
+        # Do not wait on a full queue forever if the writer died.
+        put = asyncio.ensure_future(queue.put(item), loop=self.loop)
+        yield from asyncio.wait([put, writer], loop=self.loop,
+                                return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            yield from writer
+
+    @asyncio.coroutine
+    def _in_executor(self, func, *args):
+        fut = self.loop.run_in_executor(None, func, *args)
+        try:
+            return (yield from asyncio.shield(fut, loop=self.loop))
+        except asyncio.CancelledError:
+            # The thread cannot be interrupted, let it finish before the
+            # caller closes the file it uses.
+            yield from asyncio.wait([fut], loop=self.loop)
+            raise
+
+    @asyncio.coroutine
+    def _write(self, f, queue, state):
+        encode = ENCODERS[self.format]
+
+        def write(hits):
+            data = encode(hits)
+            f.write(data)
+            f.flush()
+            return len(data)
+
+        while True:
+            item = yield from queue.get()
+            if item is None:
+                return
+            hits, cursor = item
+            if hits:
+                size = yield from self._in_executor(write, hits)
+                state['bytes'] += size
+            state['objects'] += len(hits)
+            state['pages'] += 1
+            state['cursor'] = cursor
+            state['done'] = not cursor
+            if self.checkpoint is not None:
+                yield from self._in_executor(self.save_checkpoint,
+                                             dict(state))
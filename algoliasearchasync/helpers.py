@@ -10,6 +10,19 @@ def gen_async(s, method):
     return asyncio.coroutine(async_)
 
 
+def gen_write_async(s, method):
+    """Like `gen_async`, notifying `s` of the write once acknowledged."""
+    m = getattr(s._base, method)
+
+    @asyncio.coroutine
+    def async_(*args, **kwargs):
+        res = yield from m(*args, **kwargs)
+        s._written(method, args, kwargs, res)
+        return res
+
+    return async_
+
+
 def gen_sync(s, method):
     m = getattr(s, method + '_async')
 
@@ -30,3 +43,96 @@ def gen_forward(s, method):
         return m(*args, **kwargs)
 
     return forward
+
+
+def throughput(count, elapsed):
+    """Return `count` per second, 0 when no time elapsed."""
+    return count / elapsed if elapsed > 0 else 0.0
+
+
+def percentile(values, p):
+    """Return the `p`th percentile of `values` (nearest rank)."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(round(p / 100.0 * (len(values) - 1)))
+    return values[rank]
+
+
+def chunks(iterable, size):
+    """Yield lists of at most `size` elements from `iterable`."""
+    chunk = []
+    for elt in iterable:
+        chunk.append(elt)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@asyncio.coroutine
+def gather_bounded(coros, limit):
+    """
+    Like `asyncio.gather` with at most `limit` coroutines in flight. They are
+    taken from `coros`, which may be a generator, as others complete. Once
+    one failed no more are started, and the error is raised when the
+    running ones are done.
+    """
+    sem = asyncio.Semaphore(limit)
+    tasks = []
+    failed = []
+
+    @asyncio.coroutine
+    def bounded(coro):
+        try:
+            return (yield from coro)
+        except Exception:
+            failed.append(True)
+            raise
+        finally:
+            sem.release()
+
+    it = iter(coros)
+    for coro in it:
+        yield from sem.acquire()
+        if failed:
+            coro.close()
+            # Do not create the remaining coroutines of a generator.
+            if it is not coros:
+                for coro in it:
+                    coro.close()
+            break
+        tasks.append(asyncio.ensure_future(bounded(coro)))
+    if tasks:
+        yield from asyncio.wait(tasks)
+    return (yield from asyncio.gather(*tasks))
+
+
+class BatchReader(object):
+    """Read lists of elements from an iterable or an asynchronous iterable."""
+
+    def __init__(self, source):
+        self._async = hasattr(source, '__aiter__')
+        self._source = source
+        self._it = None if self._async else iter(source)
+
+    @asyncio.coroutine
+    def read(self, size):
+        """Return at most `size` elements, an empty list once exhausted."""
+        if self._it is None:
+            it = self._source.__aiter__()
+            if asyncio.iscoroutine(it):
+                it = yield from it
+            self._it = it
+
+        batch = []
+        while len(batch) < size:
+            try:
+                if self._async:
+                    batch.append((yield from self._it.__anext__()))
+                else:
+                    batch.append(next(self._it))
+            except (StopIteration, StopAsyncIteration):
+                break
+        return batch
@@ -0,0 +1,84 @@
+import time
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from .transport import BaseTransport, api_error
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class Http2Transport(BaseTransport):
+    """
+    Transport multiplexing requests over HTTP/2 connections with `httpx`.
+
+    Hosts given with an explicit `http://` scheme are reached over cleartext
+    HTTP/2 with prior knowledge. `max_connections` caps the connections
+    opened to all the hosts together, concurrent requests to a host sharing
+    one of them. Retries and host selection are inherited from
+    `BaseTransport`, only the HTTP exchange differs.
+    """
+
+    def __init__(self, http_search, max_connections=10):
+        if httpx is None:
+            raise AlgoliaException(
+                'HTTP/2 support requires httpx: pip install httpx[http2]')
+        self.max_connections = max_connections
+        self.cleartext_session = None
+        super(Http2Transport, self).__init__(http_search)
+
+    def _init_session(self):
+        limits = httpx.Limits(max_connections=self.max_connections)
+        timeout = httpx.Timeout(None, connect=self.conn_timeout)
+        # HTTP/2 is negotiated with TLS, cleartext hosts need a distinct
+        # client using it with prior knowledge.
+        self.session = httpx.AsyncClient(http2=True, limits=limits,
+                                         timeout=timeout)
+        self.cleartext_session = httpx.AsyncClient(
+            http1=False, http2=True, limits=limits, timeout=timeout)
+
+    @asyncio.coroutine
+    def set_conn_timeout(self, t):
+        self._conn_timeout = t
+        if self.session is None:
+            return
+        self.session.timeout = httpx.Timeout(None, connect=t)
+        self.cleartext_session.timeout = httpx.Timeout(None, connect=t)
+
+    @asyncio.coroutine
+    def close(self):
+        for session in (self.session, self.cleartext_session):
+            if session is not None and not session.is_closed:
+                yield from session.aclose()
+
+    @asyncio.coroutine
+    def _send(self, url, meth, params, data, headers, timeout,
+              conn_timeout):
+        """Perform a request with httpx's AsyncClient."""
+        if url.startswith('http://'):
+            session = self.cleartext_session
+        else:
+            session = self.session
+        start = time.perf_counter()
+        res = yield from asyncio.wait_for(session.request(
+            meth, url, params=params, content=data, headers=headers,
+            timeout=httpx.Timeout(None, connect=conn_timeout)),
+            timeout)
+        # httpx reads the whole answer, connection setup included.
+        self._profile('server', start)
+        if res.status_code // 100 == 2:
+            start = time.perf_counter()
+            data = res.json()
+            self._profile('decode', start)
+            return data
+        elif res.status_code // 100 == 4:
+            message = 'HTTP Code: %d' % res.status_code
+            try:
+                message = res.json()['message']
+            finally:
+                raise api_error(res.status_code, message)
+        res.raise_for_status()
@@ -0,0 +1,138 @@
+import json
+import os
+import time
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from .export import read_records
+from .helpers import BatchReader, throughput
+
+
+class BulkImporter(object):
+    """
+    Import records in batches, recording acknowledged batches in a checkpoint.
+
+    Every batch acknowledged by the API is appended to the `checkpoint` file
+    along with its taskID. When the import is started again with the same
+    source, acknowledged batches are skipped and the ones that were in flight
+    are sent again, which is safe since records are saved by objectID.
+    """
+
+    def __init__(self, index, checkpoint, batch_size=1000, concurrency=4,
+                 progress=None, loop=None):
+        self.index = index
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.progress = progress
+        self.loop = loop or asyncio.get_event_loop()
+
+    def load_checkpoint(self):
+        """Return the taskIDs of the acknowledged batches by offset."""
+        done = {}
+        if not os.path.exists(self.checkpoint):
+            return done
+
+        with open(self.checkpoint) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Line truncated by a crash.
+                    continue
+                if 'batch_size' in entry:
+                    if entry['batch_size'] != self.batch_size:
+                        raise AlgoliaException(
+                            'Checkpoint was created with a batch size of %d'
+                            % entry['batch_size'])
+                else:
+                    done[entry['offset']] = entry['taskID']
+        return done
+
+    @asyncio.coroutine
+    def run_async(self, source, format='ndjson', wait=False):
+        """
+        Import `source`, a path to a file written in `format` (see
+        `read_records`), an iterable or an asynchronous iterable of records.
+        """
+        if isinstance(source, str):
+            source = read_records(source, format)
+
+        done = self.load_checkpoint()
+        new_checkpoint = not os.path.exists(self.checkpoint)
+        log = open(self.checkpoint, 'a')
+        if new_checkpoint:
+            log.write(json.dumps({'batch_size': self.batch_size}) + '\n')
+            log.flush()
+
+        reader = BatchReader(source)
+        sem = asyncio.Semaphore(self.concurrency, loop=self.loop)
+        pending = set()
+        start = time.time()
+        stats = {'objects': 0, 'batches': 0, 'skipped': 0, 'elapsed': 0,
+                 'objects_per_second': 0}
+
+        @asyncio.coroutine
+        def send(offset, batch):
+            try:
+                res = yield from self.index.batch_async({'requests': [{
+                    'action': 'updateObject',
+                    'objectID': obj['objectID'],
+                    'body': obj,
+                } for obj in batch]})
+            finally:
+                sem.release()
+
+            done[offset] = res['taskID']
+            log.write(json.dumps({'offset': offset, 'count': len(batch),
+                                  'taskID': res['taskID']}) + '\n')
+            log.flush()
+
+            stats['objects'] += len(batch)
+            stats['batches'] += 1
+            stats['elapsed'] = time.time() - start
+            stats['objects_per_second'] = throughput(stats['objects'],
+                                                     stats['elapsed'])
+            if self.progress is not None:
+                self.progress(dict(stats))
+
+        try:
+            offset = 0
+            while True:
+                batch = yield from reader.read(self.batch_size)
+                if not batch:
+                    break
+                if offset in done:
+                    stats['skipped'] += 1
+                    offset += len(batch)
+                    continue
+                for obj in batch:
+                    if 'objectID' not in obj:
+                        raise AlgoliaException('Records must have an objectID')
+
+                yield from sem.acquire()
+                for task in [t for t in pending if t.done()]:
+                    pending.discard(task)
+                    task.result()
+                pending.add(asyncio.ensure_future(send(offset, batch),
+                                                  loop=self.loop))
+                offset += len(batch)
+
+            yield from asyncio.gather(*pending, loop=self.loop)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+        finally:
+            log.close()
+
+        if wait:
+            yield from asyncio.gather(
+                *[self.index.wait_task_async(t) for t in set(done.values())],
+                loop=self.loop)
+
+        stats['elapsed'] = time.time() - start
+        stats['taskIDs'] = sorted(set(done.values()))
+        return stats
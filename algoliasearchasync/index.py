@@ -1,6 +1,13 @@
+import random
+import string
+import time
+
 import asyncio
 
-from .helpers import gen_async, gen_sync
+from algoliasearch.helpers import AlgoliaException
+
+from .helpers import (chunks, gather_bounded, gen_async, gen_sync,
+                      gen_write_async, throughput)
 
 INDEX_ASYNC_METHODS = [
     'add_object',
@@ -14,9 +21,6 @@ INDEX_ASYNC_METHODS = [
     'delete_objects',
     'delete_synonym',
     'delete_user_key',
-    'get_object',
-    'get_objects',
-    'get_settings',
     'get_synonym',
     'get_user_key_acl',
     'list_user_keys',
@@ -25,14 +29,31 @@ INDEX_ASYNC_METHODS = [
     'save_object',
     'save_objects',
     'save_synonym',
-    'search',
     'search_for_facet_values',
-    'search_synonyms',
     'set_settings',
     'update_user_key',
     'browse_from',
 ]
 
+# Methods notifying the write hooks of the index once acknowledged.
+INDEX_WRITE_METHODS = [
+    'add_object',
+    'add_objects',
+    'batch',
+    'batch_synonyms',
+    'clear_index',
+    'clear_synonyms',
+    'delete_object',
+    'delete_objects',
+    'delete_synonym',
+    'partial_update_object',
+    'partial_update_objects',
+    'save_object',
+    'save_objects',
+    'save_synonym',
+    'set_settings',
+]
+
 class AsyncIndexIterator:
     def __init__(self, index, params=None):
         if params is None:
@@ -70,15 +91,240 @@ class AsyncIndexIterator:
         self.cursor = self.answer.get('cursor', None)
 
 
+class SearchPagesIterator:
+    """
+    Iterate over the hits of every page of a search.
+
+    Once the first page tells the number of pages, up to `prefetch` of the
+    following pages are fetched concurrently; hits are still returned in
+    order. `close` cancels the fetches in flight when iteration stops early.
+    """
+
+    def __init__(self, index, query, params=None, prefetch=4, max_pages=None,
+                 loop=None):
+        self.index = index
+        self.query = query
+        self.params = {} if params is None else dict(params)
+        self.prefetch = max(1, prefetch)
+        self.max_pages = max_pages
+        self.loop = loop or asyncio.get_event_loop()
+        self.answer = None
+        self.hits = []
+        self.pos = 0
+        self.pending = []
+        self.next_page = self.params.get('page', 0)
+        self.last_page = None
+
+    @asyncio.coroutine
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        while self.pos >= len(self.hits):
+            yield from self._load_next_page()
+        self.pos += 1
+        return self.hits[self.pos - 1]
+
+    def close(self):
+        """Stop the iteration, cancelling the pages being fetched."""
+        for fut in self.pending:
+            fut.cancel()
+        self.pending = []
+        self.hits = []
+        self.last_page = self.next_page - 1
+
+    @property
+    def nb_hits(self):
+        return None if self.answer is None else self.answer.get('nbHits')
+
+    @property
+    def nb_pages(self):
+        return None if self.answer is None else self.answer.get('nbPages')
+
+    def _fetch(self, page):
+        params = dict(self.params, page=page)
+        return asyncio.ensure_future(
+            self.index.search_async(self.query, params), loop=self.loop)
+
+    def _schedule(self):
+        while (len(self.pending) < self.prefetch and
+               self.next_page <= self.last_page):
+            self.pending.append(self._fetch(self.next_page))
+            self.next_page += 1
+
+    @asyncio.coroutine
+    def _load_next_page(self):
+        if self.last_page is None:
+            fut = self._fetch(self.next_page)
+            self.next_page += 1
+        elif self.pending:
+            fut = self.pending.pop(0)
+        else:
+            raise StopAsyncIteration
+
+        try:
+            answer = yield from fut
+        except BaseException:
+            self.close()
+            raise
+
+        if self.last_page is None:
+            self.last_page = answer.get('nbPages', 1) - 1
+            if self.max_pages is not None:
+                self.last_page = min(self.last_page,
+                                     self.next_page - 2 + self.max_pages)
+        self.answer = answer
+        self.hits = answer['hits']
+        self.pos = 0
+        self._schedule()
+
+
 class IndexAsync:
     def __init__(self, client, name):
         self._base = client.init_index(name)
+        self.object_cache = None
+        self.settings_cache = None
+        self.snapshot = None
+        self._write_hooks = []
 
         for method in INDEX_ASYNC_METHODS:
-            setattr(self, method + '_async', gen_async(self, method))
+            if method in INDEX_WRITE_METHODS:
+                setattr(self, method + '_async', gen_write_async(self, method))
+            else:
+                setattr(self, method + '_async', gen_async(self, method))
             setattr(self, method, gen_sync(self, method))
 
+        setattr(self, 'search', gen_sync(self, 'search'))
+        setattr(self, 'get_object', gen_sync(self, 'get_object'))
+        setattr(self, 'get_objects', gen_sync(self, 'get_objects'))
+        setattr(self, 'get_settings', gen_sync(self, 'get_settings'))
+        setattr(self, 'search_synonyms', gen_sync(self, 'search_synonyms'))
         setattr(self, 'wait_task', gen_sync(self, 'wait_task'))
+        setattr(self, 'replace_all_objects',
+                gen_sync(self, 'replace_all_objects'))
+        setattr(self, 'export', gen_sync(self, 'export'))
+        setattr(self, 'import_objects', gen_sync(self, 'import_objects'))
+        setattr(self, 'save_objects_adaptive',
+                gen_sync(self, 'save_objects_adaptive'))
+        for kind in ('synonyms', 'rules'):
+            setattr(self, 'export_' + kind, gen_sync(self, 'export_' + kind))
+            setattr(self, 'import_' + kind, gen_sync(self, 'import_' + kind))
+        setattr(self, 'search_disjunctive_faceting',
+                gen_sync(self, 'search_disjunctive_faceting'))
+
+    def search_pages(self, query, params=None, prefetch=4, max_pages=None):
+        """
+        Return an asynchronous iterator over the hits of all the pages of a
+        search, fetching up to `prefetch` pages concurrently.
+        """
+        return SearchPagesIterator(self, query, params, prefetch, max_pages)
+
+    def add_write_hook(self, hook):
+        """
+        Call `hook(method, args, kwargs, res)` after each acknowledged write
+        made through this index, `res` being the answer of the API.
+        """
+        self._write_hooks.append(hook)
+
+    def _written(self, method, args, kwargs, res):
+        for hook in self._write_hooks:
+            hook(method, args, kwargs, res)
+
+    def enable_object_cache(self, **kwargs):
+        """
+        Serve `get_object(s)_async` from an `ObjectCache` built with `kwargs`.
+        """
+        from .cache import ObjectCache
+        if self.object_cache is None:
+            self.object_cache = ObjectCache(self, **kwargs)
+            self.add_write_hook(self.object_cache.on_write)
+        return self.object_cache
+
+    def enable_settings_cache(self, interval=60):
+        """
+        Serve `get_settings_async` and `search_synonyms_async` from a
+        `SettingsCache` refreshed every `interval` seconds.
+        """
+        from .cache import SettingsCache
+        if self.settings_cache is None:
+            self.settings_cache = SettingsCache(self, interval)
+            self.add_write_hook(self.settings_cache.on_write)
+        return self.settings_cache
+
+    def enable_snapshot(self, interval=300, **kwargs):
+        """
+        Answer `search_async` and `get_object_async` from a `LocalSnapshot`
+        of the index, reloaded every `interval` seconds, when no host can be
+        reached. Meant for small indices.
+        """
+        from .snapshot import LocalSnapshot
+        if self.snapshot is None:
+            self.snapshot = LocalSnapshot(self, interval, **kwargs)
+            self.snapshot.start()
+        return self.snapshot
+
+    @asyncio.coroutine
+    def search_async(self, query, args=None, request_options=None):
+        try:
+            return (yield from self._base.search(
+                query, None if args is None else dict(args),
+                request_options))
+        except Exception as e:
+            res = self._from_snapshot(e, 'search', query, args)
+            if res is None:
+                raise
+            return res
+
+    def _from_snapshot(self, error, method, *args):
+        """Answer a read from the snapshot if no host could, or None."""
+        if self.snapshot is None:
+            return None
+        from .snapshot import UNREACHABLE
+        if not isinstance(error, UNREACHABLE):
+            return None
+        return getattr(self.snapshot, method)(*args)
+
+    @asyncio.coroutine
+    def get_settings_async(self, request_options=None):
+        if self.settings_cache is None or request_options is not None:
+            return (yield from self._base.get_settings(request_options))
+        return (yield from self.settings_cache.get_settings())
+
+    @asyncio.coroutine
+    def search_synonyms_async(self, query, types=[], page=0,
+                              hits_per_page=100, request_options=None):
+        if (self.settings_cache is None or query or types or
+                request_options is not None):
+            return (yield from self._base.search_synonyms(
+                query, types, page, hits_per_page, request_options))
+        return (yield from self.settings_cache.search_synonyms(
+            page, hits_per_page))
+
+    @asyncio.coroutine
+    def get_object_async(self, object_id, attributes_to_retrieve=None,
+                         request_options=None):
+        try:
+            if (self.object_cache is None or attributes_to_retrieve or
+                    request_options is not None):
+                return (yield from self._base.get_object(
+                    object_id, attributes_to_retrieve, request_options))
+            return (yield from self.object_cache.get(object_id))
+        except Exception as e:
+            res = self._from_snapshot(e, 'get_object', object_id,
+                                      attributes_to_retrieve)
+            if res is None:
+                raise
+            return res
+
+    @asyncio.coroutine
+    def get_objects_async(self, object_ids, attributes_to_retrieve=None,
+                          request_options=None):
+        if (self.object_cache is None or attributes_to_retrieve or
+                request_options is not None):
+            return (yield from self._base.get_objects(
+                object_ids, attributes_to_retrieve, request_options))
+        return (yield from self.object_cache.get_many(object_ids))
 
     @asyncio.coroutine
     def wait_task_async(self, task_id, time_before_retry=100):
@@ -113,5 +359,212 @@ class IndexAsync:
 
         return (yield from self.delete_objects_async(ids))
 
+    @asyncio.coroutine
+    def search_disjunctive_faceting_async(self, query, disjunctive_facets,
+                                          params=None, refinements=None,
+                                          request_options=None):
+        """
+        Perform a search with disjunctive facets, sending the main query and
+        one query per disjunctive facet in a single `multiple_queries` call.
+        """
+        params = {} if params is None else dict(params)
+        refinements = {} if refinements is None else refinements
+
+        if not isinstance(disjunctive_facets, (str, list)):
+            raise AlgoliaException(
+                'Argument \'disjunctive_facets\' must be a String or an Array')
+        if not isinstance(refinements, dict):
+            raise AlgoliaException(
+                'Argument \'refinements\' must be a Hash of Arrays')
+
+        if isinstance(disjunctive_facets, str):
+            disjunctive_facets = disjunctive_facets.split(',')
+
+        # Refinements of a disjunctive facet are ORed, the others ANDed.
+        refined = {}
+        for key, values in refinements.items():
+            filters = ['%s:%s' % (key, v) for v in values]
+            refined[key] = [filters] if key in disjunctive_facets else filters
+
+        def facet_filters(excluded=None):
+            filters = []
+            for key in refinements:
+                if key != excluded:
+                    filters += refined[key]
+            return filters
+
+        queries = [dict(params, indexName=self._base.index_name, query=query,
+                        facetFilters=facet_filters())]
+        for facet in disjunctive_facets:
+            queries.append(dict(
+                params, indexName=self._base.index_name, query=query,
+                page=0, hitsPerPage=0, attributesToRetrieve=[],
+                attributesToHighlight=[], attributesToSnippet=[],
+                analytics=False, facets=facet,
+                facetFilters=facet_filters(facet)))
+
+        answers = yield from self._base.client.multiple_queries(
+            queries, request_options=request_options)
+        results = answers['results']
+
+        answer = results[0]
+        answer['disjunctiveFacets'] = {}
+        for facet, res in zip(disjunctive_facets, results[1:]):
+            counts = res.get('facets', {}).get(facet, {})
+            for value in refinements.get(facet, []):
+                counts.setdefault(value, 0)
+            if counts:
+                answer['disjunctiveFacets'][facet] = counts
+        return answer
+
     def browse_all_async(self, params=None):
         return AsyncIndexIterator(self, params=params)
+
+    @asyncio.coroutine
+    def export_async(self, path, format='ndjson', params=None,
+                     checkpoint=None, queue_size=8):
+        """
+        Export the content of the index to `path`.
+
+        `format` is one of 'ndjson', 'ndjson.gz' or 'columnar'. If a
+        `checkpoint` file is given, an interrupted export started with the
+        same arguments resumes where it stopped.
+        """
+        from .export import IndexExporter
+        exporter = IndexExporter(self, path, format, params, checkpoint,
+                                 queue_size)
+        return (yield from exporter.run_async())
+
+    @asyncio.coroutine
+    def replace_all_objects_async(self, objects, chunk_size=1000,
+                                  concurrency=4, progress=None):
+        """
+        Replace the content of the index without any downtime.
+
+        Settings, synonyms and rules are copied to a temporary index, then
+        the objects, read from `objects` as they are sent, are loaded into it
+        by chunks of `chunk_size` with at most `concurrency` batches in
+        flight, and once every task is published the temporary index is
+        moved over this one. The temporary index is
+        deleted if anything fails. `progress`, if given, is called with the
+        current statistics after each acknowledged batch.
+        """
+        client = self._base.client
+        suffix = ''.join(random.choice(string.ascii_letters) for _ in range(10))
+        tmp_name = '%s_tmp_%s' % (self._base.index_name, suffix)
+        tmp_index = IndexAsync(client, tmp_name)
+
+        start = time.time()
+        stats = {'objects': 0, 'batches': 0, 'elapsed': 0,
+                 'objects_per_second': 0}
+
+        @asyncio.coroutine
+        def load(chunk):
+            res = yield from tmp_index.add_objects_async(chunk)
+            stats['objects'] += len(chunk)
+            stats['batches'] += 1
+            stats['elapsed'] = time.time() - start
+            stats['objects_per_second'] = throughput(stats['objects'],
+                                                     stats['elapsed'])
+            if progress is not None:
+                progress(dict(stats))
+            return res['taskID']
+
+        try:
+            copy_res = yield from client.copy_index(
+                self._base.index_name, tmp_name,
+                scope=['settings', 'synonyms', 'rules'])
+            yield from self.wait_task_async(copy_res['taskID'])
+
+            task_ids = yield from gather_bounded(
+                (load(c) for c in chunks(objects, chunk_size)), concurrency)
+            yield from asyncio.gather(
+                *[tmp_index.wait_task_async(t) for t in task_ids])
+
+            res = yield from client.move_index(tmp_name, self._base.index_name)
+            self._written('replace_all_objects', (objects,), {}, res)
+            yield from self.wait_task_async(res['taskID'])
+        except BaseException:
+            try:
+                yield from client.delete_index(tmp_name)
+            except Exception:
+                pass
+            raise
+
+        stats['elapsed'] = time.time() - start
+        stats['objects_per_second'] = throughput(stats['objects'],
+                                                 stats['elapsed'])
+        stats['taskIDs'] = [copy_res['taskID']] + task_ids + [res['taskID']]
+        return stats
+
+    @asyncio.coroutine
+    def import_objects_async(self, source, checkpoint, format='ndjson',
+                             batch_size=1000, concurrency=4, progress=None,
+                             wait=False):
+        """
+        Import records from `source` with a `BulkImporter`.
+
+        Batches acknowledged by a previous run using the same `checkpoint`
+        file are skipped.
+        """
+        from .importer import BulkImporter
+        importer = BulkImporter(self, checkpoint, batch_size, concurrency,
+                                progress)
+        return (yield from importer.run_async(source, format, wait))
+
+    @asyncio.coroutine
+    def save_objects_adaptive_async(self, source, format='ndjson',
+                                    wait=False, **kwargs):
+        """
+        Save records from `source` with an `AdaptiveBatchWriter` built with
+        `kwargs`, which tunes the batch size and concurrency while writing.
+        """
+        from .writer import AdaptiveBatchWriter
+        writer = AdaptiveBatchWriter(self, **kwargs)
+        return (yield from writer.run_async(source, format, wait))
+
+    def _transfer(self, kind, *args, **kwargs):
+        from .collection import CollectionTransfer
+        return CollectionTransfer(self, kind, *args, **kwargs)
+
+    @asyncio.coroutine
+    def export_synonyms_async(self, path, concurrency=4):
+        """Write the synonyms of the index to an NDJSON file."""
+        transfer = self._transfer('synonyms', concurrency)
+        return (yield from transfer.export_async(path))
+
+    @asyncio.coroutine
+    def import_synonyms_async(self, source, diff=False, replace=False,
+                              delete_missing=False, batch_size=1000,
+                              concurrency=4, forward_to_replicas=False,
+                              wait=False):
+        """
+        Save synonyms read from an NDJSON file or an iterable, see
+        `CollectionTransfer.import_async`.
+        """
+        transfer = self._transfer(
+            'synonyms', concurrency, batch_size,
+            forward_to_replicas=forward_to_replicas)
+        return (yield from transfer.import_async(source, diff, replace,
+                                                 delete_missing, wait))
+
+    @asyncio.coroutine
+    def export_rules_async(self, path, concurrency=4):
+        """Write the rules of the index to an NDJSON file."""
+        transfer = self._transfer('rules', concurrency)
+        return (yield from transfer.export_async(path))
+
+    @asyncio.coroutine
+    def import_rules_async(self, source, diff=False, replace=False,
+                           delete_missing=False, batch_size=1000,
+                           concurrency=4, forward_to_replicas=False,
+                           wait=False):
+        """
+        Save rules read from an NDJSON file or an iterable, see
+        `CollectionTransfer.import_async`.
+        """
+        transfer = self._transfer(
+            'rules', concurrency, batch_size,
+            forward_to_replicas=forward_to_replicas)
+        return (yield from transfer.import_async(source, diff, replace,
+                                                 delete_missing, wait))
@@ -0,0 +1,171 @@
+import json
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+# Largest number of entries returned by a single `get_logs` call.
+MAX_PAGE_SIZE = 1000
+
+
+def _key(entry):
+    return json.dumps(entry, sort_keys=True)
+
+
+class LogTailer(object):
+    """
+    Asynchronous iterator over the log entries of an application as they
+    are written, oldest first.
+
+    The most recent `page_size` entries are polled every `interval` seconds,
+    which halves down to `min_interval` while new entries arrive and doubles
+    up to `max_interval` while none do. When a whole page is new, the
+    following pages are fetched `concurrency` at a time until the last
+    entry seen is reached, at most `max_pages` pages per poll. Entries are
+    told apart by their timestamp and content, identical entries logged
+    within the same second being yielded once.
+
+    Tailing starts with the entries logged after the first poll, or with
+    those logged at or after `since`, a timestamp such as `last_timestamp`
+    from a previous run. With `sink`, a path, entries are also appended to
+    an NDJSON file.
+
+        async for entry in client.tail_logs(type='error'):
+            print(entry['url'])
+    """
+
+    def __init__(self, client, type='all', since=None, page_size=100,
+                 concurrency=4, max_pages=10, min_interval=1,
+                 max_interval=30, sink=None, loop=None):
+        if not 0 < page_size <= MAX_PAGE_SIZE:
+            raise AlgoliaException('page_size must be between 1 and %d'
+                                   % MAX_PAGE_SIZE)
+        self.client = client
+        self.type = type
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.max_pages = max_pages
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.loop = loop or asyncio.get_event_loop()
+        self.stats = {'polls': 0, 'pages': 0, 'entries': 0, 'truncated': 0}
+
+        self.last_timestamp = since
+        # Keys of the entries seen at `last_timestamp`.
+        self._seen = set()
+        self._started = since is not None
+        self._buffer = []
+        self._sleep = None
+        self._closed = False
+        self._sink = None if sink is None else open(sink, 'a')
+
+    @asyncio.coroutine
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        while not self._buffer:
+            if self._closed:
+                raise StopAsyncIteration
+            if self.stats['polls']:
+                self._sleep = asyncio.ensure_future(
+                    asyncio.sleep(self.interval, loop=self.loop),
+                    loop=self.loop)
+                try:
+                    yield from self._sleep
+                except asyncio.CancelledError:
+                    if self._closed:
+                        raise StopAsyncIteration
+                    raise
+                finally:
+                    self._sleep = None
+            self._buffer.extend((yield from self.poll()))
+        return self._buffer.pop(0)
+
+    def close(self):
+        """Stop the iteration once the entries already fetched are read."""
+        self._closed = True
+        if self._sleep is not None:
+            self._sleep.cancel()
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    @asyncio.coroutine
+    def _page(self, page):
+        res = yield from self.client._base.get_logs(
+            page * self.page_size, self.page_size, self.type)
+        self.stats['pages'] += 1
+        return res['logs']
+
+    def _is_old(self, entry):
+        if self.last_timestamp is None:
+            return False
+        return entry['timestamp'] < self.last_timestamp or \
+            (entry['timestamp'] == self.last_timestamp and
+             _key(entry) in self._seen)
+
+    def _reached(self, entries):
+        return len(entries) < self.page_size or \
+            any(self._is_old(e) for e in entries)
+
+    @asyncio.coroutine
+    def poll(self):
+        """Return the entries logged since the previous poll, oldest first."""
+        self.stats['polls'] += 1
+        pages = [(yield from self._page(0))]
+        behind = not self._reached(pages[0]) and self._started
+        while self._started and not self._reached(pages[-1]):
+            if len(pages) >= self.max_pages:
+                self.stats['truncated'] += 1
+                break
+            count = min(self.concurrency, self.max_pages - len(pages))
+            more = yield from asyncio.gather(
+                *[self._page(p) for p in range(len(pages),
+                                                len(pages) + count)],
+                loop=self.loop)
+            for page in more:
+                pages.append(page)
+                if self._reached(page):
+                    break
+
+        # Pages shift as entries are logged between requests, drop the
+        # entries seen twice.
+        entries, keys = [], set()
+        for page in pages:
+            for entry in page:
+                key = _key(entry)
+                if self._is_old(entry) or key in keys:
+                    continue
+                keys.add(key)
+                entries.append(entry)
+        entries.reverse()
+        self._advance(entries)
+
+        if not self._started:
+            self._started = True
+            return []
+        if behind:
+            self.interval = self.min_interval
+        elif entries:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 2)
+
+        self.stats['entries'] += len(entries)
+        if self._sink is not None and entries:
+            self._sink.write(''.join(json.dumps(e) + '\n' for e in entries))
+            self._sink.flush()
+        return entries
+
+    def _advance(self, entries):
+        if not entries:
+            return
+        newest = entries[-1]['timestamp']
+        if newest != self.last_timestamp:
+            self.last_timestamp = newest
+            self._seen = set()
+        self._seen.update(_key(e) for e in entries
+                          if e['timestamp'] == newest)
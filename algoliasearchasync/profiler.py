@@ -0,0 +1,295 @@
+import collections
+import re
+import sys
+import threading
+import time
+import traceback
+
+import asyncio
+
+from .recorder import latency_stats
+
+# Phases of a call, in the order they happen.
+PHASES = ['encode', 'queue', 'connect', 'server', 'transfer', 'decode']
+
+# Phases running synchronously on the loop.
+SYNC_PHASES = ['encode', 'decode']
+
+_current_task = getattr(asyncio, 'current_task', None) or \
+    asyncio.Task.current_task
+
+# (method, path pattern, operation), the first match wins.
+ROUTES = [(m, re.compile(p + '$'), o) for m, p, o in [
+    ('POST', r'/1/indexes/\*/queries', 'multiple_queries'),
+    ('POST', r'/1/indexes/\*/objects', 'get_objects'),
+    ('POST', r'/1/indexes/\*/batch', 'batch'),
+    ('GET', r'/1/indexes', 'list_indexes'),
+    ('POST', r'/1/indexes/[^/]+/facets/[^/]+/query',
+     'search_for_facet_values'),
+    ('POST', r'/1/indexes/[^/]+/query', 'search'),
+    ('GET', r'/1/indexes/[^/]+', 'search'),
+    ('GET', r'/1/indexes/[^/]+/browse', 'browse'),
+    ('POST', r'/1/indexes/[^/]+/browse', 'browse'),
+    ('POST', r'/1/indexes/[^/]+/batch', 'batch'),
+    ('POST', r'/1/indexes/[^/]+/clear', 'clear_index'),
+    ('POST', r'/1/indexes/[^/]+/deleteByQuery', 'delete_by_query'),
+    ('POST', r'/1/indexes/[^/]+/operation', 'copy_or_move_index'),
+    ('GET', r'/1/indexes/[^/]+/task/\d+', 'wait_task'),
+    ('GET', r'/1/indexes/[^/]+/settings', 'get_settings'),
+    ('PUT', r'/1/indexes/[^/]+/settings', 'set_settings'),
+    ('POST', r'/1/indexes/[^/]+/synonyms/search', 'search_synonyms'),
+    ('POST', r'/1/indexes/[^/]+/synonyms/batch', 'batch_synonyms'),
+    ('POST', r'/1/indexes/[^/]+/synonyms/clear', 'clear_synonyms'),
+    ('GET', r'/1/indexes/[^/]+/synonyms/[^/]+', 'get_synonym'),
+    ('PUT', r'/1/indexes/[^/]+/synonyms/[^/]+', 'save_synonym'),
+    ('DELETE', r'/1/indexes/[^/]+/synonyms/[^/]+', 'delete_synonym'),
+    ('POST', r'/1/indexes/[^/]+/rules/search', 'search_rules'),
+    ('POST', r'/1/indexes/[^/]+/rules/batch', 'batch_rules'),
+    ('POST', r'/1/indexes/[^/]+/rules/clear', 'clear_rules'),
+    ('GET', r'/1/indexes/[^/]+/rules/[^/]+', 'get_rule'),
+    ('PUT', r'/1/indexes/[^/]+/rules/[^/]+', 'save_rule'),
+    ('DELETE', r'/1/indexes/[^/]+/rules/[^/]+', 'delete_rule'),
+    ('POST', r'/1/indexes/[^/]+', 'add_object'),
+    ('DELETE', r'/1/indexes/[^/]+', 'delete_index'),
+    ('POST', r'/1/indexes/[^/]+/[^/]+/partial', 'partial_update_object'),
+    ('GET', r'/1/indexes/[^/]+/keys(/[^/]+)?', 'index_keys'),
+    ('GET', r'/1/indexes/[^/]+/[^/]+', 'get_object'),
+    ('PUT', r'/1/indexes/[^/]+/[^/]+', 'save_object'),
+    ('DELETE', r'/1/indexes/[^/]+/[^/]+', 'delete_object'),
+    ('GET', r'/1/logs', 'get_logs'),
+]]
+
+
+def operation(meth, path):
+    """Return the name of the API method sending `meth` to `path`."""
+    for m, pattern, name in ROUTES:
+        if m == meth and pattern.match(path):
+            return name
+    if path.startswith('/1/keys') or '/keys' in path:
+        return 'keys'
+    return '%s %s' % (meth, path)
+
+
+def aiohttp_trace_config():
+    """
+    Return an aiohttp `TraceConfig` adding the connection and server times
+    of the requests to the `Sample` given as their `trace_request_ctx`.
+    """
+    import aiohttp
+    config = aiohttp.TraceConfig()
+
+    def on(signal, callback):
+        @asyncio.coroutine
+        def handler(session, ctx, params):
+            if ctx.trace_request_ctx is not None:
+                callback(ctx, ctx.trace_request_ctx, time.perf_counter())
+        signal.append(handler)
+
+    def request_start(ctx, sample, now):
+        ctx.request_at = now
+        ctx.waited = 0
+
+    def waited(phase):
+        def end(ctx, sample, now):
+            elapsed = now - ctx.started_at
+            sample.add(phase, elapsed)
+            ctx.waited += elapsed
+        return end
+
+    def started(ctx, sample, now):
+        ctx.started_at = now
+
+    def request_end(ctx, sample, now):
+        sample.add('server', now - ctx.request_at - ctx.waited)
+
+    on(config.on_request_start, request_start)
+    on(config.on_connection_queued_start, started)
+    on(config.on_connection_queued_end, waited('queue'))
+    on(config.on_connection_create_start, started)
+    on(config.on_connection_create_end, waited('connect'))
+    on(config.on_request_end, request_end)
+    on(config.on_request_exception, request_end)
+    return config
+
+
+class Sample(object):
+    """Timings of a single call, in seconds."""
+
+    def __init__(self, name):
+        self.name = name
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.start = time.perf_counter()
+        self.total = None
+        self.error = False
+
+    def add(self, phase, elapsed):
+        self.phases[phase] += elapsed
+
+
+class StallDetector(object):
+    """
+    Detect the loop being blocked for more than `threshold` seconds.
+
+    A callback scheduled every `threshold / 2` seconds measures how late it
+    runs, while a thread checks that the loop was running meanwhile: the
+    time spent between two `run_until_complete` calls is no stall. With
+    `stacks`, the thread also captures the stack of the loop's thread while
+    it is blocked, which points at the code responsible unless it holds the
+    GIL until it returns. Stalls are kept in `stalls` and passed to
+    `callback`.
+    """
+
+    def __init__(self, threshold=0.05, stacks=True, callback=None,
+                 max_stalls=100, loop=None):
+        self.threshold = threshold
+        self.stacks = stacks
+        self.callback = callback
+        self.loop = loop or asyncio.get_event_loop()
+        self.stalls = collections.deque(maxlen=max_stalls)
+
+        self._interval = threshold / 2
+        self._handle = None
+        self._thread = None
+        self._thread_id = None
+        self._beat = None
+        self._expected = None
+        self._stack = None
+        self._paused = False
+
+    def start(self):
+        if self._handle is not None:
+            return
+        self._beat = time.perf_counter()
+        self._expected = self._beat + self._interval
+        self._handle = self.loop.call_later(self._interval, self._tick)
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._thread = None
+
+    def record(self, duration, section=None, stack=None):
+        stall = {'at': time.time(), 'duration_ms': 1000 * duration,
+                 'section': section, 'stack': stack}
+        self.stalls.append(stall)
+        if self.callback is not None:
+            self.callback(stall)
+
+    def _tick(self):
+        now = time.perf_counter()
+        late = now - self._expected
+        if late >= self.threshold and not self._paused:
+            self.record(late, stack=self._stack)
+        self._stack = None
+        self._paused = False
+        self._beat = now
+        self._expected = now + self._interval
+        self._handle = self.loop.call_later(self._interval, self._tick)
+
+    def _watch(self):
+        thread = self._thread
+        while self._thread is thread:
+            time.sleep(self._interval)
+            if not self.loop.is_running():
+                self._paused = True
+            elif self.stacks and self._stack is None and \
+                    time.perf_counter() - self._beat > self.threshold:
+                frame = sys._current_frames().get(self._thread_id)
+                if frame is not None:
+                    self._stack = traceback.format_stack(frame)
+
+
+class Profiler(object):
+    """
+    Split the wall time of the calls sent through a transport by phase.
+
+    `encode` and `decode` are the JSON serialization of the request and
+    answer, `queue` the wait for a scheduler slot or a pooled connection,
+    `connect` the DNS resolution and connection setup, `server` the time
+    until the answer's headers are received and `transfer` the time reading
+    its body. Transports only report the phases they can observe: requests
+    sent before profiling was enabled are counted as `server`. The last
+    `samples` calls of each API method are kept, see `stats`.
+
+    Synchronous sections of the client taking longer than `stall_threshold`
+    seconds are reported as stalls, as are all blocks of the loop when
+    `watch_loop` is set (see `StallDetector`).
+    """
+
+    def __init__(self, stall_threshold=0.05, watch_loop=True, samples=1000,
+                 namer=operation, callback=None, loop=None):
+        self.stall_threshold = stall_threshold
+        self.namer = namer
+        self.loop = loop or asyncio.get_event_loop()
+        self.detector = StallDetector(stall_threshold, callback=callback,
+                                      loop=self.loop)
+        if watch_loop:
+            self.detector.start()
+
+        self._samples = collections.defaultdict(
+            lambda: collections.deque(maxlen=samples))
+        self._counts = collections.defaultdict(
+            lambda: {'calls': 0, 'errors': 0})
+        self._current = {}
+
+    @property
+    def stalls(self):
+        return list(self.detector.stalls)
+
+    def begin(self, meth, path):
+        sample = Sample(self.namer(meth, path))
+        task = _current_task(self.loop)
+        if task is not None:
+            self._current[task] = sample
+        return sample
+
+    def end(self, sample, error=False):
+        sample.total = time.perf_counter() - sample.start
+        sample.error = error
+        task = _current_task(self.loop)
+        if self._current.get(task) is sample:
+            del self._current[task]
+        counts = self._counts[sample.name]
+        counts['calls'] += 1
+        if error:
+            counts['errors'] += 1
+        self._samples[sample.name].append(sample)
+
+    def current(self):
+        """Return the sample of the call made by the current task."""
+        return self._current.get(_current_task(self.loop))
+
+    def add(self, phase, start):
+        """Add the time elapsed since `start` to a phase of the current call."""
+        elapsed = time.perf_counter() - start
+        sample = self.current()
+        if sample is not None:
+            sample.add(phase, elapsed)
+        if phase in SYNC_PHASES and elapsed >= self.stall_threshold:
+            section = phase if sample is None else \
+                '%s %s' % (phase, sample.name)
+            self.detector.record(elapsed, section)
+
+    def stats(self):
+        """Return the distributions of the phases of each API method."""
+        res = {}
+        for name, samples in self._samples.items():
+            stats = dict(self._counts[name])
+            stats['total'] = latency_stats([s.total for s in samples])
+            for phase in PHASES:
+                stats[phase] = latency_stats([s.phases[phase]
+                                              for s in samples])
+            res[name] = stats
+        return res
+
+    def reset(self):
+        self._samples.clear()
+        self._counts.clear()
+        self.detector.stalls.clear()
+
+    def close(self):
+        self.detector.stop()
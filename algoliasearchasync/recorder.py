@@ -0,0 +1,203 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from .helpers import percentile, throughput
+
+# Credentials never written to a traffic log, compared in lower case.
+SECRET_KEYS = {'apikey', 'x-algolia-api-key'}
+
+
+def _redact(obj):
+    """Return a dict without its credentials."""
+    return {k: v for k, v in obj.items() if k.lower() not in SECRET_KEYS}
+
+
+def _redact_body(data):
+    try:
+        body = json.loads(data)
+    except ValueError:
+        return data
+    if not isinstance(body, dict) or \
+            not any(k.lower() in SECRET_KEYS for k in body):
+        return data
+    return json.dumps(_redact(body), separators=(',', ':'))
+
+
+class TrafficRecorder(object):
+    """
+    Append the requests sent by a transport to an NDJSON log.
+
+    Each line holds the start of the request relative to the creation of
+    the recorder (`at`), its duration, method, path, query parameters,
+    search flag, body size and HTTP status (null when no host answered).
+    Bodies, which hold records and user queries, are only kept when
+    `bodies` is True, replaying without them sends an empty object. API keys
+    are removed from the parameters and bodies.
+
+    Entries are buffered and written by a thread every `flush_interval`
+    seconds, or as soon as `max_buffer` of them are waiting, so that the
+    recorded traffic does not wait on the disk. `close` writes the rest.
+
+        transport.recorder = TrafficRecorder('traffic.ndjson')
+    """
+
+    def __init__(self, path, bodies=False, flush_interval=1.0,
+                 max_buffer=1000, loop=None):
+        self.path = path
+        self.bodies = bodies
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.loop = loop or asyncio.get_event_loop()
+        self.started = time.time()
+        self.count = 0
+        self._f = open(path, 'a')
+        self._buffer = []
+        self._flush_handle = None
+        # A single thread keeps the lines in order.
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def record(self, meth, path, params, data, is_search, start, elapsed,
+               status):
+        entry = {
+            'at': round(start - self.started, 6),
+            'elapsed': round(elapsed, 6),
+            'method': meth,
+            'path': path,
+            'params': None if params is None else _redact(params),
+            'search': is_search,
+            'size': 0 if data is None else len(data.encode('utf-8')),
+            'status': status,
+        }
+        if self.bodies and data is not None:
+            entry['body'] = _redact_body(data)
+        self._buffer.append(json.dumps(entry, separators=(',', ':')) + '\n')
+        self.count += 1
+        if len(self._buffer) >= self.max_buffer:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self.loop.call_later(self.flush_interval,
+                                                      self.flush)
+
+    def flush(self):
+        """Hand the buffered entries to the writing thread."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        lines, self._buffer = self._buffer, []
+        return self.loop.run_in_executor(self._executor, self._write, lines)
+
+    def _write(self, lines):
+        if lines:
+            self._f.writelines(lines)
+            self._f.flush()
+
+    def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._executor.shutdown(wait=True)
+        self._write(self._buffer)
+        self._buffer = []
+        self._f.close()
+
+
+def read_traffic(path):
+    """Return the entries of a traffic log, ordered by start time."""
+    entries = []
+    with open(path) as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Line truncated by a crash.
+                continue
+    entries.sort(key=lambda e: e['at'])
+    return entries
+
+
+def peak_concurrency(intervals):
+    """Return the largest number of overlapping (start, end) intervals."""
+    events = sorted([(start, 1) for start, _ in intervals] +
+                    [(end, -1) for _, end in intervals],
+                    key=lambda e: (e[0], e[1]))
+    peak = current = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def latency_stats(latencies):
+    """Summarize a list of latencies in seconds, in milliseconds."""
+    if not latencies:
+        return {'count': 0}
+    return {
+        'count': len(latencies),
+        'mean_ms': 1000 * sum(latencies) / len(latencies),
+        'p50_ms': 1000 * percentile(latencies, 50),
+        'p90_ms': 1000 * percentile(latencies, 90),
+        'p99_ms': 1000 * percentile(latencies, 99),
+        'max_ms': 1000 * max(latencies),
+    }
+
+
+@asyncio.coroutine
+def replay_async(transport, entries, speed=1.0, loop=None):
+    """
+    Send the requests of a traffic log through `transport` at their
+    recorded offsets divided by `speed`, which preserves the concurrency of
+    the recorded traffic, and return the latency distributions of the
+    original and replayed requests.
+    """
+    loop = loop or asyncio.get_event_loop()
+    if isinstance(entries, str):
+        entries = read_traffic(entries)
+
+    latencies = []
+    intervals = []
+    errors = {}
+    start = loop.time()
+
+    @asyncio.coroutine
+    def send(entry):
+        delay = start + entry['at'] / speed - loop.time()
+        if delay > 0:
+            yield from asyncio.sleep(delay, loop=loop)
+
+        body = entry.get('body')
+        data = json.loads(body) if body is not None else None
+        if data is None and entry['size']:
+            data = {}
+
+        begin = loop.time()
+        try:
+            yield from transport.req(entry['search'], entry['path'],
+                                     entry['method'], entry['params'], data)
+        except AlgoliaException as e:
+            key = str(getattr(e, 'status', None) or 'unreachable')
+            errors[key] = errors.get(key, 0) + 1
+        end = loop.time()
+        latencies.append(end - begin)
+        intervals.append((begin, end))
+
+    yield from asyncio.gather(*[send(e) for e in entries], loop=loop)
+    elapsed = loop.time() - start
+
+    return {
+        'speed': speed,
+        'requests': len(entries),
+        'errors': errors,
+        'seconds': elapsed,
+        'requests_per_second': throughput(len(entries), elapsed),
+        'recorded': dict(
+            latency_stats([e['elapsed'] for e in entries]),
+            peak_concurrency=peak_concurrency(
+                [(e['at'], e['at'] + e['elapsed']) for e in entries])),
+        'replayed': dict(latency_stats(latencies),
+                         peak_concurrency=peak_concurrency(intervals)),
+    }
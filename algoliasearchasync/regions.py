@@ -0,0 +1,122 @@
+import collections
+import random
+import time
+
+from algoliasearch.helpers import AlgoliaException
+
+
+class RegionRouter(object):
+    """
+    Route reads to the hosts of the local region.
+
+    `regions` lists `(name, hosts)` pairs, or is an ordered mapping, nearest
+    regions first from the `local` one (the first by default). Reads go to
+    the healthy hosts of the local region, the fastest first, and only fail
+    over to the nearest region with healthy hosts when none of the local
+    ones is; they come back once a local host is considered healthy again.
+    Writes are not routed, they keep going to the write hosts.
+
+    Each switch of the region serving reads is kept in `failovers` and
+    passed to `callback`. `stats()` reports the attempts made on the hosts
+    of each region, and how many reads were answered from another region
+    than the local one.
+    """
+
+    def __init__(self, regions, local=None, callback=None, max_events=100):
+        if hasattr(regions, 'items'):
+            regions = list(regions.items())
+        if not regions:
+            raise AlgoliaException('At least one region is required')
+        names = [name for name, _ in regions]
+        if local is None:
+            local = names[0]
+        if local not in names:
+            raise AlgoliaException('Unknown local region: %s' % local)
+
+        self.local = local
+        self.hosts = collections.OrderedDict(regions)
+        self.order = [local] + [n for n in names if n != local]
+        self.region_of = {h: n for n, hosts in regions for h in hosts}
+        self.active = local
+        self.callback = callback
+        self.failovers = collections.deque(maxlen=max_events)
+        self.nb_failovers = 0
+        self._stats = {n: {'attempts': 0, 'errors': 0, 'answered': 0,
+                           'elapsed': 0.0} for n in names}
+
+    def rank(self, rank_hosts):
+        """
+        Return the states of the read hosts in the order they are tried,
+        the region serving reads first, given `BaseTransport._rank_hosts`.
+        """
+        now = time.time()
+        healthy, failed = [], []
+        for name in self.order:
+            for state in rank_hosts(self.hosts[name]):
+                if state.is_healthy(now):
+                    healthy.append(state)
+                else:
+                    failed.append(state)
+        failed.sort(key=lambda s: s.failed_at)
+        return healthy + failed
+
+    def read_hosts(self, rank_hosts, probe_rate=0):
+        """Return the read hosts to try, noting failovers."""
+        states = self.rank(rank_hosts)
+        now = time.time()
+        region = self.region_of[states[0].host]
+        if not states[0].is_healthy(now):
+            region = self.local
+        self._activate(region)
+
+        hosts = [s.host for s in states]
+        nb_local = len([s for s in states if s.is_healthy(now) and
+                        self.region_of[s.host] == region])
+        if nb_local > 1 and random.random() < probe_rate:
+            # Keep the estimates of the other hosts of the region fresh.
+            probe = random.randrange(1, nb_local)
+            hosts.insert(0, hosts.pop(probe))
+        return hosts
+
+    def _activate(self, region):
+        if region == self.active:
+            return
+        event = {'at': time.time(), 'from': self.active, 'to': region}
+        self.active = region
+        self.nb_failovers += 1
+        self.failovers.append(event)
+        if self.callback is not None:
+            self.callback(event)
+
+    def observe(self, host, path, meth, elapsed, error):
+        """Transport listener counting the attempts made in each region."""
+        region = self.region_of.get(host)
+        if region is None:
+            return
+        stats = self._stats[region]
+        stats['attempts'] += 1
+        stats['elapsed'] += elapsed
+        if error is None:
+            stats['answered'] += 1
+        else:
+            stats['errors'] += 1
+
+    def stats(self):
+        regions = {}
+        for name, stats in self._stats.items():
+            attempts = stats['attempts']
+            regions[name] = {
+                'attempts': attempts,
+                'answered': stats['answered'],
+                'errors': stats['errors'],
+                'mean_ms': 1000 * stats['elapsed'] / attempts
+                if attempts else None,
+            }
+        return {
+            'local': self.local,
+            'active': self.active,
+            'failovers': self.nb_failovers,
+            'cross_region_reads': sum(s['answered'] for n, s in
+                                      self._stats.items() if n != self.local),
+            'regions': regions,
+        }
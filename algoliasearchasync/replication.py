@@ -0,0 +1,315 @@
+import collections
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from .cache import written_object_ids
+from .helpers import gen_sync
+from .index import INDEX_WRITE_METHODS
+
+ALL = 'all'
+ONE = 'one'
+QUORUM = 'quorum'
+
+# Writes sent to every application.
+REPLICATED_METHODS = INDEX_WRITE_METHODS + ['delete_by_query']
+
+# Methods of the first index a `ReplicatedIndex` forwards, all reads.
+READ_METHODS = [
+    'browse_all',
+    'browse_from',
+    'enable_object_cache',
+    'enable_settings_cache',
+    'enable_snapshot',
+    'export',
+    'export_rules',
+    'export_synonyms',
+    'get_object',
+    'get_objects',
+    'get_settings',
+    'get_synonym',
+    'search',
+    'search_disjunctive_faceting',
+    'search_for_facet_values',
+    'search_pages',
+    'search_synonyms',
+]
+
+
+def _retryable(e):
+    """Return whether a failed write may succeed when sent again."""
+    status = getattr(e, 'status', None)
+    return status is None or status == 429 or status >= 500
+
+
+class Replica(object):
+    """
+    Write path to one application of a `ReplicatedIndex`.
+
+    Writes are sent as soon as they are made, unless they touch an object of
+    an earlier write not acknowledged yet: they wait for it, so that the
+    replica applies the writes of an object in order. Writes which may touch
+    any object, such as `clear_index` or `set_settings`, wait for all the
+    earlier ones and hold back the following ones. A write failing for a
+    reason which may be temporary is sent again after `retry_interval`
+    seconds, doubling up to `max_interval`, at most `max_retries` times.
+    When it still fails, or when more than `max_backlog` writes are queued,
+    the queue is dropped, their callers get an error and the replica is
+    marked as out of sync until `reset()` is called. Closing the client of
+    `index` closes the replica.
+    """
+
+    def __init__(self, index, max_backlog=1000, retry_interval=1,
+                 max_interval=30, max_retries=10, loop=None):
+        self.index = index
+        self.max_backlog = max_backlog
+        self.retry_interval = retry_interval
+        self.max_interval = max_interval
+        self.max_retries = max_retries
+        self.loop = loop or asyncio.get_event_loop()
+        self.out_of_sync = False
+        self.last_task_id = None
+        self.stats = {'writes': 0, 'retries': 0, 'dropped': 0}
+
+        # Writes not acknowledged yet, in order, as `(method, args, kwargs,
+        # future, objectIDs)`, the objectIDs being None for any object.
+        self._queue = collections.deque()
+        # Tasks sending the writes, by future.
+        self._tasks = {}
+        index._base.client._transport.closables.append(self)
+
+    @property
+    def lag(self):
+        """Number of writes not acknowledged yet."""
+        return len(self._queue)
+
+    def reset(self):
+        """Clear the out of sync mark, once the index was resynchronized."""
+        self.out_of_sync = False
+
+    def submit(self, method, args, kwargs):
+        """Send a write, returning a future of its answer."""
+        fut = asyncio.Future(loop=self.loop)
+        # Lagging writes are not always awaited, retrieve their errors.
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.stats['writes'] += 1
+        if len(self._queue) >= self.max_backlog:
+            self._drop()
+        ids = written_object_ids(method, args, kwargs)
+        self._queue.append((method, args, kwargs, fut,
+                            None if ids is None else set(ids)))
+        self._schedule()
+        return fut
+
+    def _schedule(self):
+        """Start sending the writes which do not wait for an earlier one."""
+        touched = set()
+        for i, op in enumerate(self._queue):
+            ids = op[4]
+            if ids is None:
+                if i == 0:
+                    self._start(op)
+                break
+            if touched.isdisjoint(ids):
+                self._start(op)
+            touched.update(ids)
+
+    def _start(self, op):
+        fut = op[3]
+        if fut not in self._tasks:
+            self._tasks[fut] = asyncio.ensure_future(self._send(op),
+                                                     loop=self.loop)
+
+    @asyncio.coroutine
+    def _call(self, op):
+        method, args, kwargs = op[:3]
+        res = yield from getattr(self.index, method + '_async')(*args,
+                                                                 **kwargs)
+        if isinstance(res, dict) and 'taskID' in res:
+            self.last_task_id = res['taskID']
+        return res
+
+    @asyncio.coroutine
+    def _send(self, op):
+        fut = op[3]
+        interval = self.retry_interval
+        retries = 0
+        try:
+            while True:
+                try:
+                    res = yield from self._call(op)
+                except Exception as e:
+                    if not _retryable(e):
+                        self._done(op, None, e)
+                        return
+                    if retries >= self.max_retries:
+                        self._drop()
+                        return
+                    yield from asyncio.sleep(interval, loop=self.loop)
+                    # The queue may have been dropped in the meantime.
+                    if fut.done():
+                        return
+                    interval = min(self.max_interval, interval * 2)
+                    retries += 1
+                    self.stats['retries'] += 1
+                    continue
+                self._done(op, res, None)
+                return
+        finally:
+            self._tasks.pop(fut, None)
+            self._schedule()
+
+    def _done(self, op, res, error):
+        for i, queued in enumerate(self._queue):
+            if queued is op:
+                del self._queue[i]
+                break
+        fut = op[3]
+        if not fut.done():
+            if error is None:
+                fut.set_result(res)
+            else:
+                fut.set_exception(error)
+
+    def _drop(self):
+        self.out_of_sync = True
+        base = self.index._base
+        error = AlgoliaException('Replica %s of application %s is out of '
+                                 'sync' % (base.index_name,
+                                           base.client.app_id))
+        while self._queue:
+            fut = self._queue.popleft()[3]
+            if not fut.done():
+                fut.set_exception(error)
+            self.stats['dropped'] += 1
+
+    @asyncio.coroutine
+    def close(self):
+        for op in self._queue:
+            op[3].cancel()
+        self._queue.clear()
+        for task in list(self._tasks.values()):
+            task.cancel()
+        closables = self.index._base.client._transport.closables
+        if self in closables:
+            closables.remove(self)
+
+
+class ReplicatedIndex(object):
+    """
+    Index mirrored to several applications.
+
+    Writes are sent to all `indexes` concurrently and return once `quorum`
+    of them acknowledged: `ONE`, `ALL`, `QUORUM` (a majority) or a number.
+    The answer is the first acknowledgement, with the `taskIDs` of every
+    index known at that point (None for the others). Replicas which fail are
+    retried in the background, see `Replica`, so that a lagging application
+    only slows down writes whose quorum needs it. Reads go to the first
+    index. Other methods, such as `replace_all_objects` or
+    `import_synonyms` whose source can only be read once, are not
+    available: call them on each index.
+    """
+
+    def __init__(self, indexes, quorum=ALL, max_backlog=1000,
+                 retry_interval=1, max_interval=30, max_retries=10,
+                 loop=None):
+        if not indexes:
+            raise AlgoliaException('At least one index is required')
+        self.loop = loop or asyncio.get_event_loop()
+        self.replicas = [Replica(i, max_backlog, retry_interval,
+                                 max_interval, max_retries, self.loop)
+                         for i in indexes]
+        self.quorum = quorum
+        self._required(quorum)
+
+        for method in REPLICATED_METHODS:
+            setattr(self, method + '_async', self._gen_write(method))
+            setattr(self, method, gen_sync(self, method))
+        setattr(self, 'wait_task', gen_sync(self, 'wait_task'))
+        setattr(self, 'drain', gen_sync(self, 'drain'))
+
+    @property
+    def primary(self):
+        return self.replicas[0].index
+
+    def __getattr__(self, name):
+        method = name[:-len('_async')] if name.endswith('_async') else name
+        if method not in READ_METHODS:
+            raise AttributeError('ReplicatedIndex has no method %s, it only '
+                                 'replicates %s' % (
+                                     name, ', '.join(REPLICATED_METHODS)))
+        return getattr(self.primary, name)
+
+    def _required(self, quorum):
+        n = len(self.replicas)
+        if quorum == ALL:
+            return n
+        if quorum == ONE:
+            return 1
+        if quorum == QUORUM:
+            return n // 2 + 1
+        if isinstance(quorum, int) and 0 < quorum <= n:
+            return quorum
+        raise AlgoliaException('Invalid quorum: %r' % (quorum,))
+
+    def _gen_write(self, method):
+        @asyncio.coroutine
+        def write(*args, **kwargs):
+            quorum = kwargs.pop('quorum', self.quorum)
+            return (yield from self._write(method, args, kwargs, quorum))
+
+        return write
+
+    @asyncio.coroutine
+    def _write(self, method, args, kwargs, quorum):
+        required = self._required(quorum)
+        futures = [r.submit(method, args, kwargs) for r in self.replicas]
+        pending = set(futures)
+        acks, errors = [], []
+        while len(acks) < required:
+            if len(futures) - len(errors) < required:
+                raise errors[0]
+            done, pending = yield from asyncio.wait(
+                pending, loop=self.loop, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    acks.append(fut.result())
+                else:
+                    errors.append(fut.exception())
+
+        res = dict(acks[0]) if isinstance(acks[0], dict) else {}
+        res['taskIDs'] = [
+            f.result().get('taskID')
+            if f.done() and f.exception() is None and
+            isinstance(f.result(), dict) else None
+            for f in futures]
+        return res
+
+    @asyncio.coroutine
+    def wait_task_async(self, task_ids, time_before_retry=100):
+        """Wait for the `taskIDs` of a replicated write to be published."""
+        yield from asyncio.gather(*[
+            r.index.wait_task_async(t, time_before_retry)
+            for r, t in zip(self.replicas, task_ids) if t is not None],
+            loop=self.loop)
+
+    @asyncio.coroutine
+    def drain_async(self):
+        """Wait for the writes queued for lagging replicas to be sent."""
+        while any(r._tasks for r in self.replicas):
+            yield from asyncio.wait(
+                [t for r in self.replicas for t in r._tasks.values()],
+                loop=self.loop)
+
+    def status(self):
+        """Return the state of each replica."""
+        return [dict(r.stats, index=r.index._base.index_name,
+                     app_id=r.index._base.client.app_id, lag=r.lag,
+                     out_of_sync=r.out_of_sync, last_task_id=r.last_task_id)
+                for r in self.replicas]
+
+    @asyncio.coroutine
+    def close(self):
+        for replica in self.replicas:
+            yield from replica.close()
@@ -0,0 +1,147 @@
+import collections
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from .helpers import percentile
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+WRITE = 'write'
+ADMIN = 'admin'
+
+# Request classes, by decreasing priority.
+PRIORITIES = [INTERACTIVE, ADMIN, WRITE, BACKGROUND]
+
+DEFAULT_LIMITS = {
+    INTERACTIVE: 32,
+    ADMIN: 2,
+    WRITE: 8,
+    BACKGROUND: 4,
+}
+
+# Number of queue times kept per class to compute percentiles.
+SAMPLES = 1000
+
+# Index resources whose reads are made by bulk jobs and caches.
+BACKGROUND_RESOURCES = ['task', 'settings', 'synonyms', 'rules']
+
+
+def classify(path, meth, is_search):
+    """
+    Return the class of a request from its path, method and kind. Searches
+    and object reads, which users wait for, are interactive; browses, logs
+    and the reads of tasks, settings, synonyms and rules are background
+    ones.
+    """
+    parts = path.split('/')
+    if path.endswith('/browse') or path.startswith('/1/logs'):
+        return BACKGROUND
+    if path.startswith('/1/keys') or path.endswith('/keys') or \
+            path.endswith('/operation') or path == '/1/indexes' or \
+            (meth == 'DELETE' and len(parts) == 4):
+        return ADMIN
+    if not is_search:
+        return WRITE
+    if len(parts) > 4 and parts[2] == 'indexes' and \
+            parts[4] in BACKGROUND_RESOURCES:
+        return BACKGROUND
+    return INTERACTIVE
+
+
+class RequestScheduler(object):
+    """
+    Limit the requests in flight per class and hand free slots over by
+    priority.
+
+    Each class has its own concurrency budget in `limits`. When `total` is
+    given, at most `total` requests are in flight, of which the interactive
+    budget is reserved to interactive requests: they never wait for others,
+    only on their own budget. `classifier(path, meth, is_search)` returns
+    the class of a request, `classify` by default.
+    """
+
+    def __init__(self, limits=None, total=None, classifier=classify,
+                 loop=None):
+        self.limits = dict(DEFAULT_LIMITS)
+        if limits is not None:
+            self.limits.update(limits)
+        if set(self.limits) != set(PRIORITIES):
+            raise AlgoliaException('Unknown request classes: %s' % ', '.join(
+                sorted(set(self.limits) - set(PRIORITIES))))
+        self.total = total
+        self.classifier = classifier
+        self.loop = loop or asyncio.get_event_loop()
+
+        self.in_flight = {c: 0 for c in PRIORITIES}
+        self._waiters = {c: collections.deque() for c in PRIORITIES}
+        self._queue_times = {c: collections.deque(maxlen=SAMPLES)
+                             for c in PRIORITIES}
+        self._counts = {c: {'requests': 0, 'queued': 0, 'max_queue_ms': 0}
+                        for c in PRIORITIES}
+
+    def classify(self, path, meth, is_search):
+        return self.classifier(path, meth, is_search)
+
+    def _can_run(self, cls):
+        if self.in_flight[cls] >= self.limits[cls]:
+            return False
+        if self.total is None or cls == INTERACTIVE:
+            return True
+        others = sum(self.in_flight.values()) - self.in_flight[INTERACTIVE]
+        return others < self.total - self.limits[INTERACTIVE]
+
+    @asyncio.coroutine
+    def acquire(self, cls):
+        """Wait for a slot for a request of class `cls`."""
+        start = self.loop.time()
+        counts = self._counts[cls]
+        counts['requests'] += 1
+        if not self._waiters[cls] and self._can_run(cls):
+            self.in_flight[cls] += 1
+            self._queue_times[cls].append(0)
+            return
+
+        counts['queued'] += 1
+        waiter = asyncio.Future(loop=self.loop)
+        self._waiters[cls].append(waiter)
+        try:
+            yield from waiter
+        except asyncio.CancelledError:
+            if not waiter.cancelled():
+                # The slot was granted as the wait was cancelled.
+                self.release(cls)
+            elif waiter in self._waiters[cls]:
+                self._waiters[cls].remove(waiter)
+            raise
+
+        elapsed = self.loop.time() - start
+        self._queue_times[cls].append(elapsed)
+        counts['max_queue_ms'] = max(counts['max_queue_ms'], elapsed * 1000)
+
+    def release(self, cls):
+        self.in_flight[cls] -= 1
+        for c in PRIORITIES:
+            waiters = self._waiters[c]
+            while waiters and self._can_run(c):
+                waiter = waiters.popleft()
+                if waiter.cancelled():
+                    continue
+                self.in_flight[c] += 1
+                waiter.set_result(None)
+
+    def stats(self):
+        """Return the queue time metrics of each class."""
+        res = {}
+        for cls in PRIORITIES:
+            times = self._queue_times[cls]
+            res[cls] = dict(
+                self._counts[cls],
+                limit=self.limits[cls],
+                in_flight=self.in_flight[cls],
+                waiting=len(self._waiters[cls]),
+                p50_queue_ms=1000 * (percentile(times, 50) or 0),
+                p99_queue_ms=1000 * (percentile(times, 99) or 0),
+            )
+        return res
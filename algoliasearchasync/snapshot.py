@@ -0,0 +1,318 @@
+import bisect
+import json
+import re
+import time
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from .circuit import CircuitOpenException
+from .helpers import gen_sync
+from .transport import UnreachableHostsException, api_error
+
+# Errors raised when no host could answer a request.
+UNREACHABLE = (UnreachableHostsException, CircuitOpenException)
+
+# Search parameters a snapshot answers, the others being refused.
+SEARCH_PARAMS = {
+    'query', 'page', 'hitsPerPage', 'attributesToRetrieve', 'facets',
+    'facetFilters', 'filters', 'maxValuesPerFacet', 'attributesToHighlight',
+    'attributesToSnippet', 'getRankingInfo', 'analytics', 'analyticsTags',
+    'clickAnalytics', 'typoTolerance', 'highlightPreTag', 'highlightPostTag',
+}
+
+# Attributes added to the hits of an answer.
+ANSWER_ATTRIBUTES = {'_highlightResult', '_snippetResult', '_rankingInfo'}
+
+_FILTER = re.compile(r'^\s*(NOT\s+)?("[^"]*"|[^:\s]+)\s*:\s*("[^"]*"|\S+)\s*$')
+
+
+def _tokens(value):
+    if isinstance(value, str):
+        return re.findall(r'\w+', value.lower())
+    if isinstance(value, (list, tuple)):
+        return [t for v in value for t in _tokens(v)]
+    if isinstance(value, dict):
+        return [t for v in value.values() for t in _tokens(v)]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return [str(value)]
+    return []
+
+
+def _list(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        if value[:1] == '[':
+            return json.loads(value)
+        return [v.strip() for v in value.split(',') if v.strip()]
+    return list(value)
+
+
+def _values(record, attr):
+    value = record
+    for key in attr.split('.'):
+        if not isinstance(value, dict):
+            return []
+        value = value.get(key)
+    if value is None:
+        return []
+    return [str(v) for v in (value if isinstance(value, list) else [value])]
+
+
+def _unquote(s):
+    return s[1:-1] if s[:1] == '"' else s
+
+
+def _parse_filters(filters):
+    """
+    Return the `filters` made of `attr:value` clauses joined by `AND` as
+    facet filters, or None when it uses another syntax.
+    """
+    facet_filters = []
+    for clause in re.split(r'\s+AND\s+', filters.strip()):
+        if not clause:
+            continue
+        m = _FILTER.match(clause)
+        if m is None:
+            return None
+        negate, attr, value = m.groups()
+        facet_filters.append('%s:%s%s' % (_unquote(attr),
+                                          '-' if negate else '',
+                                          _unquote(value)))
+    return facet_filters
+
+
+def _filter_match(record, facet_filter):
+    attr, _, value = facet_filter.partition(':')
+    negate = value.startswith('-')
+    found = value.lstrip('-') in _values(record, attr)
+    return found != negate
+
+
+class LocalSnapshot(object):
+    """
+    In-memory copy of a small index, answering `search` and `get_object`
+    when no host can be reached.
+
+    The records are loaded with `browse_all_async` and reloaded every
+    `interval` seconds once `start` was called, a failed reload keeping the
+    previous snapshot. Indices of more than `max_records` records are
+    refused. Searches match every query word as a prefix of a word of the
+    `attributes` (all of them by default), and support `facetFilters`,
+    `filters` made of `attr:value` clauses joined by `AND`, `facets` and
+    pagination; hits keep the order of the snapshot, without ranking.
+    Answers carry `servedFromSnapshot` (`_servedFromSnapshot` for objects)
+    and the time of the last reload.
+    """
+
+    def __init__(self, index, interval=300, attributes=None,
+                 max_records=50000, loop=None):
+        self.index = index
+        self.interval = interval
+        self.attributes = attributes
+        self.max_records = max_records
+        self.loop = loop or asyncio.get_event_loop()
+        self.refreshed_at = None
+        self.last_error = None
+        self.stats = {'refreshes': 0, 'errors': 0, 'searches': 0,
+                      'objects': 0, 'refused': 0}
+
+        self._records = []
+        self._positions = {}
+        self._words = []
+        self._postings = []
+        self._refreshing = None
+        self._worker = None
+
+        setattr(self, 'refresh', gen_sync(self, 'refresh'))
+
+    def __len__(self):
+        return len(self._records)
+
+    @property
+    def loaded(self):
+        return self.refreshed_at is not None
+
+    def start(self):
+        """
+        Load the snapshot and keep reloading it in the background, until the
+        snapshot or the client is closed.
+        """
+        if self._worker is None:
+            self._worker = asyncio.ensure_future(self._run(), loop=self.loop)
+            self.index._base.client._transport.closables.append(self)
+
+    @asyncio.coroutine
+    def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        closables = self.index._base.client._transport.closables
+        if self in closables:
+            closables.remove(self)
+
+    @asyncio.coroutine
+    def refresh_async(self):
+        """Reload the snapshot, sharing a reload already running."""
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._refresh(),
+                                                     loop=self.loop)
+            # Background reloads are not always awaited.
+            self._refreshing.add_done_callback(
+                lambda f: f.cancelled() or f.exception())
+        yield from asyncio.shield(self._refreshing, loop=self.loop)
+
+    @asyncio.coroutine
+    def _run(self):
+        while True:
+            try:
+                yield from self.refresh_async()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            yield from asyncio.sleep(self.interval, loop=self.loop)
+
+    @asyncio.coroutine
+    def _refresh(self):
+        try:
+            self.stats['refreshes'] += 1
+            records = []
+            it = self.index.browse_all_async()
+            yield from it.__aiter__()
+            while True:
+                try:
+                    hit = yield from it.__anext__()
+                except StopAsyncIteration:
+                    break
+                records.append({k: v for k, v in hit.items()
+                                if k not in ANSWER_ATTRIBUTES})
+                if len(records) > self.max_records:
+                    raise AlgoliaException(
+                        'Index %s has more than %d records, too many for a '
+                        'snapshot' % (self.index._base.index_name,
+                                      self.max_records))
+            self._load(records)
+            self.refreshed_at = time.time()
+            self.last_error = None
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.last_error = e
+            raise
+        finally:
+            self._refreshing = None
+
+    def _load(self, records):
+        words = {}
+        for position, record in enumerate(records):
+            if self.attributes is None:
+                text = {k: v for k, v in record.items() if k != 'objectID'}
+            else:
+                text = [record.get(a) for a in self.attributes]
+            for word in set(_tokens(text)):
+                words.setdefault(word, []).append(position)
+        self._records = records
+        self._positions = {str(r['objectID']): i
+                           for i, r in enumerate(records)}
+        self._words = sorted(words)
+        self._postings = [tuple(words[w]) for w in self._words]
+
+    def _matching(self, word):
+        """Return the positions of the records with a word starting so."""
+        positions = set()
+        i = bisect.bisect_left(self._words, word)
+        while i < len(self._words) and self._words[i].startswith(word):
+            positions.update(self._postings[i])
+            i += 1
+        return positions
+
+    def _refuse(self):
+        self.stats['refused'] += 1
+        return None
+
+    def search(self, query, args=None):
+        """Answer a search, or return None when it is not supported."""
+        args = dict(args or {})
+        if not self.loaded or set(args) - SEARCH_PARAMS:
+            return self._refuse()
+        facet_filters = _list(args.get('facetFilters')) or []
+        if args.get('filters'):
+            parsed = _parse_filters(args['filters'])
+            if parsed is None:
+                return self._refuse()
+            facet_filters = facet_filters + parsed
+
+        positions = None
+        for word in _tokens(query or ''):
+            matching = self._matching(word)
+            positions = matching if positions is None else \
+                positions & matching
+        if positions is None:
+            records = self._records
+        else:
+            records = [self._records[p] for p in sorted(positions)]
+
+        hits = []
+        for record in records:
+            if all(any(_filter_match(record, x) for x in f)
+                   if isinstance(f, list) else _filter_match(record, f)
+                   for f in facet_filters):
+                hits.append(record)
+
+        page = int(args.get('page', 0))
+        per_page = int(args.get('hitsPerPage', 20))
+        attrs = _list(args.get('attributesToRetrieve'))
+        res = {
+            'hits': [self._retrieve(h, attrs) for h in
+                     hits[page * per_page:(page + 1) * per_page]],
+            'nbHits': len(hits),
+            'page': page,
+            'nbPages': (len(hits) + per_page - 1) // per_page
+            if per_page else 0,
+            'hitsPerPage': per_page,
+            'processingTimeMS': 0,
+            'query': query,
+            'servedFromSnapshot': True,
+            'snapshotRefreshedAt': self.refreshed_at,
+        }
+        facets = _list(args.get('facets'))
+        if facets:
+            res['facets'] = self._facets(hits, facets,
+                                         int(args.get('maxValuesPerFacet',
+                                                      100)))
+        self.stats['searches'] += 1
+        return res
+
+    def get_object(self, object_id, attributes_to_retrieve=None):
+        """Return an object, or None when the snapshot is not loaded."""
+        if not self.loaded:
+            return self._refuse()
+        position = self._positions.get(str(object_id))
+        if position is None:
+            raise api_error(404, 'ObjectID does not exist')
+        self.stats['objects'] += 1
+        res = self._retrieve(self._records[position],
+                             _list(attributes_to_retrieve))
+        res['_servedFromSnapshot'] = True
+        return res
+
+    @staticmethod
+    def _retrieve(record, attrs):
+        if not attrs or '*' in attrs:
+            return dict(record)
+        res = {a: record[a] for a in attrs if a in record}
+        res['objectID'] = record['objectID']
+        return res
+
+    def _facets(self, hits, facets, max_values):
+        res = {}
+        for attr in facets:
+            counts = {}
+            for hit in hits:
+                for value in _values(hit, attr):
+                    counts[value] = counts.get(value, 0) + 1
+            top = sorted(counts.items(), key=lambda c: (-c[1], c[0]))
+            res[attr] = dict(top[:max_values])
+        return res
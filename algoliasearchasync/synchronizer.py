@@ -0,0 +1,210 @@
+import hashlib
+import json
+import sqlite3
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException, CustomJSONEncoder
+
+from .helpers import chunks, gather_bounded
+from .index import AsyncIndexIterator
+
+
+def digest(value):
+    """Return a short, stable hash of a JSON serializable value."""
+    raw = json.dumps(value, cls=CustomJSONEncoder, sort_keys=True,
+                     separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def record_hashes(record):
+    """Return the hash of a record and the hashes of each of its attributes."""
+    attrs = {k: digest(v) for k, v in record.items() if k != 'objectID'}
+    return digest(attrs), attrs
+
+
+class MemoryHashStore(object):
+    """Hash store kept in a dict, mostly useful for tests."""
+
+    def __init__(self):
+        self._hashes = {}
+
+    def load(self):
+        return {k: v[0] for k, v in self._hashes.items()}
+
+    def get_attributes(self, object_id):
+        return self._hashes[object_id][1]
+
+    def update(self, entries):
+        for object_id, record_hash, attrs in entries:
+            self._hashes[object_id] = (record_hash, attrs)
+
+    def delete(self, object_ids):
+        for object_id in object_ids:
+            self._hashes.pop(object_id, None)
+
+    def clear(self):
+        self._hashes.clear()
+
+    def close(self):
+        pass
+
+
+class SQLiteHashStore(object):
+    """Hash store persisted in a SQLite database."""
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS hashes ('
+            'object_id TEXT PRIMARY KEY, hash TEXT NOT NULL, '
+            'attributes TEXT NOT NULL)'
+        )
+        self._db.commit()
+
+    def load(self):
+        return dict(self._db.execute('SELECT object_id, hash FROM hashes'))
+
+    def get_attributes(self, object_id):
+        row = self._db.execute(
+            'SELECT attributes FROM hashes WHERE object_id = ?', (object_id,)
+        ).fetchone()
+        return json.loads(row[0])
+
+    def update(self, entries):
+        rows = [(o, h, json.dumps(a, sort_keys=True)) for o, h, a in entries]
+        self._db.executemany(
+            'INSERT OR REPLACE INTO hashes VALUES (?, ?, ?)', rows)
+        self._db.commit()
+
+    def delete(self, object_ids):
+        self._db.executemany('DELETE FROM hashes WHERE object_id = ?',
+                             [(o,) for o in object_ids])
+        self._db.commit()
+
+    def clear(self):
+        self._db.execute('DELETE FROM hashes')
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+class IndexSynchronizer(object):
+    """
+    Keep an index in sync with a local source of truth.
+
+    The hash of every record pushed to the index is kept in `store`, so that
+    each call to `sync_async` only sends the records that were added, changed
+    or removed since the previous one. Changed records are sent as partial
+    updates containing the modified attributes only.
+    """
+
+    def __init__(self, index, store, batch_size=1000, concurrency=4):
+        self.index = index
+        self.store = store
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+    @asyncio.coroutine
+    def seed_async(self, params=None):
+        """Fill the store with the hashes of the records currently indexed."""
+        self.store.clear()
+        iterator = yield from AsyncIndexIterator(self.index, params).__aiter__()
+
+        entries = []
+        try:
+            while True:
+                record = yield from iterator.__anext__()
+                record_hash, attrs = record_hashes(record)
+                entries.append((record['objectID'], record_hash, attrs))
+                if len(entries) == self.batch_size:
+                    self.store.update(entries)
+                    entries = []
+        except StopAsyncIteration:
+            pass
+
+        self.store.update(entries)
+
+    def diff(self, records):
+        """
+        Compare `records` to the store.
+
+        Return a tuple with the batch operations to send, the store entries to
+        update and the objectIDs to remove from the store once the operations
+        are acknowledged.
+        """
+        known = self.store.load()
+        operations = []
+        entries = []
+        seen = set()
+
+        for record in records:
+            if 'objectID' not in record:
+                raise AlgoliaException('Records must have an objectID')
+
+            object_id = record['objectID']
+            seen.add(object_id)
+            record_hash, attrs = record_hashes(record)
+            old_hash = known.get(object_id)
+
+            if old_hash == record_hash:
+                continue
+            entries.append((object_id, record_hash, attrs))
+
+            if old_hash is None:
+                operations.append(_operation('updateObject', record))
+                continue
+
+            old_attrs = self.store.get_attributes(object_id)
+            if set(old_attrs) - set(attrs):
+                # Attributes were removed, only a full update drops them.
+                operations.append(_operation('updateObject', record))
+                continue
+
+            body = {k: v for k, v in record.items()
+                    if old_attrs.get(k) != attrs.get(k)}
+            body['objectID'] = object_id
+            operations.append(_operation('partialUpdateObject', body))
+
+        deleted = [o for o in known if o not in seen]
+        for object_id in deleted:
+            operations.append({'action': 'deleteObject', 'objectID': object_id})
+
+        return operations, entries, deleted
+
+    @asyncio.coroutine
+    def sync_async(self, records, wait=False):
+        """
+        Push the difference between `records` and the store to the index.
+
+        `records` must be the full content the index is expected to hold.
+        Return a summary of the operations sent and their taskIDs.
+        """
+        operations, entries, deleted = self.diff(records)
+        entries = {e[0]: e for e in entries}
+        deleted = set(deleted)
+
+        @asyncio.coroutine
+        def send(batch):
+            res = yield from self.index.batch_async({'requests': batch})
+            ids = [op['objectID'] for op in batch]
+            self.store.update([entries[o] for o in ids if o in entries])
+            self.store.delete([o for o in ids if o in deleted])
+            return res['taskID']
+
+        coros = [send(b) for b in chunks(operations, self.batch_size)]
+        task_ids = yield from gather_bounded(coros, self.concurrency)
+
+        if wait:
+            yield from asyncio.gather(
+                *[self.index.wait_task_async(t) for t in task_ids])
+
+        summary = {'taskIDs': task_ids}
+        for op in operations:
+            summary[op['action']] = summary.get(op['action'], 0) + 1
+        return summary
+
+
+def _operation(action, body):
+    return {'action': action, 'objectID': body['objectID'], 'body': body}
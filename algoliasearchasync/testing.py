@@ -0,0 +1,799 @@
+"""
+In-process stand-in for the Algolia REST API.
+
+`StubServer` serves the endpoints used by this client from memory so that
+tests and benchmarks can run without network access or credentials:
+
+    server = StubServer(hosts=3)
+    yield from server.start()
+    client = server.client()
+    ...
+    yield from client.close()
+    yield from server.close()
+
+Every host is a distinct local HTTP server sharing the same data, so host
+failures (`fail_host`), latency (`latency`, `host_latency`) and errors
+(`inject_error`) can be simulated to exercise retries and failover. With
+`http2=True` the hosts speak cleartext HTTP/2 (with prior knowledge) instead
+of HTTP/1.1, which requires the `h2` package.
+"""
+import base64
+import copy
+import json
+import re
+import time
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from algoliasearch.helpers import CustomJSONEncoder
+
+HOST_UP = 'up'
+HOST_DOWN = 'down'
+HOST_ERROR = 'error'
+HOST_BLACKHOLE = 'blackhole'
+
+
+def _param(value):
+    """Decode a query parameter encoded by `algoliasearch.helpers.urlify`."""
+    if isinstance(value, str) and value[:1] in '[{':
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _params(qs):
+    return {k: _param(v) for k, v in parse_qsl(qs, keep_blank_values=True)}
+
+
+def _list(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(',') if v.strip()]
+    return list(value)
+
+
+def _int(value, default):
+    return default if value is None else int(value)
+
+
+def _log_matches(entry, type):
+    """Return whether a log entry is of a `get_logs` type."""
+    path = entry['url'].split('?')[0]
+    is_query = path.endswith('/query') or path.endswith('/queries')
+    if type == 'query':
+        return is_query
+    if type == 'build':
+        return not is_query and entry['method'] != 'GET'
+    if type == 'error':
+        return not entry['answer_code'].startswith('2')
+    return True
+
+
+def _tokens(value):
+    if isinstance(value, str):
+        return re.findall(r'\w+', value.lower())
+    if isinstance(value, (list, tuple)):
+        return [t for v in value for t in _tokens(v)]
+    if isinstance(value, dict):
+        return [t for v in value.values() for t in _tokens(v)]
+    return []
+
+
+def _values(record, attr):
+    value = record.get(attr)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _filter_match(record, facet_filter):
+    negate = facet_filter.startswith('-')
+    attr, _, value = facet_filter.lstrip('-').partition(':')
+    found = value in [str(v) for v in _values(record, attr)]
+    return found != negate
+
+
+def _facet_filters_match(record, facet_filters):
+    if isinstance(facet_filters, str):
+        facet_filters = _list(facet_filters)
+    for f in facet_filters or []:
+        if isinstance(f, list):
+            if not any(_filter_match(record, x) for x in f):
+                return False
+        elif not _filter_match(record, f):
+            return False
+    return True
+
+
+class StubIndex(object):
+    def __init__(self, name):
+        self.name = name
+        self.records = {}
+        self.settings = {}
+        self.synonyms = {}
+        self.rules = {}
+        self.updated_at = time.time()
+
+    def copy(self, name, scope=None, dst=None):
+        """
+        Copy the `scope` parts, all of them by default, to a new index, or to
+        `dst` whose other parts are kept when a scope is given.
+        """
+        if dst is None or scope is None:
+            dst = StubIndex(name)
+        parts = scope or ['records', 'settings', 'synonyms', 'rules']
+        for part in parts:
+            setattr(dst, part, copy.deepcopy(getattr(self, part)))
+        return dst
+
+    def match(self, params):
+        words = _tokens(params.get('query', ''))
+        searchable = _list(self.settings.get('searchableAttributes'))
+        facet_filters = params.get('facetFilters')
+
+        hits = []
+        for record in self.records.values():
+            if facet_filters and not _facet_filters_match(record,
+                                                          facet_filters):
+                continue
+            if words:
+                if searchable:
+                    tokens = _tokens([record.get(a) for a in searchable])
+                else:
+                    tokens = _tokens({k: v for k, v in record.items()
+                                      if k != 'objectID'})
+                if not all(any(t.startswith(w) for t in tokens)
+                           for w in words):
+                    continue
+            hits.append(record)
+        return hits
+
+    def search(self, params):
+        hits = self.match(params)
+        page = _int(params.get('page'), 0)
+        per_page = _int(params.get('hitsPerPage'),
+                        self.settings.get('hitsPerPage', 20))
+        nb_pages = (len(hits) + per_page - 1) // per_page if per_page else 0
+        attrs = _list(params.get('attributesToRetrieve'))
+
+        res = {
+            'hits': [self.retrieve(h, attrs)
+                     for h in hits[page * per_page:(page + 1) * per_page]],
+            'nbHits': len(hits),
+            'page': page,
+            'nbPages': nb_pages,
+            'hitsPerPage': per_page,
+            'processingTimeMS': 1,
+            'exhaustiveNbHits': True,
+            'query': params.get('query', ''),
+            'params': params.get('_raw', ''),
+            'index': self.name,
+        }
+
+        facets = _list(params.get('facets'))
+        if facets:
+            res['facets'] = self.facets(hits, facets)
+            res['exhaustiveFacetsCount'] = True
+        return res
+
+    def facets(self, hits, names):
+        if '*' in names:
+            names = sorted({k for h in hits for k in h if k != 'objectID'})
+        facets = {}
+        for name in names:
+            counts = {}
+            for hit in hits:
+                for value in _values(hit, name):
+                    if isinstance(value, (dict, list)):
+                        continue
+                    counts[str(value)] = counts.get(str(value), 0) + 1
+            if counts:
+                facets[name] = counts
+        return facets
+
+    def facet_values(self, facet, params):
+        query = params.get('facetQuery', '').lower()
+        counts = self.facets(self.match(params), [facet]).get(facet, {})
+        hits = [{'value': v, 'highlighted': v, 'count': c}
+                for v, c in counts.items() if v.lower().startswith(query)]
+        hits.sort(key=lambda h: -h['count'])
+        return {'facetHits': hits, 'processingTimeMS': 1}
+
+    @staticmethod
+    def retrieve(record, attrs):
+        if not attrs or '*' in attrs:
+            return dict(record)
+        res = {k: record[k] for k in attrs if k in record}
+        res['objectID'] = record['objectID']
+        return res
+
+
+class _H2Protocol(asyncio.Protocol):
+    """Minimal HTTP/2 server connection handing requests to a StubServer."""
+
+    def __init__(self, stub, host):
+        import h2.config
+        import h2.connection
+
+        self.stub = stub
+        self.host = host
+        config = h2.config.H2Configuration(client_side=False,
+                                           header_encoding='utf-8')
+        self.conn = h2.connection.H2Connection(config=config)
+        self.streams = {}
+        self.windows = {}
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.peer = transport.get_extra_info('peername')
+        self.stub._h2_transports.add(transport)
+        self.conn.initiate_connection()
+        self.transport.write(self.conn.data_to_send())
+
+    def connection_lost(self, exc):
+        self.stub._h2_transports.discard(self.transport)
+        for waiter in self.windows.values():
+            if not waiter.done():
+                waiter.cancel()
+
+    def data_received(self, data):
+        import h2.events
+        import h2.exceptions
+
+        try:
+            events = self.conn.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self.transport.close()
+            return
+
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self.streams[event.stream_id] = (dict(event.headers),
+                                                 bytearray())
+            elif isinstance(event, h2.events.DataReceived):
+                self.streams[event.stream_id][1].extend(event.data)
+                self.conn.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                headers, body = self.streams.pop(event.stream_id)
+                asyncio.ensure_future(
+                    self.respond(event.stream_id, headers, bytes(body)),
+                    loop=self.stub.loop)
+            elif isinstance(event, h2.events.WindowUpdated):
+                for waiter in self.windows.values():
+                    if not waiter.done():
+                        waiter.set_result(None)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+        self.transport.write(self.conn.data_to_send())
+
+    @asyncio.coroutine
+    def respond(self, stream_id, headers, body):
+        url = urlsplit(headers[':path'])
+        res = yield from self.stub._respond(
+            self.host, headers[':method'], url.path, url.query,
+            body.decode('utf-8'), self.peer)
+        if self.transport.is_closing():
+            return
+        if res is None:
+            self.transport.close()
+            return
+
+        import h2.exceptions
+
+        data = res[1].encode('utf-8')
+        try:
+            self.conn.send_headers(stream_id, [
+                (':status', str(res[0])),
+                ('content-type', 'application/json'),
+                ('content-length', str(len(data))),
+            ])
+            while data:
+                window = min(self.conn.local_flow_control_window(stream_id),
+                             self.conn.max_outbound_frame_size)
+                if window <= 0:
+                    self.transport.write(self.conn.data_to_send())
+                    waiter = asyncio.Future(loop=self.stub.loop)
+                    self.windows[stream_id] = waiter
+                    try:
+                        yield from waiter
+                    finally:
+                        self.windows.pop(stream_id, None)
+                    continue
+                self.conn.send_data(stream_id, data[:window])
+                data = data[window:]
+            self.conn.end_stream(stream_id)
+        except h2.exceptions.StreamClosedError:
+            pass
+        self.transport.write(self.conn.data_to_send())
+
+
+class StubServer(object):
+    """
+    Serve a subset of the Algolia API from memory on `hosts` local ports.
+
+    `fixtures` is an optional path to a JSON file written by `dump_fixtures`,
+    used to seed the indexes and to replay canned responses. Request bodies
+    larger than `max_body_size` are rejected with a 413.
+    """
+
+    def __init__(self, hosts=3, latency=0, fixtures=None,
+                 max_body_size=10 * 1024 ** 2, http2=False, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.nb_hosts = hosts
+        self.http2 = http2
+        self.max_body_size = max_body_size
+        self.latency = latency
+        self.host_latency = {}
+        self.host_state = {}
+        self.indexes = {}
+        self.keys = {}
+        self.logs = []
+        self.requests = []
+        self.connections = set()
+        self.responses = []
+        self._errors = []
+        self._servers = []
+        self._addresses = []
+        self._h2_transports = set()
+        self._task_id = 0
+        if fixtures is not None:
+            self.load_fixtures(fixtures)
+
+    # Lifecycle.
+
+    @asyncio.coroutine
+    def start(self):
+        for i in range(self.nb_hosts):
+            if self.http2:
+                server = yield from self.loop.create_server(
+                    lambda i=i: _H2Protocol(self, i), '127.0.0.1', 0)
+                address = server.sockets[0].getsockname()[:2]
+            else:
+                app = web.Application(client_max_size=self.max_body_size)
+                app.router.add_route('*', '/{path:.*}', self._handler(i))
+                server = TestServer(app, loop=self.loop)
+                yield from server.start_server(loop=self.loop)
+                address = (server.host, server.port)
+            self._servers.append(server)
+            self._addresses.append(address)
+
+    @asyncio.coroutine
+    def close(self):
+        for transport in list(self._h2_transports):
+            transport.close()
+        for server in self._servers:
+            if self.http2:
+                server.close()
+                yield from server.wait_closed()
+            else:
+                yield from server.close()
+        self._servers = []
+        self._addresses = []
+
+    @property
+    def hosts(self):
+        return ['http://%s:%d' % a for a in self._addresses]
+
+    def client(self, app_id='stub', api_key='stub', **kwargs):
+        """Return a `ClientAsync` pointed at this server's hosts."""
+        from .client import ClientAsync
+        return ClientAsync(app_id, api_key, self.hosts, **kwargs)
+
+    # Fault injection.
+
+    def fail_host(self, i, mode=HOST_DOWN):
+        """
+        Make host `i` fail: HOST_DOWN drops connections, HOST_ERROR answers
+        with a 503 and HOST_BLACKHOLE never answers.
+        """
+        self.host_state[i] = mode
+
+    def restore_host(self, i):
+        self.host_state.pop(i, None)
+
+    def inject_error(self, status=500, count=1, path=None, host=None,
+                     message='Injected error'):
+        """Answer the next `count` requests matching `path` with `status`."""
+        self._errors.append({'status': status, 'count': count, 'path': path,
+                             'host': host, 'message': message})
+
+    # Fixtures.
+
+    def load_fixtures(self, path):
+        with open(path) as f:
+            fixtures = json.load(f)
+        for name, data in fixtures.get('indexes', {}).items():
+            index = self.index(name)
+            for record in data.get('records', []):
+                index.records[str(record['objectID'])] = record
+            index.settings.update(data.get('settings', {}))
+            for synonym in data.get('synonyms', []):
+                index.synonyms[synonym['objectID']] = synonym
+            for rule in data.get('rules', []):
+                index.rules[rule['objectID']] = rule
+        self.responses.extend(fixtures.get('responses', []))
+
+    def dump_fixtures(self, path):
+        fixtures = {'indexes': {}, 'responses': self.responses}
+        for name, index in self.indexes.items():
+            fixtures['indexes'][name] = {
+                'records': list(index.records.values()),
+                'settings': index.settings,
+                'synonyms': list(index.synonyms.values()),
+                'rules': list(index.rules.values()),
+            }
+        with open(path, 'w') as f:
+            json.dump(fixtures, f, cls=CustomJSONEncoder, indent=2)
+
+    # Data helpers.
+
+    def index(self, name):
+        if name not in self.indexes:
+            self.indexes[name] = StubIndex(name)
+        return self.indexes[name]
+
+    def next_task(self):
+        self._task_id += 1
+        return self._task_id
+
+    # HTTP handling.
+
+    def _handler(self, host):
+        @asyncio.coroutine
+        def handle(request):
+            body = yield from request.text()
+            peer = request.transport.get_extra_info('peername')
+            path = request.raw_path.split('?')[0]
+            res = yield from self._respond(host, request.method, path,
+                                           request.query_string, body, peer)
+            if res is None:
+                request.transport.close()
+                return web.Response(status=503)
+            return web.Response(status=res[0], text=res[1],
+                                content_type='application/json')
+        return handle
+
+    @asyncio.coroutine
+    def _respond(self, host, method, path, query_string, body, peer):
+        """
+        Return the status and body of the response to a request, or None if
+        the connection must be dropped.
+        """
+        self.connections.add((host, peer))
+        state = self.host_state.get(host, HOST_UP)
+        if state == HOST_DOWN:
+            return None
+        if state == HOST_BLACKHOLE:
+            yield from asyncio.sleep(3600, loop=self.loop)
+
+        latency = self.host_latency.get(host, self.latency)
+        if latency:
+            yield from asyncio.sleep(latency, loop=self.loop)
+
+        data = json.loads(body) if body else None
+        params = dict(parse_qsl(query_string, keep_blank_values=True))
+        self.requests.append((host, method, path))
+
+        if state == HOST_ERROR:
+            status, res = 503, {'message': 'Service unavailable'}
+        else:
+            status, res = self._injected(host, path)
+            if status is None:
+                status, res = self._canned(method, path)
+            if status is None:
+                try:
+                    status, res = self._dispatch(method, path, params, data)
+                except (KeyError, ValueError, TypeError) as e:
+                    status, res = 400, {'message': 'Bad request: %r' % e}
+
+        self.logs.insert(0, {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'method': method,
+            'answer_code': str(status),
+            'query_body': body,
+            'url': path + ('?' + query_string if query_string else ''),
+            'ip': '127.0.0.1',
+            'sha1': str(len(self.logs)),
+            'processing_time_ms': '1',
+        })
+        return status, json.dumps(res, cls=CustomJSONEncoder)
+
+    def _injected(self, host, path):
+        for error in self._errors:
+            if error['path'] is not None and error['path'] not in path:
+                continue
+            if error['host'] is not None and error['host'] != host:
+                continue
+            error['count'] -= 1
+            if error['count'] <= 0:
+                self._errors.remove(error)
+            return error['status'], {'message': error['message']}
+        return None, None
+
+    def _canned(self, method, path):
+        for res in self.responses:
+            if res['method'] == method and res['path'] == path:
+                return res.get('status', 200), res['body']
+        return None, None
+
+    def _dispatch(self, method, path, params, data):
+        parts = [unquote(p) for p in path.split('/')[2:]]
+        if path.startswith('/1/indexes'):
+            if len(parts) == 1:
+                return self._list_indexes(params)
+            name = parts[1]
+            if name == '*':
+                return self._multi(parts[2], data)
+            index = self.indexes.get(name) or StubIndex(name)
+            return self._index_route(index, method, parts[2:], params, data)
+        if parts[:1] == ['keys']:
+            return self._keys(method, parts[1:], data, None)
+        if parts[:1] == ['logs']:
+            offset = _int(params.get('offset'), 0)
+            length = _int(params.get('length'), 10)
+            logs = [e for e in self.logs
+                    if _log_matches(e, params.get('type', 'all'))]
+            return 200, {'logs': logs[offset:offset + length]}
+        if parts[:1] == ['isalive']:
+            return 200, {'message': 'server is alive'}
+        return 404, {'message': 'Not found: %s' % path}
+
+    def _write(self, index, extra=None, persist=True):
+        if persist:
+            self.indexes.setdefault(index.name, index)
+        index.updated_at = time.time()
+        res = {'taskID': self.next_task(),
+               'updatedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ')}
+        res.update(extra or {})
+        return 200, res
+
+    def _list_indexes(self, params):
+        items = [{
+            'name': name,
+            'entries': len(index.records),
+            'updatedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                       time.gmtime(index.updated_at)),
+        } for name, index in sorted(self.indexes.items())]
+        if 'page' not in params:
+            return 200, {'items': items, 'nbPages': 1}
+        page = int(params['page'])
+        per_page = _int(params.get('hitsPerPage'), 100)
+        return 200, {'items': items[page * per_page:(page + 1) * per_page],
+                     'nbPages': (len(items) + per_page - 1) // per_page}
+
+    def _multi(self, op, data):
+        if op == 'queries':
+            results = []
+            for query in data['requests']:
+                params = _params(query.get('params', ''))
+                params['_raw'] = query.get('params', '')
+                index = self.indexes.get(query['indexName'],
+                                         StubIndex(query['indexName']))
+                results.append(index.search(params))
+            return 200, {'results': results}
+        if op == 'objects':
+            results = []
+            for req in data['requests']:
+                index = self.indexes.get(req['indexName'])
+                record = index and index.records.get(str(req['objectID']))
+                attrs = _list(req.get('attributesToRetrieve'))
+                results.append(record and StubIndex.retrieve(record, attrs))
+            return 200, {'results': results}
+        if op == 'batch':
+            task_ids, object_ids = {}, []
+            for req in data['requests']:
+                index = self.index(req['indexName'])
+                object_ids.extend(self._batch(index, [req]))
+                index.updated_at = time.time()
+                task_ids[index.name] = self.next_task()
+            return 200, {'taskID': task_ids, 'objectIDs': object_ids}
+        return 404, {'message': 'Not found'}
+
+    def _index_route(self, index, method, parts, params, data):
+        if not parts:
+            if method == 'DELETE':
+                self.indexes.pop(index.name, None)
+                return self._write(index, {'deletedAt': 'now'}, False)
+            if method == 'POST':
+                object_id = str(self.next_task())
+                data['objectID'] = object_id
+                index.records[object_id] = data
+                return self._write(index, {'objectID': object_id})
+            return self._search(index, params)
+
+        route = parts[0]
+        if route == 'query':
+            params = _params(data.get('params', ''))
+            params['_raw'] = data.get('params', '')
+            return 200, index.search(params)
+        if route == 'browse':
+            return self._browse(index, data if method == 'POST' else params)
+        if route == 'batch':
+            object_ids = self._batch(index, data['requests'])
+            return self._write(index, {'objectIDs': object_ids},
+                               index.name in self.indexes or not any(
+                                   r['action'] == 'delete'
+                                   for r in data['requests']))
+        if route == 'task':
+            return 200, {'status': 'published', 'pendingTask': False}
+        if route == 'settings':
+            if method == 'GET':
+                return 200, dict(index.settings)
+            for k, v in data.items():
+                if v is None:
+                    index.settings.pop(k, None)
+                else:
+                    index.settings[k] = v
+            return self._write(index)
+        if route == 'clear':
+            index.records.clear()
+            return self._write(index)
+        if route == 'operation':
+            scope = data.get('scope')
+            self.indexes[data['destination']] = index.copy(
+                data['destination'], scope,
+                self.indexes.get(data['destination']))
+            if data['operation'] == 'move':
+                self.indexes.pop(index.name, None)
+            return self._write(index, persist=data['operation'] != 'move')
+        if route == 'facets':
+            params = _params(data.get('params', ''))
+            return 200, index.facet_values(parts[1], params)
+        if route == 'synonyms':
+            return self._collection(index, index.synonyms, method, parts[1:],
+                                    params, data, 'replaceExistingSynonyms')
+        if route == 'rules':
+            return self._collection(index, index.rules, method, parts[1:],
+                                    params, data, 'clearExistingRules')
+        if route == 'keys':
+            return self._keys(method, parts[1:], data, index.name)
+        return self._object(index, method, parts, params, data)
+
+    def _search(self, index, params):
+        params = dict(params)
+        params['_raw'] = ''
+        return 200, index.search({k: _param(v) for k, v in params.items()})
+
+    def _browse(self, index, params):
+        params = params or {}
+        if params.get('cursor'):
+            state = json.loads(base64.b64decode(params['cursor']).decode())
+            params, offset = state['params'], state['offset']
+        else:
+            offset = 0
+        params = {k: _param(v) for k, v in params.items()}
+        per_page = _int(params.get('hitsPerPage'), 1000)
+        hits = index.match(params)
+        attrs = _list(params.get('attributesToRetrieve'))
+
+        res = {
+            'hits': [StubIndex.retrieve(h, attrs)
+                     for h in hits[offset:offset + per_page]],
+            'nbHits': len(hits),
+            'processingTimeMS': 1,
+        }
+        if offset + per_page < len(hits):
+            state = {'params': params, 'offset': offset + per_page}
+            res['cursor'] = base64.b64encode(
+                json.dumps(state).encode()).decode()
+        return 200, res
+
+    def _batch(self, index, requests):
+        object_ids = []
+        for req in requests:
+            action = req['action']
+            body = req.get('body') or {}
+            object_id = str(req.get('objectID', body.get('objectID', '')))
+            if action == 'addObject':
+                object_id = object_id or str(self.next_task())
+                index.records[object_id] = dict(body, objectID=object_id)
+            elif action == 'updateObject':
+                index.records[object_id] = dict(body, objectID=object_id)
+            elif action in ('partialUpdateObject',
+                            'partialUpdateObjectNoCreate'):
+                if object_id in index.records:
+                    index.records[object_id].update(body)
+                elif action == 'partialUpdateObject':
+                    index.records[object_id] = dict(body, objectID=object_id)
+            elif action == 'deleteObject':
+                index.records.pop(object_id, None)
+            elif action == 'clear':
+                index.records.clear()
+            elif action == 'delete':
+                self.indexes.pop(index.name, None)
+            object_ids.append(object_id)
+        return object_ids
+
+    def _object(self, index, method, parts, params, data):
+        object_id = parts[0]
+        if method == 'GET':
+            if object_id not in index.records:
+                return 404, {'message': 'ObjectID does not exist'}
+            attrs = _list(params.get('attributesToRetrieve'))
+            return 200, StubIndex.retrieve(index.records[object_id], attrs)
+        if method == 'PUT':
+            index.records[object_id] = dict(data, objectID=object_id)
+            return self._write(index, {'objectID': object_id})
+        if method == 'DELETE':
+            index.records.pop(object_id, None)
+            return self._write(index, {'objectID': object_id})
+        if parts[1:] == ['partial']:
+            if object_id in index.records:
+                index.records[object_id].update(data)
+            elif params.get('createIfNotExists') != 'false':
+                index.records[object_id] = dict(data, objectID=object_id)
+            return self._write(index, {'objectID': object_id})
+        return 404, {'message': 'Not found'}
+
+    def _collection(self, index, items, method, parts, params, data,
+                    replace_param):
+        if not parts:
+            return 404, {'message': 'Not found'}
+        if parts[0] == 'batch':
+            if params.get(replace_param) == 'true':
+                items.clear()
+            for item in data:
+                items[item['objectID']] = item
+            return self._write(index)
+        if parts[0] == 'clear':
+            items.clear()
+            return self._write(index)
+        if parts[0] == 'search':
+            data = data or {}
+            query = data.get('query', '').lower()
+            types = _list(data.get('type')) or []
+            hits = [i for i in items.values()
+                    if (not types or i.get('type') in types)
+                    and (not query or query in json.dumps(i).lower())]
+            page = _int(data.get('page'), 0)
+            per_page = _int(data.get('hitsPerPage'), 100)
+            return 200, {'hits': hits[page * per_page:(page + 1) * per_page],
+                         'nbHits': len(hits)}
+
+        object_id = parts[0]
+        if method == 'GET':
+            if object_id not in items:
+                return 404, {'message': 'Synonym set does not exist'}
+            return 200, items[object_id]
+        if method == 'PUT':
+            items[object_id] = dict(data, objectID=object_id)
+            return self._write(index, {'id': object_id})
+        if method == 'DELETE':
+            items.pop(object_id, None)
+            return self._write(index, {'deletedAt': 'now'})
+        return 404, {'message': 'Not found'}
+
+    def _keys(self, method, parts, data, index_name):
+        keys = {k: v for k, v in self.keys.items()
+                if index_name is None or v.get('_index') == index_name}
+
+        def public(key):
+            return {k: v for k, v in key.items() if k != '_index'}
+
+        if not parts:
+            if method == 'GET':
+                return 200, {'keys': [public(k) for k in keys.values()]}
+            key = 'stubkey%d' % self.next_task()
+            self.keys[key] = dict(data, value=key, _index=index_name)
+            return 200, {'key': key, 'createdAt': 'now'}
+
+        key = parts[0]
+        if key not in keys:
+            return 404, {'message': 'Key does not exist'}
+        if method == 'GET':
+            return 200, public(keys[key])
+        if method == 'PUT':
+            self.keys[key].update(data)
+            return 200, {'key': key, 'updatedAt': 'now'}
+        if method == 'DELETE':
+            del self.keys[key]
+            return 200, {'deletedAt': 'now'}
+        return 404, {'message': 'Not found'}
@@ -1,17 +1,87 @@
 import json
+import random
 import time
 
-import aiohttp
 import asyncio
-import async_timeout
 
 from algoliasearch.helpers import AlgoliaException, CustomJSONEncoder, urlify, rotate
 
+from .circuit import CircuitBreaker, CircuitOpenException
+
 
 DNS_TIMER_DELAY = 5 * 60  # 5 minutes
 
 
-class Transport:
+class UnreachableHostsException(AlgoliaException):
+    """Raised when none of the hosts answered a request."""
+
+
+def api_error(status, message):
+    """Return the `AlgoliaException` for an API error answer."""
+    e = AlgoliaException(message)
+    e.status = status
+    return e
+
+
+class HostState(object):
+    """Exponentially weighted moving average of a host's response time."""
+
+    def __init__(self, host):
+        self.host = host
+        self.ewma = None
+        self.samples = 0
+        self.failures = 0
+        self.failed_at = None
+
+    def success(self, elapsed, alpha):
+        if self.ewma is None:
+            self.ewma = elapsed
+        else:
+            self.ewma = alpha * elapsed + (1 - alpha) * self.ewma
+        self.samples += 1
+        self.failed_at = None
+
+    def failure(self):
+        self.failures += 1
+        self.failed_at = time.time()
+
+    def is_healthy(self, now):
+        return self.failed_at is None or now - self.failed_at > DNS_TIMER_DELAY
+
+    def to_dict(self, now):
+        return {
+            'host': self.host,
+            'ewma_ms': None if self.ewma is None else self.ewma * 1000,
+            'samples': self.samples,
+            'failures': self.failures,
+            'healthy': self.is_healthy(now),
+        }
+
+
+class BaseTransport(object):
+    """
+    Retry logic and host selection shared by all transports.
+
+    `ClientAsync` accepts any object providing the attributes `headers`,
+    `read_hosts`, `write_hosts`, `timeout`, `search_timeout` and
+    `conn_timeout` along with the coroutines `req`, `set_conn_timeout` and
+    `close`. Subclasses of this class only implement the HTTP exchange:
+    `_init_session`, `_send` and `close`. The session is only created by
+    `_init_session` before the first request, which keeps clients that are
+    never used cheap.
+
+    Callables in `listeners` are called after each attempt with the host,
+    path, method, elapsed time in seconds and the exception raised, if any.
+    When `recorder` is set, each request is passed to its `record` method
+    (see `recorder.TrafficRecorder`). When `scheduler` is set, requests wait
+    for a slot of their class (see `scheduler.RequestScheduler`). When
+    `circuit_breaker` is set, hosts failing repeatedly are skipped (see
+    `circuit.CircuitBreaker`). When `profiler` is set, the time spent in
+    each phase of the requests is reported to it (see `profiler.Profiler`).
+    When `regions` is set, reads are routed by region (see
+    `regions.RegionRouter`).
+    """
+
     def __init__(self, http_search):
         self.headers = {}
         self.read_hosts = []
@@ -23,11 +93,27 @@ class Transport:
         self.search_timeout = 5
         self.http_search = http_search
 
-        self._init_session()
+        # Send reads to the healthy host with the lowest average response
+        # time, trying another one on `probe_rate` of them.
+        self.latency_routing = True
+        self.latency_alpha = 0.2
+        self.probe_rate = 0.05
+        self._host_states = {}
+        self.listeners = []
+        self.recorder = None
+        self.scheduler = None
+        # Options of the circuit breakers, disabled when None.
+        self.circuit_breaker = None
+        self._breakers = {}
+        self.profiler = None
+        self.regions = None
+        # Objects with a `close` coroutine to call when the client is
+        # closed, such as snapshots reloading in the background.
+        self.closables = []
+        self.session = None
 
     def _init_session(self):
-        connector = aiohttp.TCPConnector(use_dns_cache=False)
-        self.session = aiohttp.ClientSession(conn_timeout=self.conn_timeout, connector=connector)
+        raise NotImplementedError
 
     @property
     def read_hosts(self):
@@ -53,20 +139,37 @@ class Transport:
 
     @asyncio.coroutine
     def set_conn_timeout(self, t):
-        if not self.session.closed:
-            yield from self.session.close()
+        yield from self.close()
         self._conn_timeout = t
-        self._init_session()
+        self.session = None
 
     @asyncio.coroutine
     def close(self):
-        if not self.session.closed:
-            yield from self.session.close()
+        raise NotImplementedError
 
     @asyncio.coroutine
     def req(self, is_search, path, meth, params=None, data=None, request_options=None):
         """Perform an HTTPS request with retry logic."""
+        if self.profiler is None:
+            return (yield from self._request(is_search, path, meth, params,
+                                             data, request_options))
+
+        sample = self.profiler.begin(meth, path)
+        error = True
+        try:
+            res = yield from self._request(is_search, path, meth, params,
+                                           data, request_options)
+            error = False
+            return res
+        finally:
+            self.profiler.end(sample, error)
 
+    def _profile(self, phase, start):
+        if self.profiler is not None:
+            self.profiler.add(phase, start)
+
+    @asyncio.coroutine
+    def _request(self, is_search, path, meth, params, data, request_options):
         # Merge params and request_options params.
         params = {} if params is None else params.copy()
         if request_options is not None and request_options.parameters is not None:
@@ -79,58 +182,186 @@ class Transport:
             headers.update(request_options.headers)
 
         if data is not None:
+            start = time.perf_counter()
             data = json.dumps(data, cls=CustomJSONEncoder)
+            self._profile('encode', start)
+
+        if self.scheduler is None:
+            return (yield from self._record(is_search, path, meth, params,
+                                            data, headers))
 
+        cls = self.scheduler.classify(path, meth, is_search)
+        start = time.perf_counter()
+        yield from self.scheduler.acquire(cls)
+        self._profile('queue', start)
+        try:
+            return (yield from self._record(is_search, path, meth, params,
+                                            data, headers))
+        finally:
+            self.scheduler.release(cls)
+
+    @asyncio.coroutine
+    def _record(self, is_search, path, meth, params, data, headers):
+        if self.recorder is None:
+            return (yield from self._retry(is_search, path, meth, params, data,
+                                           headers))
+
+        start = time.time()
+        status = None
+        try:
+            res = yield from self._retry(is_search, path, meth, params, data,
+                                         headers)
+            status = 200
+            return res
+        except AlgoliaException as e:
+            status = getattr(e, 'status', None)
+            raise
+        finally:
+            self.recorder.record(meth, path, params, data, is_search,
+                                 start, time.time() - start, status)
+
+    @asyncio.coroutine
+    def _retry(self, is_search, path, meth, params, data, headers):
+        """Try the hosts in turn until one of them answers."""
+        if self.session is None:
+            self._init_session()
         hosts = self._get_hosts(is_search)
         timeout = self.search_timeout if is_search else self.timeout
+        conn_timeout = self.conn_timeout
 
         exceptions = {}
         for i, host in enumerate(hosts):
-            old_timeout = None
+            breaker = self._breaker(host, is_search)
+            if breaker is not None:
+                token = breaker.allow()
+                if not token:
+                    exceptions[host] = 'Circuit open'
+                    continue
+
+            # Give more time to the last hosts, without touching the session
+            # shared with the other requests in flight.
             if i > 1:
                 timeout += 10
-                old_timeout = self.conn_timeout
-                yield from self.set_conn_timeout(self.conn_timeout + 2)
+                conn_timeout += 2
 
+            state = self._host_state(host)
+            url = self._url(host, path, is_search)
+            start = time.time()
+            error = None
             try:
-                coro = self._req(host, path, meth, timeout, params, data, is_search)
-                return (yield from coro)
+                coro = self._send(url, meth, params, data, headers, timeout,
+                                  conn_timeout)
+                res = yield from coro
+                state.success(time.time() - start, self.latency_alpha)
+                if breaker is not None:
+                    breaker.success(token)
+                return res
             except AlgoliaException as e:
+                state.success(time.time() - start, self.latency_alpha)
+                if breaker is not None:
+                    breaker.success(token)
+                error = e
+                raise e
+            except asyncio.CancelledError as e:
+                if breaker is not None:
+                    breaker.cancel(token)
+                error = e
                 raise e
-            # TODO: Handle task canceling.
             except Exception as e:
+                state.failure()
+                if breaker is not None:
+                    breaker.failure(token)
                 self._rotate_hosts(is_search)
                 self._dns_timer = time.time()
                 exceptions[host] = '%s: %s' % (e.__class__.__name__, str(e))
+                error = e
             finally:
-                if old_timeout is not None:
-                    yield from self.set_conn_timeout(old_timeout)
+                self._notify(host, path, meth, time.time() - start, error)
+
+        if exceptions and all(e == 'Circuit open' for e in exceptions.values()):
+            raise CircuitOpenException(
+                'Circuit open for all hosts: %s' % ', '.join(exceptions))
+        raise UnreachableHostsException('Unreachable hosts: %s', exceptions)
+
+    def _breaker(self, host, is_search):
+        if self.circuit_breaker is None:
+            return None
+        key = (host, 'read' if is_search else 'write')
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(key, **self.circuit_breaker)
+        return self._breakers[key]
+
+    def circuit_states(self):
+        """Return the state of the circuit breakers."""
+        return [b.to_dict() for _, b in sorted(self._breakers.items())]
 
-        raise AlgoliaException('Unreachable hosts: %s', exceptions)
+    def _url(self, host, path, is_search):
+        if '://' in host:
+            return '%s%s' % (host, path)
+        elif is_search and self.http_search:
+            return 'http://%s%s' % (host, path)
+        else:
+            return 'https://%s%s' % (host, path)
 
     @asyncio.coroutine
-    def _req(self, host, path, meth, timeout, params, data, is_search):
-        """Perform an HTTPS request with aiohttp's ClientSession."""
-        if is_search and self.http_search:
-            url = 'http://%s%s' % (host, path)
+    def _send(self, url, meth, params, data, headers, timeout,
+              conn_timeout):
+        """
+        Send one request and return the decoded JSON answer. 4XX answers
+        raise an `AlgoliaException`, any other error makes `req` retry on
+        the next host.
+        """
+        raise NotImplementedError
+
+    def _notify(self, host, path, meth, elapsed, error):
+        for listener in self.listeners:
+            listener(host, path, meth, elapsed, error)
+
+    def _host_state(self, host):
+        if host not in self._host_states:
+            self._host_states[host] = HostState(host)
+        return self._host_states[host]
+
+    def _rank_hosts(self, hosts):
+        """
+        Order `hosts` by health then average response time. Hosts without
+        measurement keep their configured order after the measured ones.
+        """
+        now = time.time()
+        states = [self._host_state(h) for h in hosts]
+        healthy = [s for s in states if s.is_healthy(now)]
+        measured = sorted([s for s in healthy if s.ewma is not None],
+                          key=lambda s: s.ewma)
+        unmeasured = [s for s in healthy if s.ewma is None]
+        failed = sorted([s for s in states if not s.is_healthy(now)],
+                        key=lambda s: s.failed_at)
+        return measured + unmeasured + failed
+
+    def host_ranking(self, is_search=True):
+        """Return the state of the hosts, in the order they are tried."""
+        if is_search and self.regions is not None:
+            states = self.regions.rank(self._rank_hosts)
+        elif is_search and self.latency_routing:
+            states = self._rank_hosts(self._original_read_hosts)
         else:
-            url = 'https://%s%s' % (host, path)
-        req = self.session.request(meth, url, params=params, data=data,
-                                   headers=self.headers)
-        res = yield from req
-        with async_timeout.timeout(timeout):
-            if res.status // 100 == 2:
-                return (yield from res.json())
-            elif res.status // 100 == 4:
-                message = 'HTTP Code: %d' % res.status
-                try:
-                    message = (yield from res.json())['message']
-                finally:
-                    raise AlgoliaException(message)
-        # TODO: Check this for replacement.
-        res.raise_for_status()
+            states = [self._host_state(h) for h in self._get_hosts(is_search)]
+        now = time.time()
+        return [s.to_dict(now) for s in states]
 
     def _get_hosts(self, is_search):
+        if is_search and self.regions is not None:
+            return self.regions.read_hosts(self._rank_hosts, self.probe_rate)
+        if is_search and self.latency_routing:
+            states = self._rank_hosts(self._original_read_hosts)
+            hosts = [s.host for s in states]
+            now = time.time()
+            nb_healthy = len([s for s in states if s.is_healthy(now)])
+            if nb_healthy > 1 and random.random() < self.probe_rate:
+                # Keep the estimates of the other healthy hosts fresh.
+                probe = random.randrange(1, nb_healthy)
+                hosts.insert(0, hosts.pop(probe))
+            return hosts
+
         secs_since_rotate = time.time() - self._dns_timer
         if is_search:
             if secs_since_rotate < DNS_TIMER_DELAY:
@@ -148,3 +379,101 @@ class Transport:
             self._read_hosts = rotate(self.read_hosts)
         else:
             self._write_hosts = rotate(self.write_hosts)
+
+
+class Transport(BaseTransport):
+    """
+    Transport sending requests with aiohttp, which is only imported with the
+    first request as it takes longer to import than the rest of the client.
+    """
+
+    # Whether the session reports connection times to the profiler.
+    _traced = False
+    # The aiohttp and async_timeout modules, imported with the session.
+    _aiohttp = None
+    _async_timeout = None
+
+    def __init__(self, http_search):
+        # Sessions of the longer connect timeouts given to the last hosts,
+        # when aiohttp cannot change it per request.
+        self._sessions = {}
+        super(Transport, self).__init__(http_search)
+
+    def _new_session(self, conn_timeout):
+        aiohttp = self._aiohttp
+        kwargs = {}
+        if self._traced:
+            from .profiler import aiohttp_trace_config
+            kwargs['trace_configs'] = [aiohttp_trace_config()]
+        connector = aiohttp.TCPConnector(use_dns_cache=False)
+        return aiohttp.ClientSession(conn_timeout=conn_timeout,
+                                     connector=connector, **kwargs)
+
+    def _init_session(self):
+        import aiohttp
+        import async_timeout
+        self._aiohttp = aiohttp
+        self._async_timeout = async_timeout
+        self._traced = self.profiler is not None and \
+            hasattr(aiohttp, 'TraceConfig')
+        self.session = self._new_session(self.conn_timeout)
+
+    def _per_request_timeouts(self):
+        """Return whether aiohttp takes timeouts per request (3.3+)."""
+        return hasattr(self._aiohttp, 'ClientTimeout')
+
+    def _session_for(self, conn_timeout):
+        """Return a session connecting within `conn_timeout` seconds."""
+        if conn_timeout == self.conn_timeout:
+            return self.session
+        if conn_timeout not in self._sessions:
+            self._sessions[conn_timeout] = self._new_session(conn_timeout)
+        return self._sessions[conn_timeout]
+
+    @asyncio.coroutine
+    def close(self):
+        sessions = [self.session] + list(self._sessions.values())
+        self._sessions = {}
+        for session in sessions:
+            if session is not None and not session.closed:
+                yield from session.close()
+
+    @asyncio.coroutine
+    def _send(self, url, meth, params, data, headers, timeout,
+              conn_timeout):
+        """Perform an HTTPS request with aiohttp's ClientSession."""
+        kwargs = {}
+        session = self.session
+        if conn_timeout != self.conn_timeout:
+            if self._per_request_timeouts():
+                kwargs['timeout'] = self._aiohttp.ClientTimeout(
+                    connect=conn_timeout)
+            else:
+                session = self._session_for(conn_timeout)
+        sample = None if self.profiler is None else self.profiler.current()
+        if sample is not None and self._traced:
+            kwargs['trace_request_ctx'] = sample
+        with self._async_timeout.timeout(timeout):
+            start = time.perf_counter()
+            req = session.request(meth, url, params=params, data=data,
+                                  headers=headers, **kwargs)
+            res = yield from req
+            if sample is not None and not self._traced:
+                sample.add('server', time.perf_counter() - start)
+            if res.status // 100 in (2, 4):
+                start = time.perf_counter()
+                body = yield from res.read()
+                self._profile('transfer', start)
+            if res.status // 100 == 2:
+                start = time.perf_counter()
+                answer = json.loads(body.decode('utf-8'))
+                self._profile('decode', start)
+                return answer
+            elif res.status // 100 == 4:
+                message = 'HTTP Code: %d' % res.status
+                try:
+                    message = json.loads(body.decode('utf-8'))['message']
+                finally:
+                    raise api_error(res.status, message)
+        # TODO: Check this for replacement.
+        res.raise_for_status()
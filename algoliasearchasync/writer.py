@@ -0,0 +1,222 @@
+import collections
+import time
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from .collection import chunks_by_size
+from .export import _dumps, read_records
+from .helpers import BatchReader, throughput
+
+# Statuses answered when a batch is too large or requests are too frequent.
+TOO_LARGE = 413
+TOO_MANY_REQUESTS = 429
+
+
+class AdaptiveBatchWriter(object):
+    """
+    Save records in batches whose size and concurrency adapt to the API.
+
+    The batch size grows by `increase` records after each batch acknowledged
+    within `target_latency` seconds and is multiplied by `decrease` after a
+    slower one. Every `concurrency` acknowledged batches, the throughput of
+    the round is compared to the best one seen: one more batch is allowed in
+    flight while it improves and one less once it drops by more than
+    `tolerance`. Batches rejected as too large (413) are split and the size
+    limit lowered, throttled ones (429) halve the concurrency, and unreachable
+    hosts or timeouts halve both; failed batches are sent again after an
+    exponential backoff, up to `max_retries` times.
+    """
+
+    def __init__(self, index, batch_size=1000, min_batch_size=10,
+                 max_batch_size=10000, concurrency=2, max_concurrency=16,
+                 max_bytes=5000000, target_latency=2.0, increase=100,
+                 decrease=0.5, tolerance=0.1, max_retries=5, backoff=0.5,
+                 progress=None, loop=None):
+        self.index = index
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.progress = progress
+        self.loop = loop or asyncio.get_event_loop()
+
+        self.stats = {'objects': 0, 'bytes': 0, 'batches': 0, 'retries': 0,
+                      'errors': {}, 'elapsed': 0, 'objects_per_second': 0}
+        self.best = {'batch_size': batch_size, 'concurrency': concurrency,
+                     'objects_per_second': 0}
+        self._round = (0, 0, None)
+        self._task_ids = set()
+        self._started = None
+
+    def _shrink_batch(self, size=None):
+        size = self.batch_size if size is None else min(size, self.batch_size)
+        self.batch_size = max(self.min_batch_size, int(size * self.decrease))
+
+    def _shrink_concurrency(self):
+        self.concurrency = max(1, int(self.concurrency * self.decrease))
+        self._round = (0, 0, None)
+
+    def _on_success(self, count, size, start, elapsed):
+        stats = self.stats
+        stats['objects'] += count
+        stats['bytes'] += size
+        stats['batches'] += 1
+
+        if elapsed <= self.target_latency:
+            # Only grow once batches reach the current size.
+            if count + self.increase > self.batch_size and \
+                    size * (count + self.increase) / count <= self.max_bytes:
+                self.batch_size = min(self.max_batch_size,
+                                      self.batch_size + self.increase)
+        else:
+            self._shrink_batch()
+
+        objects, batches, round_start = self._round
+        if round_start is None:
+            round_start = start
+        objects += count
+        batches += 1
+        if batches < self.concurrency:
+            self._round = (objects, batches, round_start)
+            return
+        rate = throughput(objects, self.loop.time() - round_start)
+        self._round = (0, 0, None)
+        if rate > self.best['objects_per_second']:
+            self.best = {'batch_size': self.batch_size,
+                         'concurrency': self.concurrency,
+                         'objects_per_second': rate}
+            if elapsed <= self.target_latency:
+                self.concurrency = min(self.max_concurrency,
+                                       self.concurrency + 1)
+        elif rate < self.best['objects_per_second'] * (1 - self.tolerance):
+            self.concurrency = max(1, self.concurrency - 1)
+
+    def _on_error(self, status, count, size):
+        errors = self.stats['errors']
+        key = str(status or 'unreachable')
+        errors[key] = errors.get(key, 0) + 1
+        self.stats['retries'] += 1
+        if status == TOO_LARGE:
+            self._shrink_batch(count)
+            self.max_bytes = min(self.max_bytes, max(1, size // 2))
+        elif status == TOO_MANY_REQUESTS:
+            self._shrink_concurrency()
+        else:
+            self._shrink_batch()
+            self._shrink_concurrency()
+
+    @asyncio.coroutine
+    def _send(self, batch, attempt):
+        """Send a batch, returning the (batch, attempt) pairs to retry."""
+        if attempt:
+            yield from asyncio.sleep(self.backoff * 2 ** (attempt - 1),
+                                     loop=self.loop)
+
+        size = sum(len(_dumps(obj).encode('utf-8')) + 1 for obj in batch)
+        start = self.loop.time()
+        try:
+            res = yield from self.index.batch_async({'requests': [{
+                'action': 'updateObject',
+                'objectID': obj['objectID'],
+                'body': obj,
+            } for obj in batch]})
+        except AlgoliaException as e:
+            status = getattr(e, 'status', None)
+            if status not in (None, TOO_LARGE, TOO_MANY_REQUESTS) or \
+                    attempt >= self.max_retries:
+                raise
+            self._on_error(status, len(batch), size)
+            if status == TOO_LARGE and len(batch) > 1:
+                half = len(batch) // 2
+                return [(batch[:half], attempt + 1),
+                        (batch[half:], attempt + 1)]
+            return [(batch, attempt + 1)]
+
+        self._on_success(len(batch), size, start, self.loop.time() - start)
+        self._task_ids.add(res['taskID'])
+        self._update_throughput()
+        if self.progress is not None:
+            self.progress(self.report())
+        return []
+
+    def _update_throughput(self):
+        self.stats['elapsed'] = time.time() - self._started
+        self.stats['objects_per_second'] = throughput(self.stats['objects'],
+                                                      self.stats['elapsed'])
+
+    @asyncio.coroutine
+    def run_async(self, source, format='ndjson', wait=False):
+        """
+        Save the records of `source`, a path to a file written in `format`
+        (see `read_records`), an iterable or an asynchronous iterable.
+
+        Return the throughput along with the final and best parameters.
+        """
+        if isinstance(source, str):
+            source = read_records(source, format)
+
+        reader = BatchReader(source)
+        ready = collections.deque()
+        pending = set()
+        exhausted = False
+        self._started = time.time()
+        self._task_ids = set()
+
+        @asyncio.coroutine
+        def wait_one():
+            done, _ = yield from asyncio.wait(
+                pending, loop=self.loop, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                ready.extendleft(reversed(task.result()))
+
+        try:
+            while True:
+                # Read once a slot is free so that batches get the latest size.
+                while len(pending) >= self.concurrency:
+                    yield from wait_one()
+                if not ready and not exhausted:
+                    records = yield from reader.read(self.batch_size)
+                    for obj in records:
+                        if 'objectID' not in obj:
+                            raise AlgoliaException(
+                                'Records must have an objectID')
+                    exhausted = not records
+                    ready.extend((chunk, 0) for chunk in chunks_by_size(
+                        records, self.batch_size, self.max_bytes))
+                if ready:
+                    batch, attempt = ready.popleft()
+                    pending.add(asyncio.ensure_future(
+                        self._send(batch, attempt), loop=self.loop))
+                elif pending:
+                    yield from wait_one()
+                else:
+                    break
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+
+        if wait:
+            yield from asyncio.gather(
+                *[self.index.wait_task_async(t) for t in self._task_ids],
+                loop=self.loop)
+
+        self._update_throughput()
+        return self.report()
+
+    def report(self):
+        return dict(self.stats, errors=dict(self.stats['errors']),
+                    batch_size=self.batch_size, concurrency=self.concurrency,
+                    max_bytes=self.max_bytes, best=dict(self.best),
+                    taskIDs=sorted(self._task_ids))
@@ -0,0 +1,190 @@
+"""
+Measure the client overhead, throughput, failover latency and disjunctive
+faceting round trips against a local stub server.
+
+    python -m benchmarks.client -o results.json
+"""
+import json
+
+import aiohttp
+import asyncio
+
+from algoliasearchasync.index import AsyncIndexIterator
+from algoliasearchasync.testing import HOST_BLACKHOLE
+
+from .common import (parse_args, report, run_concurrently, start_stub,
+                     summarize, timed)
+
+CONCURRENCY_LEVELS = [1, 10, 50, 100]
+INDEX_NAME = 'bench'
+BROWSE_INDEX_NAME = 'bench_browse'
+FACETS_INDEX_NAME = 'bench_facets'
+FACET_COUNTS = [1, 2, 4, 8]
+
+
+def make_records(n, size=256):
+    return [{'objectID': str(i), 'name': 'record %d' % i, 'text': 'x' * size}
+            for i in range(n)]
+
+
+@asyncio.coroutine
+def bench_overhead(server, client, n):
+    """Compare `search_async` with the same request made by aiohttp."""
+    index = client.init_index(INDEX_NAME)
+    url = '%s/1/indexes/%s/query' % (server.hosts[0], INDEX_NAME)
+    body = json.dumps({'params': 'query=record'})
+    session = aiohttp.ClientSession()
+
+    @asyncio.coroutine
+    def raw():
+        res = yield from session.post(url, data=body)
+        return (yield from res.json())
+
+    try:
+        raw_latencies = yield from run_concurrently(raw, n, 1)
+        client_latencies = yield from run_concurrently(
+            lambda: index.search_async('record'), n, 1)
+    finally:
+        yield from session.close()
+
+    raw_stats = summarize(raw_latencies)
+    client_stats = summarize(client_latencies)
+    return {
+        'raw_aiohttp': raw_stats,
+        'search_async': client_stats,
+        'overhead_ms': client_stats['mean_ms'] - raw_stats['mean_ms'],
+    }
+
+
+@asyncio.coroutine
+def bench_throughput(client, n):
+    """Requests per second of `search_async` at several concurrency levels."""
+    index = client.init_index(INDEX_NAME)
+    results = {}
+    for concurrency in CONCURRENCY_LEVELS:
+        latencies, elapsed = yield from timed(run_concurrently(
+            lambda: index.search_async('record'), n, concurrency))
+        stats = summarize(latencies)
+        stats['requests_per_second'] = n / elapsed
+        results[str(concurrency)] = stats
+    return results
+
+
+@asyncio.coroutine
+def bench_save_objects(client, nb_records=10000, batch_size=1000):
+    """Bulk write throughput of `save_objects_async` in MB/s."""
+    index = client.init_index(INDEX_NAME + '_write')
+    records = make_records(nb_records)
+    size = len(json.dumps(records).encode('utf-8'))
+    batches = [records[i:i + batch_size]
+               for i in range(0, nb_records, batch_size)]
+
+    _, elapsed = yield from timed(asyncio.gather(
+        *[index.save_objects_async(b) for b in batches]))
+    return {
+        'records': nb_records,
+        'bytes': size,
+        'seconds': elapsed,
+        'mb_per_second': size / elapsed / 1e6,
+        'records_per_second': nb_records / elapsed,
+    }
+
+
+@asyncio.coroutine
+def bench_browse(client):
+    """Records per second read through `AsyncIndexIterator`."""
+    index = client.init_index(BROWSE_INDEX_NAME)
+
+    @asyncio.coroutine
+    def browse():
+        count = 0
+        it = yield from AsyncIndexIterator(index).__aiter__()
+        try:
+            while True:
+                yield from it.__anext__()
+                count += 1
+        except StopAsyncIteration:
+            return count
+
+    count, elapsed = yield from timed(browse())
+    return {'records': count, 'seconds': elapsed,
+            'records_per_second': count / elapsed}
+
+
+@asyncio.coroutine
+def bench_disjunctive_faceting(server, client, n):
+    """Latency and requests sent by `search_disjunctive_faceting_async`."""
+    index = client.init_index(FACETS_INDEX_NAME)
+    results = {}
+    for nb_facets in FACET_COUNTS:
+        facets = ['f%d' % i for i in range(nb_facets)]
+        refinements = {f: ['1'] for f in facets}
+        server.requests = []
+        latencies = yield from run_concurrently(
+            lambda: index.search_disjunctive_faceting_async(
+                'record', facets, refinements=refinements), n, 1)
+        stats = summarize(latencies)
+        stats['requests_per_search'] = len(server.requests) / n
+        results[str(nb_facets)] = stats
+    return results
+
+
+@asyncio.coroutine
+def bench_failover(server, n, concurrency=10, timeout=0.5):
+    """Search latency when the first read host is blackholed."""
+    server.fail_host(0, HOST_BLACKHOLE)
+    client = server.client()
+    client.search_timeout = timeout
+    index = client.init_index(INDEX_NAME)
+    errors = []
+    try:
+        latencies = yield from run_concurrently(
+            lambda: index.search_async('record'), n, concurrency, errors)
+    finally:
+        server.restore_host(0)
+        yield from client.close()
+
+    stats = summarize(latencies) if latencies else {'count': 0}
+    stats['errors'] = len(errors)
+    stats['search_timeout_ms'] = timeout * 1000
+    return stats
+
+
+@asyncio.coroutine
+def main(args):
+    server = yield from start_stub()
+    client = server.client()
+    try:
+        index = client.init_index(INDEX_NAME)
+        yield from index.save_objects_async(make_records(100, size=64))
+        index = client.init_index(BROWSE_INDEX_NAME)
+        records = make_records(10000, size=64)
+        for i in range(0, len(records), 1000):
+            yield from index.save_objects_async(records[i:i + 1000])
+        index = client.init_index(FACETS_INDEX_NAME)
+        yield from index.save_objects_async([
+            dict(r, **{'f%d' % f: str(i % (f + 2))
+               for f in range(max(FACET_COUNTS))})
+            for i, r in enumerate(make_records(100, size=16))])
+
+        results = {
+            'overhead': (yield from bench_overhead(server, client,
+                                                   args.requests)),
+            'throughput': (yield from bench_throughput(client,
+                                                       args.requests)),
+            'save_objects': (yield from bench_save_objects(client)),
+            'browse': (yield from bench_browse(client)),
+            'disjunctive_faceting': (yield from bench_disjunctive_faceting(
+                server, client, args.requests)),
+            'failover': (yield from bench_failover(server, args.requests)),
+        }
+    finally:
+        yield from client.close()
+        yield from server.close()
+    return results
+
+
+if __name__ == '__main__':
+    args = parse_args(__doc__)
+    loop = asyncio.get_event_loop()
+    report('client', loop.run_until_complete(main(args)), args.output)
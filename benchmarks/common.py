@@ -0,0 +1,94 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+import asyncio
+
+from algoliasearchasync.helpers import percentile
+from algoliasearchasync.testing import StubServer
+from algoliasearchasync.version import __version__
+
+
+def summarize(latencies):
+    """Summarize a list of latencies in seconds, in milliseconds."""
+    return {
+        'count': len(latencies),
+        'mean_ms': 1000 * sum(latencies) / len(latencies),
+        'p50_ms': 1000 * percentile(latencies, 50),
+        'p99_ms': 1000 * percentile(latencies, 99),
+        'max_ms': 1000 * max(latencies),
+    }
+
+
+@asyncio.coroutine
+def timed(coro):
+    """Return the result of `coro` and its duration in seconds."""
+    start = time.perf_counter()
+    res = yield from coro
+    return res, time.perf_counter() - start
+
+
+@asyncio.coroutine
+def run_concurrently(factory, total, concurrency, errors=None):
+    """
+    Call `factory()` `total` times with `concurrency` calls in flight and
+    return the latency of each call. Failed calls are appended to `errors`
+    when it is given, and raised otherwise.
+    """
+    latencies = []
+    remaining = [total]
+
+    @asyncio.coroutine
+    def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            try:
+                _, elapsed = yield from timed(factory())
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors.append(e)
+                continue
+            latencies.append(elapsed)
+
+    yield from asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies
+
+
+@asyncio.coroutine
+def start_stub(hosts=3, **kwargs):
+    server = StubServer(hosts=hosts, **kwargs)
+    yield from server.start()
+    return server
+
+
+def make_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-o', '--output', help='write the results to a file')
+    return parser
+
+
+def parse_args(description):
+    parser = make_parser(description)
+    parser.add_argument('-n', '--requests', type=int, default=1000,
+                        help='number of requests per measurement')
+    return parser.parse_args()
+
+
+def report(name, results, output=None):
+    """Print the results as JSON, along with the environment they ran in."""
+    doc = {
+        'benchmark': name,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'client_version': __version__,
+        'python': platform.python_version(),
+        'results': results,
+    }
+    text = json.dumps(doc, indent=2, sort_keys=True)
+    if output is None:
+        sys.stdout.write(text + '\n')
+    else:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
@@ -0,0 +1,50 @@
+"""
+Compare the default aiohttp transport with the HTTP/2 transport: number of
+connections opened and search latency at several concurrency levels.
+
+    python -m benchmarks.http2 -o results.json
+"""
+import asyncio
+
+from .common import (parse_args, report, run_concurrently, start_stub,
+                     summarize, timed)
+
+CONCURRENCY_LEVELS = [1, 10, 50, 100]
+INDEX_NAME = 'bench'
+
+
+@asyncio.coroutine
+def bench_transport(n, http2, latency=0.005):
+    server = yield from start_stub(latency=latency, http2=http2)
+    client = server.client(http2=http2)
+    index = client.init_index(INDEX_NAME)
+    results = {}
+    try:
+        yield from index.save_objects_async([
+            {'objectID': str(i), 'name': 'record %d' % i} for i in range(100)])
+        for concurrency in CONCURRENCY_LEVELS:
+            server.connections.clear()
+            latencies, elapsed = yield from timed(run_concurrently(
+                lambda: index.search_async('record'), n, concurrency))
+            stats = summarize(latencies)
+            stats['requests_per_second'] = n / elapsed
+            stats['connections'] = len(server.connections)
+            results[str(concurrency)] = stats
+    finally:
+        yield from client.close()
+        yield from server.close()
+    return results
+
+
+@asyncio.coroutine
+def main(args):
+    return {
+        'aiohttp': (yield from bench_transport(args.requests, False)),
+        'http2': (yield from bench_transport(args.requests, True)),
+    }
+
+
+if __name__ == '__main__':
+    args = parse_args(__doc__)
+    loop = asyncio.get_event_loop()
+    report('http2', loop.run_until_complete(main(args)), args.output)
@@ -0,0 +1,53 @@
+"""
+Replay a traffic log written by `TrafficRecorder` and report the latency
+distributions of the recorded and replayed requests.
+
+    python -m benchmarks.replay traffic.ndjson --speed 1 --speed 4
+
+The log is replayed against a local stub server unless `--app-id` and
+`--api-key` are given, in which case it is sent to that application, or to
+`--hosts` when given.
+"""
+import asyncio
+
+from algoliasearchasync import ClientAsync
+from algoliasearchasync.recorder import read_traffic, replay_async
+
+from .common import make_parser, report, start_stub
+
+
+@asyncio.coroutine
+def main(args):
+    entries = read_traffic(args.log)
+    server = None
+    if args.app_id is None:
+        server = yield from start_stub()
+        client = server.client()
+    else:
+        client = ClientAsync(args.app_id, args.api_key, args.hosts)
+    transport = client._base._transport
+
+    results = {}
+    try:
+        for speed in args.speed or [1.0]:
+            results['%gx' % speed] = yield from replay_async(
+                transport, entries, speed)
+    finally:
+        yield from client.close()
+        if server is not None:
+            yield from server.close()
+    return results
+
+
+if __name__ == '__main__':
+    parser = make_parser(__doc__)
+    parser.add_argument('log', help='traffic log to replay')
+    parser.add_argument('--speed', type=float, action='append',
+                        help='replay speed factor, may be repeated')
+    parser.add_argument('--app-id')
+    parser.add_argument('--api-key')
+    parser.add_argument('--hosts', type=lambda s: s.split(','),
+                        help='comma separated hosts')
+    args = parser.parse_args()
+    loop = asyncio.get_event_loop()
+    report('replay', loop.run_until_complete(main(args)), args.output)
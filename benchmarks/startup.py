@@ -0,0 +1,111 @@
+"""
+Measure the startup cost of short-lived processes: the time to import the
+client, to build a `ClientAsync` and to get the answer of a first search
+from a local stub server, each in a fresh interpreter.
+
+    python -m benchmarks.startup --runs 20 --max-first-request-ms 500
+
+With `--max-import-ms` or `--max-first-request-ms`, the script exits with
+status 1 when the median exceeds the budget, so that it can guard against
+regressions. On Python 3.7 and later, the modules taking the longest to
+import are listed from `python -X importtime`.
+"""
+import json
+import subprocess
+import sys
+
+import asyncio
+
+from algoliasearchasync.helpers import percentile
+
+from .common import make_parser, report, start_stub
+
+CHILD = '''
+import asyncio, json, sys, time
+start = time.perf_counter()
+import algoliasearchasync
+imported = time.perf_counter()
+client = algoliasearchasync.ClientAsync('stub', 'stub', json.loads(sys.argv[1]))
+built = time.perf_counter()
+eager = 'aiohttp' in sys.modules
+client.init_index('startup').search('')
+searched = time.perf_counter()
+asyncio.get_event_loop().run_until_complete(client.close())
+print(json.dumps({
+    'import_ms': 1000 * (imported - start),
+    'client_ms': 1000 * (built - imported),
+    'first_request_ms': 1000 * (searched - start),
+    'aiohttp_before_request': eager,
+}))
+'''
+
+
+def import_times(top=10):
+    """Return the modules with the largest self import times, in ms."""
+    if sys.version_info < (3, 7):
+        return None
+    out = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import algoliasearchasync'],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    modules = []
+    for line in out.splitlines()[1:]:
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        modules.append((int(self_us) / 1000, name.strip()))
+    modules.sort(reverse=True)
+    return [{'module': name, 'self_ms': ms} for ms, name in modules[:top]]
+
+
+@asyncio.coroutine
+def run_child(hosts):
+    proc = yield from asyncio.create_subprocess_exec(
+        sys.executable, '-c', CHILD, json.dumps(hosts),
+        stdout=asyncio.subprocess.PIPE)
+    out, _ = yield from proc.communicate()
+    if proc.returncode:
+        raise RuntimeError('startup run failed with status %d'
+                           % proc.returncode)
+    return json.loads(out.decode())
+
+
+@asyncio.coroutine
+def main(args):
+    server = yield from start_stub(hosts=1)
+    try:
+        runs = []
+        for _ in range(args.runs):
+            runs.append((yield from run_child(server.hosts)))
+    finally:
+        yield from server.close()
+
+    results = {'runs': args.runs,
+               'aiohttp_before_request': runs[-1]['aiohttp_before_request']}
+    for key in ('import_ms', 'client_ms', 'first_request_ms'):
+        values = [r[key] for r in runs]
+        results[key] = {'p50': percentile(values, 50),
+                        'min': min(values), 'max': max(values)}
+    results['slowest_imports'] = import_times()
+    return results
+
+
+if __name__ == '__main__':
+    parser = make_parser(__doc__)
+    parser.add_argument('--runs', type=int, default=10,
+                        help='number of fresh interpreters to start')
+    parser.add_argument('--max-import-ms', type=float,
+                        help='fail when the median import time exceeds it')
+    parser.add_argument('--max-first-request-ms', type=float,
+                        help='fail when the median time to the first answer '
+                             'exceeds it')
+    args = parser.parse_args()
+    loop = asyncio.get_event_loop()
+    results = loop.run_until_complete(main(args))
+    report('startup', results, args.output)
+
+    over = [(key, budget) for key, budget in (
+        ('import_ms', args.max_import_ms),
+        ('first_request_ms', args.max_first_request_ms))
+        if budget is not None and results[key]['p50'] > budget]
+    for key, budget in over:
+        sys.stderr.write('%s: median %.1f ms over the %.1f ms budget\n'
+                         % (key, results[key]['p50'], budget))
+    sys.exit(1 if over else 0)
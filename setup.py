@@ -32,6 +32,7 @@ setup(
     include_package_data=True,
     zip_safe=False,  # Because of the certificate
     install_requires=['algoliasearch>=1.10.1,<2.0', 'aiohttp>=2.0.5'],
+    extras_require={'http2': ['httpx[http2]>=0.18']},
     description='Algolia Search Asyncronous API Client for Python',
     long_description=README,
     author='Algolia Team',
@@ -0,0 +1,125 @@
+import unittest
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.testing import StubServer
+
+
+class IndexOperationsTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=1)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def names(self):
+        return sorted(self.server.indexes)
+
+    def test_list_indexes_pages(self):
+        for i in range(25):
+            self.server.index('tenant_%02d' % i)
+        self.server.requests = []
+        res = self.client.list_indexes(hits_per_page=10, concurrency=2)
+        self.assertEqual([i['name'] for i in res['items']], self.names())
+        self.assertEqual(res['nbPages'], 3)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.client.list_indexes()['items']), 25)
+
+    def test_operations(self):
+        for name in ('a', 'b', 'c'):
+            self.server.index(name).records['1'] = {'objectID': '1'}
+        res = self.client.index_operations([
+            ('copy', 'a', 'a_copy'),
+            ('move', 'a_copy', 'a_moved'),
+            ('delete', 'a'),
+            ('copy', 'b', 'b_settings', ['settings']),
+            ('delete', 'c'),
+        ], concurrency=2)
+        self.assertEqual(self.names(), ['a_moved', 'b', 'b_settings'])
+        self.assertEqual(self.server.index('a_moved').records, {'1': {
+            'objectID': '1'}})
+        self.assertEqual(self.server.index('b_settings').records, {})
+        self.assertEqual([r['error'] for r in res], [None] * 5)
+        self.assertEqual([r['operation'] for r in res],
+                         ['copy', 'move', 'delete', 'copy', 'delete'])
+        self.assertNotIn(None, [r['taskID'] for r in res])
+
+    def test_partial_failure(self):
+        for name in ('a', 'b'):
+            self.server.index(name)
+        self.server.inject_error(400, path='/a/operation')
+        res = self.client.index_operations([
+            ('move', 'a', 'a_moved'),
+            ('delete', 'a_moved'),
+            ('delete', 'b'),
+        ], wait=False)
+        self.assertIsInstance(res[0]['error'], AlgoliaException)
+        self.assertIn('Skipped', str(res[1]['error']))
+        self.assertIsNone(res[2]['error'])
+        self.assertEqual(self.names(), ['a'])
+
+    def test_invalid_operation(self):
+        with self.assertRaises(AlgoliaException):
+            self.client.index_operations([('rename', 'a', 'b')])
+        with self.assertRaises(AlgoliaException):
+            self.client.index_operations([('delete', 'a', 'b')])
+
+
+class ReplaceAllObjectsTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=1)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.index = self.client.init_index('test')
+        stub = self.server.index('test')
+        stub.records['old'] = {'objectID': 'old'}
+        stub.settings['attributesToHighlight'] = ['name']
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def test_replace(self):
+        read = []
+
+        def objects():
+            for i in range(5):
+                read.append(i)
+                yield {'objectID': str(i)}
+
+        progress = []
+        res = self.index.replace_all_objects(
+            objects(), chunk_size=2, concurrency=1,
+            progress=lambda p: progress.append((p['objects'], len(read))))
+        self.assertEqual(res['objects'], 5)
+        self.assertEqual(res['batches'], 3)
+        self.assertEqual([p for p, _ in progress], [2, 4, 5])
+        # Objects are read as the batches are sent.
+        self.assertLess(progress[0][1], 5)
+        self.assertEqual(sorted(self.server.indexes), ['test'])
+        stub = self.server.index('test')
+        self.assertEqual(sorted(stub.records), ['0', '1', '2', '3', '4'])
+        self.assertEqual(stub.settings['attributesToHighlight'], ['name'])
+
+        # The settings are copied before any object is sent.
+        paths = [p for _, _, p in self.server.requests]
+        copy = paths.index('/1/indexes/test/operation')
+        batches = [i for i, p in enumerate(paths) if p.endswith('/batch')]
+        self.assertLess(copy, batches[0])
+        self.assertIn('/1/indexes/test/task/%d' % res['taskIDs'][0],
+                      paths[copy:batches[0]])
+
+    def test_failure_deletes_temporary_index(self):
+        self.server.inject_error(400, path='/batch')
+        with self.assertRaises(AlgoliaException):
+            self.index.replace_all_objects(
+                ({'objectID': str(i)} for i in range(10)), chunk_size=2)
+        self.assertEqual(sorted(self.server.indexes), ['test'])
+        self.assertEqual(list(self.server.index('test').records), ['old'])
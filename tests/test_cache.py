@@ -0,0 +1,205 @@
+import unittest
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.cache import written_object_ids
+from algoliasearchasync.testing import StubServer
+
+
+class ObjectCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=1)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.index = self.client.init_index('test')
+        task = self.index.save_objects([{'objectID': str(i), 'n': i}
+                                        for i in range(10)])
+        self.index.wait_task(task['taskID'])
+        self.cache = self.index.enable_object_cache(ttl=60)
+        self.server.requests = []
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def fetches(self):
+        return len([p for _, _, p in self.server.requests
+                    if p == '/1/indexes/*/objects'])
+
+    def set_record(self, record):
+        self.server.index('test').records[record['objectID']] = record
+
+    def test_hits(self):
+        self.assertEqual(self.index.get_object('1'), {'objectID': '1', 'n': 1})
+        obj = self.index.get_object('1')
+        self.assertEqual(obj, {'objectID': '1', 'n': 1})
+        self.assertEqual(self.fetches(), 1)
+        self.assertEqual(self.cache.stats['hits'], 1)
+
+        # Callers get copies.
+        obj['n'] = 42
+        self.assertEqual(self.index.get_object('1')['n'], 1)
+
+    def test_negative_hits(self):
+        for _ in range(2):
+            with self.assertRaisesRegexp(AlgoliaException, 'does not exist'):
+                self.index.get_object('missing')
+        self.assertEqual(self.fetches(), 1)
+        self.assertEqual(self.cache.stats['negative_hits'], 1)
+
+    def test_misses_are_batched(self):
+        res = self.loop.run_until_complete(asyncio.gather(
+            *[self.index.get_object_async(str(i)) for i in range(5)] +
+            [self.index.get_objects_async(['5', '1', 'missing'])]))
+        self.assertEqual([r['n'] for r in res[:5]], list(range(5)))
+        self.assertEqual(res[5]['results'][:2], [{'objectID': '5', 'n': 5},
+                                                 {'objectID': '1', 'n': 1}])
+        self.assertIsNone(res[5]['results'][2])
+        self.assertEqual(self.fetches(), 1)
+
+    def test_stale_while_revalidate(self):
+        self.cache.ttl = 0.05
+        self.index.get_object('1')
+        self.set_record({'objectID': '1', 'n': 'new'})
+        self.loop.run_until_complete(asyncio.sleep(0.06))
+
+        self.assertEqual(self.index.get_object('1')['n'], 1)
+        self.assertEqual(self.cache.stats['stale_hits'], 1)
+        self.loop.run_until_complete(asyncio.sleep(0.02))
+        self.assertEqual(self.index.get_object('1')['n'], 'new')
+        self.assertEqual(self.fetches(), 2)
+
+    def test_writes_invalidate(self):
+        self.index.get_object('1')
+        self.index.get_object('2')
+        self.index.save_object({'objectID': '1', 'n': 'new'})
+        self.assertEqual(self.index.get_object('1')['n'], 'new')
+        self.index.get_object('2')
+        self.assertEqual(self.fetches(), 3)
+
+        self.index.clear_index()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_write_overtakes_fetch(self):
+        self.server.host_latency = {0: 0.05}
+        fut = asyncio.ensure_future(self.index.get_object_async('1'))
+        self.loop.run_until_complete(asyncio.sleep(0.02))
+        self.cache.invalidate(['1'])
+        self.assertEqual(self.loop.run_until_complete(fut)['n'], 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_cancelled_lookup(self):
+        first = asyncio.ensure_future(self.index.get_object_async('1'))
+        second = asyncio.ensure_future(self.index.get_object_async('1'))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        first.cancel()
+        self.assertEqual(self.loop.run_until_complete(second)['n'], 1)
+
+    def test_max_size(self):
+        self.cache.max_size = 3
+        for i in range(5):
+            self.index.get_object(str(i))
+        self.assertEqual(len(self.cache), 3)
+
+    def test_uncached_options(self):
+        self.index.get_object('1', ['n'])
+        self.index.get_object('1', ['n'])
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_written_object_ids(self):
+        self.assertEqual(written_object_ids(
+            'save_objects', ([{'objectID': '1'}, {'objectID': '2'}],), {}),
+            ['1', '2'])
+        self.assertEqual(written_object_ids(
+            'add_object', ({'a': 1},), {'object_id': '3'}), ['3'])
+        self.assertEqual(written_object_ids(
+            'batch', ({'requests': [
+                {'action': 'deleteObject', 'objectID': '4'},
+                {'action': 'updateObject', 'body': {'objectID': '5'}}]},),
+            {}), ['4', '5'])
+        self.assertIsNone(written_object_ids(
+            'batch', ([{'action': 'clear'}],), {}))
+        self.assertIsNone(written_object_ids('clear_index', (), {}))
+
+
+class SettingsCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=1)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.index = self.client.init_index('test')
+        task = self.index.set_settings({'hitsPerPage': 10})
+        self.index.wait_task(task['taskID'])
+        task = self.index.save_synonym(
+            {'type': 'synonym', 'synonyms': ['car', 'auto']}, 'car')
+        self.index.wait_task(task['taskID'])
+        self.cache = self.index.enable_settings_cache(interval=60)
+        self.server.requests = []
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def reads(self):
+        return [p for _, m, p in self.server.requests
+                if p.endswith('/settings') and m == 'GET' or
+                p.endswith('/synonyms/search')]
+
+    def settle(self):
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+
+    def test_snapshot_is_shared(self):
+        res = self.loop.run_until_complete(asyncio.gather(
+            *[self.index.get_settings_async() for _ in range(5)] +
+            [self.index.search_synonyms_async('')]))
+        self.assertEqual([r['hitsPerPage'] for r in res[:5]], [10] * 5)
+        self.assertEqual(res[5]['nbHits'], 1)
+        self.assertEqual(res[5]['hits'][0]['synonyms'], ['car', 'auto'])
+        self.assertEqual(len(self.reads()), 2)
+
+        self.index.get_settings()
+        self.assertEqual(len(self.reads()), 2)
+
+    def test_refresh_interval(self):
+        self.index.get_settings()
+        self.cache.interval = 0
+        self.server.index('test').settings['hitsPerPage'] = 42
+
+        # The previous snapshot is served while refreshing.
+        self.assertEqual(self.index.get_settings()['hitsPerPage'], 10)
+        self.settle()
+        self.assertEqual(self.index.get_settings()['hitsPerPage'], 42)
+
+    def test_writes_refresh(self):
+        self.index.get_settings()
+        self.index.set_settings({'hitsPerPage': 5})
+        self.assertEqual(self.index.get_settings()['hitsPerPage'], 5)
+
+        self.index.batch_synonyms([
+            {'objectID': 'tv', 'type': 'synonym', 'synonyms': ['tv', 'telly']},
+        ])
+        self.index.delete_synonym('car')
+        res = self.index.search_synonyms('')
+        self.assertEqual([h['objectID'] for h in res['hits']], ['tv'])
+
+        self.server.requests = []
+        self.settle()
+        self.assertGreater(len(self.reads()), 0)
+        self.assertEqual(self.cache.synonyms,
+                         self.server.index('test').synonyms)
+        self.assertEqual(self.index.get_settings()['hitsPerPage'], 5)
+
+    def test_object_writes_are_ignored(self):
+        self.index.get_settings()
+        self.index.save_object({'objectID': '1'})
+        self.settle()
+        self.assertEqual(len(self.reads()), 2)
+
+    def test_queries_bypass_cache(self):
+        self.index.search_synonyms('car')
+        self.index.search_synonyms('car')
+        self.assertEqual(len(self.reads()), 2)
@@ -0,0 +1,128 @@
+import time
+import unittest
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.circuit import (CLOSED, HALF_OPEN, OPEN,
+                                        CircuitBreaker, CircuitOpenException)
+from algoliasearchasync.testing import HOST_DOWN, StubServer
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_consecutive_failures(self):
+        breaker = CircuitBreaker(('host', 'read'), failures=3)
+        for _ in range(2):
+            breaker.failure()
+        breaker.success()
+        for _ in range(2):
+            breaker.failure()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_error_rate(self):
+        breaker = CircuitBreaker(('host', 'read'), failures=100,
+                                 error_rate=0.5, window=10, min_requests=6)
+        for ok in [True, True, False, True, False, True, False, True, False]:
+            if ok:
+                breaker.success()
+            else:
+                breaker.failure()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.failure()
+        self.assertEqual(breaker.state, OPEN)
+        breaker.success()
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker(('host', 'read'), failures=1,
+                                 reset_timeout=0.01)
+        breaker.failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.02)
+
+        probe = breaker.allow()
+        self.assertTrue(probe)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.failure(probe)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.trips, 2)
+
+        time.sleep(0.02)
+        probe = breaker.allow()
+        self.assertTrue(probe)
+        breaker.cancel(probe)
+        probe = breaker.allow()
+        self.assertTrue(probe)
+        breaker.success(probe)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_late_outcomes_do_not_end_probe(self):
+        breaker = CircuitBreaker(('host', 'read'), failures=1,
+                                 reset_timeout=0.01)
+        straggler = breaker.allow()
+        breaker.failure(breaker.allow())
+        time.sleep(0.02)
+        probe = breaker.allow()
+        self.assertEqual(breaker.state, HALF_OPEN)
+
+        # A request sent before the circuit opened answers during the probe.
+        breaker.success(straggler)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.failure(probe)
+        self.assertEqual(breaker.state, OPEN)
+
+
+class CircuitTransportTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=3)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.client.enable_circuit_breaker(failures=1, reset_timeout=0.05)
+        self.index = self.client.init_index('test')
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def test_fast_fail(self):
+        for i in range(3):
+            self.server.fail_host(i, HOST_DOWN)
+        with self.assertRaisesRegexp(AlgoliaException, 'Unreachable'):
+            self.index.search('')
+        self.assertEqual([s['state'] for s in self.client.circuit_states()],
+                         [OPEN] * 3)
+
+        self.server.requests = []
+        start = time.time()
+        with self.assertRaises(CircuitOpenException):
+            self.index.search('')
+        self.assertLess(time.time() - start, 0.05)
+        self.assertEqual(self.server.requests, [])
+
+        # Writes have their own circuits.
+        for i in range(3):
+            self.server.restore_host(i)
+        self.index.save_object({'objectID': '1'})
+
+        time.sleep(0.06)
+        self.index.search('')
+        # The host answering the probe is closed again.
+        states = [s['state'] for s in self.client.circuit_states()
+                  if s['kind'] == 'read']
+        self.assertIn(CLOSED, states)
+
+    def test_open_hosts_are_skipped(self):
+        self.server.fail_host(0, HOST_DOWN)
+        self.index.search('')
+        self.server.requests = []
+        self.index.search('')
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertNotEqual(self.server.requests[0][0], 0)
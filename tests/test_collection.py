@@ -0,0 +1,176 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.collection import chunks_by_size
+from algoliasearchasync.testing import StubServer
+
+
+def make_synonyms(n):
+    return [{'objectID': 'syn-%d' % i, 'type': 'synonym',
+             'synonyms': ['word%d' % i, 'other%d' % i]} for i in range(n)]
+
+
+class CollectionTransferTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'synonyms.ndjson')
+        self.server = StubServer(hosts=1)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.index = self.client.init_index('test')
+        self.synonyms = make_synonyms(2500)
+        for syn in self.synonyms:
+            self.server.index('test').synonyms[syn['objectID']] = syn
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+        shutil.rmtree(self.tmp)
+
+    def read(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def batches(self, kind='synonyms'):
+        return [p for _, _, p in self.server.requests
+                if p.endswith('/%s/batch' % kind)]
+
+    def test_export(self):
+        res = self.index.export_synonyms(self.path)
+        self.assertEqual(res['exported'], 2500)
+        self.assertEqual(self.read(), self.synonyms)
+
+    def test_import(self):
+        self.index.export_synonyms(self.path)
+        other = self.client.init_index('other')
+        res = other.import_synonyms(self.path, batch_size=1000)
+        self.assertEqual(res['uploaded'], 2500)
+        self.assertEqual(res['batches'], 3)
+        self.assertEqual(len(res['taskIDs']), 3)
+        self.assertEqual(self.server.index('other').synonyms,
+                         self.server.index('test').synonyms)
+
+    def test_import_chunks_by_size(self):
+        other = self.client.init_index('other')
+        res = self.loop.run_until_complete(other.import_synonyms_async(
+            self.synonyms[:100], batch_size=1000, concurrency=2))
+        self.assertEqual(res['batches'], 1)
+
+        transfer_res = self.loop.run_until_complete(
+            other.import_synonyms_async(self.synonyms[:100], replace=True))
+        self.assertEqual(transfer_res['uploaded'], 100)
+        self.assertEqual(len(self.server.index('other').synonyms), 100)
+
+    def test_replace(self):
+        stub = self.server.index('test')
+        stub.records['1'] = {'objectID': '1'}
+        stub.settings['replicas'] = ['test_desc', 'virtual(test_virtual)']
+        for name in ('test_desc', 'test_virtual'):
+            self.server.index(name).synonyms['old'] = {'objectID': 'old'}
+        live = []
+
+        def source():
+            for syn in make_synonyms(3):
+                live.append(len(stub.synonyms))
+                yield syn
+
+        res = self.index.import_synonyms(source(), replace=True,
+                                         forward_to_replicas=True)
+        self.assertEqual(res['uploaded'], 3)
+        # The index keeps its synonyms until the new ones are copied over.
+        self.assertEqual(live, [2500] * 3)
+        for name in ('test', 'test_desc', 'test_virtual'):
+            self.assertEqual(sorted(self.server.index(name).synonyms),
+                             ['syn-0', 'syn-1', 'syn-2'])
+        self.assertEqual(stub.records, {'1': {'objectID': '1'}})
+        self.assertEqual(sorted(self.server.indexes),
+                         ['test', 'test_desc', 'test_virtual'])
+        self.assertFalse([p for _, _, p in self.server.requests
+                          if p.endswith('/clear')])
+
+    def test_diff(self):
+        synonyms = [dict(s) for s in self.synonyms[:-10]]
+        synonyms[0]['synonyms'] = ['changed']
+        synonyms.append({'objectID': 'new', 'type': 'synonym',
+                         'synonyms': ['a', 'b']})
+        self.server.requests = []
+
+        res = self.index.import_synonyms(synonyms, diff=True)
+        self.assertEqual(res['uploaded'], 2)
+        self.assertEqual(res['unchanged'], 2489)
+        self.assertEqual(res['deleted'], 0)
+        self.assertEqual(len(self.batches()), 1)
+        self.assertEqual(
+            self.server.index('test').synonyms['syn-0']['synonyms'],
+            ['changed'])
+
+        res = self.index.import_synonyms(synonyms, diff=True,
+                                         delete_missing=True)
+        self.assertEqual(res['uploaded'], 0)
+        self.assertEqual(res['deleted'], 10)
+        self.assertEqual(len(self.server.index('test').synonyms), 2491)
+
+    def test_import_streams_batches(self):
+        read = []
+
+        def source():
+            for syn in self.synonyms:
+                read.append(syn['objectID'])
+                yield syn
+
+        self.server.inject_error(400, count=1, path='/synonyms/batch')
+        other = self.client.init_index('other')
+        with self.assertRaises(AlgoliaException):
+            other.import_synonyms(source(), batch_size=100, concurrency=1)
+        self.assertLess(len(read), 1000)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(AlgoliaException):
+            self.index.import_synonyms([], delete_missing=True)
+        with self.assertRaises(AlgoliaException):
+            self.index.import_synonyms([], diff=True, replace=True)
+        with self.assertRaises(AlgoliaException):
+            self.index.import_synonyms([{'type': 'synonym'}])
+
+    def test_rules(self):
+        rules = [{'objectID': 'rule-%d' % i,
+                  'condition': {'pattern': 'p%d' % i, 'anchoring': 'is'},
+                  'consequence': {'params': {'query': 'q'}}}
+                 for i in range(1500)]
+        written = []
+        self.index.add_write_hook(lambda method, *args: written.append(method))
+        res = self.index.import_rules(rules, batch_size=500, replace=True)
+        self.assertEqual(res['batches'], 3)
+        self.assertEqual(len(self.batches('rules')), 3)
+        self.assertEqual(written, ['copy_rules'])
+
+        path = os.path.join(self.tmp, 'rules.ndjson')
+        self.index.export_rules(path)
+        with open(path) as f:
+            exported = [json.loads(line) for line in f]
+        self.assertEqual(sorted(exported, key=lambda r: r['objectID']),
+                         sorted(rules, key=lambda r: r['objectID']))
+
+    def test_settings_cache_sees_imports(self):
+        cache = self.index.enable_settings_cache()
+        self.index.search_synonyms('')
+        self.index.import_synonyms([{'objectID': 'new', 'type': 'synonym',
+                                     'synonyms': ['a', 'b']}])
+        self.assertIn('new', cache.synonyms)
+
+    def test_chunks_by_size(self):
+        items = [{'objectID': str(i), 'text': 'x' * 100} for i in range(10)]
+        self.assertEqual([len(c) for c in chunks_by_size(items, 4, 10000)],
+                         [4, 4, 2])
+        self.assertEqual([len(c) for c in chunks_by_size(items, 10, 300)],
+                         [2, 2, 2, 2, 2])
+        self.assertEqual([len(c) for c in chunks_by_size(items, 10, 10)],
+                         [1] * 10)
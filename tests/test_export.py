@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import asyncio
+
+from algoliasearchasync import export
+from algoliasearchasync.export import IndexExporter, read_records
+
+
+class PagedIndex(object):
+    """Index double serving its records by pages through browse_from."""
+
+    def __init__(self, records, page_size, fail_at=None):
+        self.pages = [records[i:i + page_size]
+                      for i in range(0, len(records), page_size)]
+        self.fail_at = fail_at
+
+    @asyncio.coroutine
+    def browse_from_async(self, params=None, cursor=None):
+        page = int(cursor) if cursor else 0
+        if page == self.fail_at:
+            self.fail_at = None
+            raise IOError('connection lost')
+        answer = {'hits': self.pages[page]}
+        if page + 1 < len(self.pages):
+            answer['cursor'] = str(page + 1)
+        return answer
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'export')
+        self.checkpoint = os.path.join(self.dir, 'export.checkpoint')
+        self.records = [{'objectID': str(i), 'i': i} for i in range(10)]
+        self.records[3]['extra'] = None
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def export(self, index, format):
+        exporter = IndexExporter(index, self.path, format,
+                                 checkpoint=self.checkpoint, queue_size=2)
+        return self.loop.run_until_complete(exporter.run_async())
+
+    def test_formats(self):
+        for format in ['ndjson', 'ndjson.gz', 'columnar']:
+            if os.path.exists(self.checkpoint):
+                os.remove(self.checkpoint)
+            res = self.export(PagedIndex(self.records, 3), format)
+            self.assertEqual(res['objects'], 10)
+            self.assertEqual(res['pages'], 4)
+            self.assertTrue(res['done'])
+            self.assertEqual(list(read_records(self.path, format)),
+                             self.records)
+
+    def test_resume(self):
+        for format in ['ndjson', 'columnar']:
+            if os.path.exists(self.checkpoint):
+                os.remove(self.checkpoint)
+            index = PagedIndex(self.records, 3, fail_at=2)
+            with self.assertRaises(IOError):
+                self.export(index, format)
+            res = self.export(index, format)
+            self.assertEqual(res['objects'], 10)
+            self.assertEqual(list(read_records(self.path, format)),
+                             self.records)
+
+    def test_failure_waits_for_running_write(self):
+        encode = export.ENCODERS['ndjson']
+
+        def slow_encode(hits):
+            time.sleep(0.1)
+            return encode(hits)
+
+        export.ENCODERS['ndjson'] = slow_encode
+        try:
+            with self.assertRaises(IOError):
+                self.export(PagedIndex(self.records, 3, fail_at=1), 'ndjson')
+        finally:
+            export.ENCODERS['ndjson'] = encode
+        # The page being written when the export failed was not cut short.
+        self.assertEqual(os.path.getsize(self.path),
+                         len(encode(self.records[:3])))
+        res = self.export(PagedIndex(self.records, 3), 'ndjson')
+        self.assertEqual(list(read_records(self.path)), self.records)
@@ -0,0 +1,64 @@
+import unittest
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.testing import StubServer
+
+
+class DisjunctiveFacetingTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=1)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.index = self.client.init_index('test')
+        task = self.index.save_objects([
+            {'objectID': '1', 'brand': 'apple', 'color': 'red', 'size': 'S'},
+            {'objectID': '2', 'brand': 'apple', 'color': 'blue', 'size': 'M'},
+            {'objectID': '3', 'brand': 'sony', 'color': 'red', 'size': 'M'},
+            {'objectID': '4', 'brand': 'lg', 'color': 'green', 'size': 'L'},
+        ])
+        self.index.wait_task(task['taskID'])
+        self.server.requests = []
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def test_single_round_trip(self):
+        res = self.index.search_disjunctive_faceting(
+            '', ['brand', 'color'], {'facets': 'size'},
+            {'brand': ['apple', 'sony'], 'size': ['M']})
+        self.assertEqual([p for _, _, p in self.server.requests],
+                         ['/1/indexes/*/queries'])
+
+        self.assertEqual(sorted(h['objectID'] for h in res['hits']),
+                         ['2', '3'])
+        self.assertEqual(res['facets']['size'], {'M': 2})
+        # The counts of a disjunctive facet ignore its own refinements.
+        self.assertEqual(res['disjunctiveFacets']['brand'],
+                         {'apple': 1, 'sony': 1})
+        self.assertEqual(res['disjunctiveFacets']['color'],
+                         {'red': 1, 'blue': 1})
+
+    def test_refinements_without_hits_are_counted(self):
+        res = self.index.search_disjunctive_faceting(
+            '', 'brand,color', refinements={'brand': ['nokia']})
+        self.assertEqual(res['nbHits'], 0)
+        self.assertEqual(res['disjunctiveFacets']['brand'],
+                         {'apple': 2, 'sony': 1, 'lg': 1, 'nokia': 0})
+        self.assertNotIn('color', res['disjunctiveFacets'])
+
+    def test_params_are_not_modified(self):
+        params = {'hitsPerPage': 2}
+        self.index.search_disjunctive_faceting('', ['brand'], params)
+        self.assertEqual(params, {'hitsPerPage': 2})
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(AlgoliaException):
+            self.index.search_disjunctive_faceting('', 42)
+        with self.assertRaises(AlgoliaException):
+            self.index.search_disjunctive_faceting('', ['brand'],
+                                                   refinements=['apple'])
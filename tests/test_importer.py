@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import asyncio
+
+from algoliasearchasync.importer import BulkImporter
+
+
+class RecordingIndex(object):
+    """Index double recording batches, optionally failing one of them."""
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+
+    @asyncio.coroutine
+    def batch_async(self, requests):
+        ids = [r['objectID'] for r in requests['requests']]
+        if self.fail_on in ids:
+            self.fail_on = None
+            raise IOError('connection lost')
+        self.batches.append(ids)
+        return {'taskID': len(self.batches)}
+
+
+class AsyncRecords(object):
+    def __init__(self, records):
+        self.records = iter(records)
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        try:
+            return next(self.records)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class ImporterTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.dir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.dir, 'import.checkpoint')
+        self.records = [{'objectID': str(i)} for i in range(10)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def run_import(self, index, source, **kwargs):
+        importer = BulkImporter(index, self.checkpoint, batch_size=3,
+                                concurrency=1, **kwargs)
+        return self.loop.run_until_complete(importer.run_async(source))
+
+    def test_import(self):
+        progress = []
+        index = RecordingIndex()
+        res = self.run_import(index, self.records, progress=progress.append)
+        self.assertEqual(res['objects'], 10)
+        self.assertEqual(res['batches'], 4)
+        self.assertEqual(len(progress), 4)
+        self.assertEqual(index.batches[-1], ['9'])
+
+    def test_import_async_iterable(self):
+        index = RecordingIndex()
+        res = self.run_import(index, AsyncRecords(self.records))
+        self.assertEqual(res['objects'], 10)
+
+    def test_import_ndjson(self):
+        path = os.path.join(self.dir, 'records.ndjson')
+        with open(path, 'w') as f:
+            for record in self.records:
+                f.write(json.dumps(record) + '\n')
+        index = RecordingIndex()
+        res = self.run_import(index, path)
+        self.assertEqual(res['objects'], 10)
+
+    def test_resume(self):
+        index = RecordingIndex(fail_on='7')
+        with self.assertRaises(IOError):
+            self.run_import(index, self.records)
+        self.assertEqual(len(index.batches), 2)
+
+        res = self.run_import(index, self.records)
+        self.assertEqual(res['skipped'], 2)
+        self.assertEqual(res['batches'], 2)
+        self.assertEqual(index.batches[2:], [['6', '7', '8'], ['9']])
+        self.assertEqual(res['taskIDs'], [1, 2, 3, 4])
@@ -376,3 +376,20 @@ class IndexWithModifiableDataTest(IndexTest):
 
         with self.assertRaisesRegexp(AlgoliaException, 'does not exist'):
             self.index.get_object(self.objectIDs[0])
+
+    def test_replace_all_objects(self):
+        task = self.index.set_settings({'attributesToHighlight': ['name']})
+        self.index.wait_task(task['taskID'])
+
+        progress = []
+        objs = self.factory.fake_contact(5)
+        res = self.index.replace_all_objects(objs, chunk_size=2,
+                                             progress=progress.append)
+        self.assertEqual(res['objects'], 5)
+        self.assertEqual(res['batches'], 3)
+        self.assertEqual(len(progress), 3)
+
+        res = self.index.search('', {'hitsPerPage': 0})
+        self.assertEqual(res['nbHits'], 5)
+        res = self.index.get_settings()
+        self.assertListEqual(res['attributesToHighlight'], ['name'])
@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.testing import StubServer
+
+
+class LogTailerTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.tmp = tempfile.mkdtemp()
+        self.server = StubServer(hosts=1)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.index = self.client.init_index('test')
+        self.saved = 0
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+        shutil.rmtree(self.tmp)
+
+    def save(self, n):
+        for _ in range(n):
+            self.index.save_object({'objectID': str(self.saved)})
+            self.saved += 1
+
+    def poll(self, tailer):
+        entries = self.loop.run_until_complete(tailer.poll())
+        return [json.loads(e['query_body'])['objectID'] for e in entries]
+
+    def test_tail(self):
+        self.save(2)
+        tailer = self.client.tail_logs('build', page_size=5)
+        self.assertEqual(self.poll(tailer), [])
+        self.save(3)
+        self.assertEqual(self.poll(tailer), ['2', '3', '4'])
+        self.assertEqual(self.poll(tailer), [])
+        self.assertEqual(self.poll(tailer), [])
+        self.assertEqual(tailer.interval, 4)
+        self.save(1)
+        self.assertEqual(self.poll(tailer), ['5'])
+        self.assertEqual(tailer.interval, 2)
+        self.assertEqual(tailer.stats['entries'], 4)
+
+    def test_behind(self):
+        tailer = self.client.tail_logs('build', page_size=5, concurrency=2)
+        self.poll(tailer)
+        self.save(23)
+        self.assertEqual(self.poll(tailer), [str(i) for i in range(23)])
+        self.assertEqual(tailer.interval, tailer.min_interval)
+        self.assertEqual(self.poll(tailer), [])
+
+    def test_truncated(self):
+        tailer = self.client.tail_logs('build', page_size=5, max_pages=2)
+        self.poll(tailer)
+        self.save(12)
+        self.assertEqual(self.poll(tailer), [str(i) for i in range(2, 12)])
+        self.assertEqual(tailer.stats['truncated'], 1)
+
+    def test_since(self):
+        self.save(3)
+        tailer = self.client.tail_logs('build', since='2000-01-01T00:00:00Z')
+        entries = self.loop.run_until_complete(tailer.poll())
+        self.assertEqual([json.loads(e['query_body'])['objectID']
+                          for e in entries], ['0', '1', '2'])
+        # The saves may straddle a second, only the entries of the last one
+        # are logged at `since` or later.
+        last = [json.loads(e['query_body'])['objectID'] for e in entries
+                if e['timestamp'] == tailer.last_timestamp]
+        resumed = self.client.tail_logs('build', since=tailer.last_timestamp)
+        self.assertEqual(self.poll(resumed), last)
+        self.assertEqual(self.poll(resumed), [])
+
+    def test_page_size(self):
+        with self.assertRaises(AlgoliaException):
+            self.client.tail_logs(page_size=1001)
+
+    def test_iterate(self):
+        path = os.path.join(self.tmp, 'logs.ndjson')
+        tailer = self.client.tail_logs('build', min_interval=0.01, sink=path)
+        self.poll(tailer)
+
+        @asyncio.coroutine
+        def write():
+            for i in range(3):
+                yield from self.index.save_object_async({'objectID': str(i)})
+                yield from asyncio.sleep(0.02)
+
+        @asyncio.coroutine
+        def read():
+            ids = []
+            it = yield from tailer.__aiter__()
+            while len(ids) < 3:
+                entry = yield from it.__anext__()
+                ids.append(json.loads(entry['query_body'])['objectID'])
+            self.loop.call_later(0.05, tailer.close)
+            with self.assertRaises(StopAsyncIteration):
+                yield from it.__anext__()
+            return ids
+
+        ids, _ = self.loop.run_until_complete(asyncio.gather(read(), write()))
+        self.assertEqual(ids, ['0', '1', '2'])
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 3)
@@ -0,0 +1,119 @@
+import time
+import unittest
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.profiler import StallDetector, operation
+from algoliasearchasync.testing import StubServer
+
+
+class OperationTest(unittest.TestCase):
+    def test_operation(self):
+        self.assertEqual(operation('POST', '/1/indexes/a/query'), 'search')
+        self.assertEqual(operation('POST', '/1/indexes/*/queries'),
+                         'multiple_queries')
+        self.assertEqual(operation('POST', '/1/indexes/a/batch'), 'batch')
+        self.assertEqual(operation('GET', '/1/indexes/a/task/12'),
+                         'wait_task')
+        self.assertEqual(operation('GET', '/1/indexes/a/settings'),
+                         'get_settings')
+        self.assertEqual(operation('GET', '/1/indexes/a/42'), 'get_object')
+        self.assertEqual(operation('POST', '/1/indexes/a/facets/b/query'),
+                         'search_for_facet_values')
+        self.assertEqual(operation('DELETE', '/1/indexes/a'), 'delete_index')
+        self.assertEqual(operation('GET', '/1/keys/abc'), 'keys')
+        self.assertEqual(operation('GET', '/2/other'), 'GET /2/other')
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=1)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.index = self.client.init_index('test')
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def test_phases(self):
+        profiler = self.client.enable_profiling(watch_loop=False)
+        res = self.index.save_objects([{'objectID': str(i)} for i in range(10)])
+        self.index.wait_task(res['taskID'])
+        for _ in range(3):
+            self.index.search('')
+
+        stats = profiler.stats()
+        self.assertEqual(set(stats), {'batch', 'wait_task', 'search'})
+        search = stats['search']
+        self.assertEqual(search['calls'], 3)
+        self.assertEqual(search['errors'], 0)
+        for phase in ('server', 'transfer', 'decode', 'total'):
+            self.assertEqual(search[phase]['count'], 3)
+            self.assertGreater(search[phase]['max_ms'], 0)
+        self.assertGreater(stats['batch']['encode']['max_ms'], 0)
+        # Only the first request opened a connection.
+        self.assertGreater(stats['batch']['connect']['max_ms'], 0)
+        self.assertEqual(search['connect']['max_ms'], 0)
+        self.assertLessEqual(search['server']['max_ms'],
+                             search['total']['max_ms'])
+
+    def test_errors(self):
+        profiler = self.client.enable_profiling(watch_loop=False)
+        self.server.inject_error(400)
+        with self.assertRaises(AlgoliaException):
+            self.index.search('')
+        self.assertEqual(profiler.stats()['search']['errors'], 1)
+
+    def test_enabled_after_first_request(self):
+        self.index.search('')
+        profiler = self.client.enable_profiling(watch_loop=False)
+        self.index.search('')
+        search = profiler.stats()['search']
+        self.assertGreater(search['server']['max_ms'], 0)
+        self.assertEqual(search['connect']['max_ms'], 0)
+
+    def test_slow_encode(self):
+        stalls = []
+        profiler = self.client.enable_profiling(
+            stall_threshold=0.0001, watch_loop=False, callback=stalls.append)
+        self.index.save_objects([{'objectID': str(i), 'text': 'x' * 100}
+                                 for i in range(5000)])
+        self.assertIn('encode batch', [s['section'] for s in stalls])
+        self.assertEqual(profiler.stalls, stalls)
+
+
+class StallDetectorTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.detector = StallDetector(0.05)
+
+    def tearDown(self):
+        self.detector.stop()
+
+    def block(self):
+        time.sleep(0.2)
+
+    @asyncio.coroutine
+    def work(self):
+        yield from asyncio.sleep(0.05)
+        self.block()
+        yield from asyncio.sleep(0.1)
+
+    def test_stall(self):
+        self.detector.start()
+        self.loop.run_until_complete(self.work())
+        self.assertEqual(len(self.detector.stalls), 1)
+        stall = self.detector.stalls[0]
+        self.assertGreaterEqual(stall['duration_ms'], 150)
+        self.assertIn('in block', ''.join(stall['stack']))
+
+    def test_loop_not_running(self):
+        self.detector.start()
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        time.sleep(0.2)
+        self.loop.run_until_complete(asyncio.sleep(0.1))
+        self.assertEqual(len(self.detector.stalls), 0)
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.recorder import (TrafficRecorder, peak_concurrency,
+                                         read_traffic, replay_async)
+from algoliasearchasync.testing import StubServer
+
+
+class RecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'traffic.ndjson')
+        self.server = StubServer(hosts=1)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.transport = self.client._base._transport
+        self.index = self.client.init_index('test')
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+        shutil.rmtree(self.tmp)
+
+    def record(self, bodies=True):
+        recorder = TrafficRecorder(self.path, bodies=bodies)
+        self.transport.recorder = recorder
+        self.index.save_objects([{'objectID': '1', 'name': 'foo'}])
+        self.loop.run_until_complete(asyncio.gather(
+            self.index.search_async('foo'),
+            self.index.search_async('bar', {'hitsPerPage': 5})))
+        with self.assertRaises(AlgoliaException):
+            self.index.get_object('missing')
+        self.transport.recorder = None
+        recorder.close()
+        return read_traffic(self.path)
+
+    def test_record(self):
+        entries = self.record()
+        self.assertEqual(len(entries), 4)
+        self.assertEqual([e['status'] for e in entries], [200, 200, 200, 404])
+        self.assertTrue(all(e['at'] >= 0 for e in entries))
+        self.assertTrue(all(e['elapsed'] > 0 for e in entries))
+
+        search = [e for e in entries if e['path'].endswith('/query')]
+        self.assertEqual(len(search), 2)
+        self.assertEqual(search[0]['method'], 'POST')
+        self.assertEqual(search[0]['path'], '/1/indexes/test/query')
+        self.assertEqual(search[0]['size'], len(search[0]['body']))
+
+    def test_buffering(self):
+        recorder = TrafficRecorder(self.path, flush_interval=60)
+        self.transport.recorder = recorder
+        self.index.search('foo')
+        self.assertEqual(recorder.count, 1)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        self.loop.run_until_complete(recorder.flush())
+        self.assertEqual(len(read_traffic(self.path)), 1)
+
+        recorder.max_buffer = 2
+        self.index.search('foo')
+        self.index.search('bar')
+        self.transport.recorder = None
+        recorder.close()
+        self.assertEqual(len(read_traffic(self.path)), 3)
+
+    def test_bodies_off_by_default(self):
+        recorder = TrafficRecorder(self.path)
+        self.transport.recorder = recorder
+        self.index.search('foo')
+        self.transport.recorder = None
+        recorder.close()
+        entries = read_traffic(self.path)
+        self.assertNotIn('body', entries[0])
+        self.assertGreater(entries[0]['size'], 0)
+
+    def test_api_keys_are_removed(self):
+        recorder = TrafficRecorder(self.path, bodies=True)
+        recorder.record('POST', '/1/indexes/test/query',
+                        {'X-Algolia-API-Key': 'secret', 'page': 1},
+                        '{"params":"query=foo","apiKey":"secret"}', True,
+                        recorder.started, 0.01, 200)
+        recorder.close()
+        with open(self.path) as f:
+            self.assertNotIn('secret', f.read())
+        entry = read_traffic(self.path)[0]
+        self.assertEqual(entry['params'], {'page': 1})
+        self.assertEqual(entry['body'], '{"params":"query=foo"}')
+
+    def test_record_without_bodies(self):
+        entries = self.record(bodies=False)
+        self.assertFalse(any('body' in e for e in entries))
+        self.assertEqual([e['size'] > 0 for e in entries],
+                         [True, True, True, False])
+
+    def test_replay(self):
+        entries = self.record()
+        self.server.requests = []
+        res = self.loop.run_until_complete(
+            replay_async(self.transport, self.path, speed=2))
+        self.assertEqual(res['requests'], 4)
+        self.assertEqual(res['errors'], {'404': 1})
+        self.assertEqual(res['replayed']['count'], 4)
+        self.assertEqual([(m, p) for _, m, p in self.server.requests],
+                         [(e['method'], e['path']) for e in entries])
+
+    def test_peak_concurrency(self):
+        self.assertEqual(peak_concurrency([]), 0)
+        self.assertEqual(peak_concurrency([(0, 1), (1, 2)]), 1)
+        self.assertEqual(peak_concurrency([(0, 3), (1, 2), (1.5, 4)]), 3)
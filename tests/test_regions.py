@@ -0,0 +1,88 @@
+import unittest
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.testing import HOST_DOWN, StubServer
+from algoliasearchasync.transport import DNS_TIMER_DELAY
+
+
+class RegionRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=4)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.transport = self.client._base._transport
+        self.transport.probe_rate = 0
+        self.index = self.client.init_index('test')
+        self.events = []
+        hosts = self.server.hosts
+        self.router = self.client.set_regions(
+            [('eu', hosts[:2]), ('us', hosts[2:3]), ('ap', hosts[3:])],
+            callback=self.events.append)
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def search_hosts(self):
+        hosts = [h for h, m, p in self.server.requests
+                 if p.endswith('/query')]
+        self.server.requests = []
+        return hosts
+
+    def test_local_reads(self):
+        for i in range(4):
+            self.index.search('')
+        self.assertTrue(set(self.search_hosts()) <= {0, 1})
+        stats = self.router.stats()
+        self.assertEqual(stats['active'], 'eu')
+        self.assertEqual(stats['failovers'], 0)
+        self.assertEqual(stats['cross_region_reads'], 0)
+        self.assertEqual(stats['regions']['eu']['answered'], 4)
+
+    def test_failover_and_back(self):
+        self.server.fail_host(0, HOST_DOWN)
+        self.server.fail_host(1, HOST_DOWN)
+        self.index.search('')
+        self.assertEqual(self.search_hosts(), [2])
+        self.index.search('')
+        self.assertEqual(self.search_hosts(), [2])
+        self.assertEqual([(e['from'], e['to']) for e in self.events],
+                         [('eu', 'us')])
+        ranking = self.client.host_ranking()
+        self.assertEqual([r['host'] for r in ranking[:2]],
+                         self.server.hosts[2:])
+
+        stats = self.router.stats()
+        self.assertEqual(stats['active'], 'us')
+        self.assertEqual(stats['cross_region_reads'], 2)
+        self.assertEqual(stats['regions']['eu']['errors'], 2)
+
+        self.server.restore_host(0)
+        self.transport._host_state(self.server.hosts[0]).failed_at -= \
+            DNS_TIMER_DELAY + 1
+        self.index.search('')
+        self.assertEqual(self.search_hosts(), [0])
+        self.assertEqual(self.events[-1]['to'], 'eu')
+        self.assertEqual(self.router.stats()['failovers'], 2)
+
+    def test_writes_are_not_routed(self):
+        self.client.set_regions([('eu', self.server.hosts[:2])],
+                                write_hosts=self.server.hosts[3:])
+        self.index.save_object({'objectID': '1'})
+        writes = [h for h, m, p in self.server.requests if m == 'PUT']
+        self.assertEqual(writes, [3])
+        self.assertEqual(self.transport.listeners.count(
+            self.transport.regions.observe), 1)
+
+    def test_local(self):
+        hosts = self.server.hosts
+        self.client.set_regions({'eu': hosts[:2], 'us': hosts[2:]},
+                                local='us')
+        self.index.search('')
+        self.assertIn(self.search_hosts()[0], {2, 3})
+        with self.assertRaises(AlgoliaException):
+            self.client.set_regions([('eu', hosts)], local='us')
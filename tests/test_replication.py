@@ -0,0 +1,166 @@
+import unittest
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.replication import ONE, QUORUM, ReplicatedIndex
+from algoliasearchasync.testing import HOST_ERROR, StubServer
+
+
+class ReplicatedIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.servers = [StubServer(hosts=1) for _ in range(3)]
+        self.clients = []
+        for i, server in enumerate(self.servers):
+            self.loop.run_until_complete(server.start())
+            self.clients.append(server.client('app%d' % i))
+
+    def tearDown(self):
+        for client, server in zip(self.clients, self.servers):
+            self.loop.run_until_complete(client.close())
+            self.loop.run_until_complete(server.close())
+
+    def replicated(self, n=2, **kwargs):
+        kwargs.setdefault('retry_interval', 0.01)
+        self.index = ReplicatedIndex(
+            [c.init_index('test') for c in self.clients[:n]], **kwargs)
+        return self.index
+
+    def records(self, i):
+        return self.servers[i].index('test').records
+
+    def test_write_all(self):
+        index = self.replicated()
+        res = index.save_objects([{'objectID': '1'}, {'objectID': '2'}])
+        self.assertEqual(len(res['taskIDs']), 2)
+        self.assertNotIn(None, res['taskIDs'])
+        index.wait_task(res['taskIDs'])
+        self.assertEqual(sorted(self.records(0)), ['1', '2'])
+        self.assertEqual(sorted(self.records(1)), ['1', '2'])
+
+    def test_reads_primary(self):
+        index = self.replicated()
+        index.save_object({'objectID': '1', 'name': 'one'})
+        self.servers[0].index('test').records['1']['name'] = 'primary'
+        self.assertEqual(index.get_object('1')['name'], 'primary')
+
+    def test_lagging_replica(self):
+        index = self.replicated(quorum=ONE)
+        self.servers[1].fail_host(0, HOST_ERROR)
+        for i in range(3):
+            res = index.save_object({'objectID': str(i), 'v': 1})
+            self.assertEqual(res['taskIDs'][1], None)
+        index.delete_object('0')
+        self.assertEqual(sorted(self.records(0)), ['1', '2'])
+        self.assertEqual(self.records(1), {})
+        self.assertEqual(index.status()[1]['lag'], 4)
+
+        self.servers[1].restore_host(0)
+        index.drain()
+        self.assertEqual(sorted(self.records(1)), ['1', '2'])
+        status = index.status()[1]
+        self.assertEqual(status['lag'], 0)
+        self.assertFalse(status['out_of_sync'])
+        # Only the first write was sent before the replica came back.
+        self.assertGreaterEqual(status['retries'], 1)
+
+    def test_quorum(self):
+        index = self.replicated(3, quorum=QUORUM)
+        self.servers[2].fail_host(0, HOST_ERROR)
+        res = index.save_object({'objectID': '1'})
+        self.assertEqual(res['taskIDs'][2], None)
+        self.assertEqual(len([t for t in res['taskIDs'] if t]), 2)
+
+    def test_quorum_waits_for_retries(self):
+        index = self.replicated()
+        self.servers[1].inject_error(500, count=1)
+
+        res = index.save_object({'objectID': '1'})
+        self.assertNotIn(None, res['taskIDs'])
+        self.assertIn('1', self.records(1))
+        self.assertEqual(index.status()[1]['retries'], 1)
+
+    def test_writes_stay_in_order(self):
+        index = self.replicated()
+        self.servers[1].inject_error(503, count=1)
+        writes = [asyncio.ensure_future(index.save_object_async(
+            {'objectID': '1', 'v': v})) for v in (1, 2)]
+        self.loop.run_until_complete(asyncio.gather(*writes))
+        self.assertEqual(self.records(0)['1']['v'], 2)
+        self.assertEqual(self.records(1)['1']['v'], 2)
+        self.assertEqual(index.status()[1]['retries'], 1)
+
+    def test_closed_with_client(self):
+        index = self.replicated(quorum=ONE)
+        self.servers[1].fail_host(0, HOST_ERROR)
+        index.save_object({'objectID': '1'})
+        workers = list(index.replicas[1]._tasks.values())
+        self.assertEqual(len(workers), 1)
+        self.loop.run_until_complete(self.clients[1].close())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertTrue(workers[0].cancelled())
+        self.assertEqual(index.status()[1]['lag'], 0)
+
+    def test_unrelated_writes_in_parallel(self):
+        index = self.replicated()
+        replica = index.replicas[1]
+        for object_id in ('1', '2', '1'):
+            replica.submit('save_object', ({'objectID': object_id},), {})
+        # The second write of object 1 waits for the first one.
+        self.assertEqual(len(replica._tasks), 2)
+        replica.submit('clear_index', (), {})
+        replica.submit('save_object', ({'objectID': '3'},), {})
+        self.assertEqual(len(replica._tasks), 2)
+        index.drain()
+        self.assertEqual(replica.lag, 0)
+        self.assertEqual(self.records(1), {'3': {'objectID': '3'}})
+
+    def test_retry_limit(self):
+        index = self.replicated(max_retries=2)
+        self.servers[1].fail_host(0, HOST_ERROR)
+        with self.assertRaisesRegexp(AlgoliaException, 'out of sync'):
+            index.save_object({'objectID': '1'})
+        status = index.status()[1]
+        self.assertTrue(status['out_of_sync'])
+        self.assertEqual(status['retries'], 2)
+        self.assertEqual(status['lag'], 0)
+
+    def test_delete_by_query(self):
+        index = self.replicated()
+        index.save_objects([{'objectID': str(i)} for i in range(3)])
+        index.delete_by_query('')
+        self.assertEqual(self.records(0), {})
+        self.assertEqual(self.records(1), {})
+
+    def test_unreplicated_writes(self):
+        index = self.replicated()
+        for method in ['replace_all_objects', 'import_objects',
+                       'save_objects_adaptive', 'import_synonyms',
+                       'import_rules', 'add_user_key']:
+            for name in (method, method + '_async'):
+                with self.subTest(name=name):
+                    with self.assertRaisesRegexp(AttributeError, name):
+                        getattr(index, name)
+
+    def test_errors(self):
+        index = self.replicated()
+        self.servers[0].inject_error(400, count=1)
+        self.servers[1].inject_error(400, count=1)
+        with self.assertRaises(AlgoliaException):
+            index.save_object({'objectID': '1'})
+        with self.assertRaises(AlgoliaException):
+            self.replicated(quorum=3)
+
+    def test_backlog(self):
+        index = self.replicated(quorum=ONE, max_backlog=2,
+                                retry_interval=10)
+        self.servers[1].fail_host(0, HOST_ERROR)
+        for i in range(3):
+            index.save_object({'objectID': str(i)})
+        status = index.status()[1]
+        self.assertTrue(status['out_of_sync'])
+        self.assertEqual(status['dropped'], 2)
+        self.assertEqual(status['lag'], 1)
+        self.loop.run_until_complete(index.close())
@@ -0,0 +1,167 @@
+import unittest
+
+import asyncio
+
+from algoliasearchasync.scheduler import (ADMIN, BACKGROUND, INTERACTIVE,
+                                          WRITE, RequestScheduler, classify)
+from algoliasearchasync.testing import StubServer
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.order = []
+
+    def run_requests(self, scheduler, classes, duration=0.01):
+        @asyncio.coroutine
+        def request(i, cls):
+            yield from scheduler.acquire(cls)
+            self.order.append((i, cls))
+            try:
+                yield from asyncio.sleep(duration)
+            finally:
+                scheduler.release(cls)
+
+        # Start the requests in order, `gather` does not guarantee it.
+        tasks = [asyncio.ensure_future(request(i, cls))
+                 for i, cls in enumerate(classes)]
+        return self.loop.run_until_complete(asyncio.gather(*tasks))
+
+    def test_classify(self):
+        self.assertEqual(classify('/1/indexes/a/query', 'POST', True),
+                         INTERACTIVE)
+        self.assertEqual(classify('/1/indexes/a/browse', 'POST', True),
+                         BACKGROUND)
+        self.assertEqual(classify('/1/indexes/a/batch', 'POST', False),
+                         WRITE)
+        self.assertEqual(classify('/1/indexes/a/b', 'DELETE', False), WRITE)
+        self.assertEqual(classify('/1/indexes/a', 'DELETE', False), ADMIN)
+        self.assertEqual(classify('/1/keys', 'GET', True), ADMIN)
+        self.assertEqual(classify('/1/indexes/a/operation', 'POST', False),
+                         ADMIN)
+        for path in ('/1/indexes/*/queries', '/1/indexes/a/facets/b/query'):
+            self.assertEqual(classify(path, 'POST', True), INTERACTIVE)
+        for meth, path in [('GET', '/1/indexes/a'),
+                           ('GET', '/1/indexes/a/b'),
+                           ('GET', '/1/indexes/task/b'),
+                           ('POST', '/1/indexes/*/objects')]:
+            self.assertEqual(classify(path, meth, True), INTERACTIVE)
+        for meth, path in [('GET', '/1/indexes/a/task/12'),
+                           ('GET', '/1/indexes/a/settings'),
+                           ('POST', '/1/indexes/a/synonyms/search'),
+                           ('POST', '/1/indexes/a/rules/search'),
+                           ('GET', '/1/logs')]:
+            self.assertEqual(classify(path, meth, True), BACKGROUND)
+        self.assertEqual(classify('/1/indexes/a/synonyms/batch', 'POST',
+                                  False), WRITE)
+
+    def test_budgets(self):
+        scheduler = RequestScheduler({BACKGROUND: 2})
+        peak = [0]
+
+        @asyncio.coroutine
+        def request():
+            yield from scheduler.acquire(BACKGROUND)
+            peak[0] = max(peak[0], scheduler.in_flight[BACKGROUND])
+            yield from asyncio.sleep(0.005)
+            scheduler.release(BACKGROUND)
+
+        self.loop.run_until_complete(asyncio.gather(
+            *[request() for _ in range(10)]))
+        self.assertEqual(peak[0], 2)
+        stats = scheduler.stats()[BACKGROUND]
+        self.assertEqual(stats['requests'], 10)
+        self.assertEqual(stats['queued'], 8)
+        self.assertEqual(stats['in_flight'], 0)
+        self.assertGreater(stats['p99_queue_ms'], 0)
+
+    def test_priorities(self):
+        scheduler = RequestScheduler({INTERACTIVE: 1, WRITE: 4,
+                                      BACKGROUND: 4}, total=2)
+        self.run_requests(scheduler, [BACKGROUND, BACKGROUND, BACKGROUND,
+                                      WRITE, INTERACTIVE, INTERACTIVE])
+        # One slot is reserved to interactive requests and writes go
+        # before background reads.
+        self.assertEqual([cls for _, cls in self.order],
+                         [BACKGROUND, INTERACTIVE, WRITE, INTERACTIVE,
+                          BACKGROUND, BACKGROUND])
+
+    def test_cancelled_waiter(self):
+        scheduler = RequestScheduler({WRITE: 1})
+        self.loop.run_until_complete(scheduler.acquire(WRITE))
+        waiter = asyncio.ensure_future(scheduler.acquire(WRITE))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        waiter.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        scheduler.release(WRITE)
+        self.assertEqual(scheduler.in_flight[WRITE], 0)
+        self.assertEqual(scheduler.stats()[WRITE]['waiting'], 0)
+
+
+class SchedulerTransportTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=1)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def test_interactive_requests_skip_bulk_queue(self):
+        scheduler = self.client.enable_scheduler({WRITE: 2})
+        index = self.client.init_index('test')
+        self.server.host_latency = {0: 0.02}
+
+        @asyncio.coroutine
+        def scenario():
+            writes = [asyncio.ensure_future(
+                index.save_object_async({'objectID': str(i)}))
+                for i in range(20)]
+            yield from asyncio.sleep(0.005)
+            yield from index.search_async('')
+            done = len([w for w in writes if w.done()])
+            yield from asyncio.gather(*writes)
+            return done
+
+        done = self.loop.run_until_complete(scenario())
+        self.assertLess(done, 6)
+        stats = scheduler.stats()
+        self.assertEqual(stats[WRITE]['requests'], 20)
+        self.assertEqual(stats[WRITE]['queued'], 18)
+        self.assertEqual(stats[INTERACTIVE]['queued'], 0)
+
+    def test_object_reads_skip_browse_queue(self):
+        scheduler = self.client.enable_scheduler()
+        index = self.client.init_index('test')
+        for i in range(3):
+            self.server.index('test').records[str(i)] = {'objectID': str(i)}
+        self.server.host_latency = {0: 0.02}
+
+        @asyncio.coroutine
+        def scenario():
+            browses = [asyncio.ensure_future(index.browse_from_async({}))
+                       for _ in range(12)]
+            yield from asyncio.sleep(0.005)
+            yield from index.get_object_async('1')
+            done = len([b for b in browses if b.done()])
+            yield from index.get_objects_async(['0', '2'])
+            yield from asyncio.gather(*browses)
+            return done
+
+        done = self.loop.run_until_complete(scenario())
+        self.assertLess(done, 8)
+        stats = scheduler.stats()
+        self.assertEqual(stats[BACKGROUND]['queued'], 8)
+        self.assertEqual(stats[INTERACTIVE]['requests'], 2)
+        self.assertEqual(stats[INTERACTIVE]['queued'], 0)
+
+    def test_task_polling_is_background(self):
+        scheduler = self.client.enable_scheduler()
+        index = self.client.init_index('test')
+        task = index.save_object({'objectID': '1'})
+        index.wait_task(task['taskID'])
+        stats = scheduler.stats()
+        self.assertEqual(stats[INTERACTIVE]['requests'], 0)
+        self.assertEqual(stats[BACKGROUND]['requests'], 1)
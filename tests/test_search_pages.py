@@ -0,0 +1,111 @@
+import unittest
+
+import asyncio
+
+from algoliasearchasync.index import SearchPagesIterator
+from algoliasearchasync.testing import StubServer
+
+
+class PagedIndex(object):
+    """Index double serving `nb_hits` hits and tracking concurrency."""
+
+    def __init__(self, nb_hits, per_page=10, delay=0.01):
+        self.nb_hits = nb_hits
+        self.per_page = per_page
+        self.delay = delay
+        self.pages = []
+        self.cancelled = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @asyncio.coroutine
+    def search_async(self, query, params):
+        page = params['page']
+        self.pages.append(page)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            yield from asyncio.sleep(self.delay * (3 - page % 3))
+        except asyncio.CancelledError:
+            self.cancelled.append(page)
+            raise
+        finally:
+            self.in_flight -= 1
+        start = page * self.per_page
+        end = min(start + self.per_page, self.nb_hits)
+        return {
+            'hits': [{'objectID': str(i)} for i in range(start, end)],
+            'nbHits': self.nb_hits,
+            'nbPages': (self.nb_hits + self.per_page - 1) // self.per_page,
+            'page': page,
+        }
+
+
+@asyncio.coroutine
+def consume(it, limit=None):
+    it = yield from it.__aiter__()
+    hits = []
+    while limit is None or len(hits) < limit:
+        try:
+            hits.append((yield from it.__anext__()))
+        except StopAsyncIteration:
+            break
+    return hits
+
+
+class SearchPagesTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+
+    def run_iter(self, index, limit=None, **kwargs):
+        it = SearchPagesIterator(index, 'query', **kwargs)
+        return it, self.loop.run_until_complete(consume(it, limit))
+
+    def test_hits_are_in_order(self):
+        index = PagedIndex(95)
+        it, hits = self.run_iter(index, prefetch=4)
+        self.assertEqual([h['objectID'] for h in hits],
+                         [str(i) for i in range(95)])
+        self.assertEqual(sorted(index.pages), list(range(10)))
+        self.assertEqual(it.nb_pages, 10)
+
+    def test_prefetch_is_bounded(self):
+        index = PagedIndex(200)
+        self.run_iter(index, prefetch=3)
+        self.assertEqual(index.max_in_flight, 3)
+
+    def test_start_page_and_max_pages(self):
+        index = PagedIndex(100)
+        _, hits = self.run_iter(index, params={'page': 2}, max_pages=3)
+        self.assertEqual([h['objectID'] for h in hits],
+                         [str(i) for i in range(20, 50)])
+
+    def test_no_hits(self):
+        _, hits = self.run_iter(PagedIndex(0))
+        self.assertEqual(hits, [])
+
+    def test_close_cancels_fetches(self):
+        index = PagedIndex(200)
+        it, hits = self.run_iter(index, limit=5, prefetch=4)
+        self.assertEqual(len(index.pages), 5)
+        it.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(sorted(index.cancelled), [1, 2, 3, 4])
+        self.assertEqual(self.loop.run_until_complete(consume(it)), [])
+
+    def test_stub_server(self):
+        server = StubServer(hosts=1)
+        self.loop.run_until_complete(server.start())
+        client = server.client()
+        try:
+            index = client.init_index('test')
+            task = index.save_objects([{'objectID': str(i), 'n': i}
+                                       for i in range(250)])
+            index.wait_task(task['taskID'])
+            it = index.search_pages('', {'hitsPerPage': 20})
+            hits = self.loop.run_until_complete(consume(it))
+            self.assertEqual(len(hits), 250)
+            self.assertEqual(len(set(h['objectID'] for h in hits)), 250)
+        finally:
+            self.loop.run_until_complete(client.close())
+            self.loop.run_until_complete(server.close())
@@ -0,0 +1,109 @@
+import unittest
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.testing import HOST_DOWN, StubServer
+
+RECORDS = [
+    {'objectID': '1', 'title': 'Home', 'section': 'nav', 'lang': 'en'},
+    {'objectID': '2', 'title': 'Help center', 'section': 'nav',
+     'lang': 'fr'},
+    {'objectID': '3', 'title': 'Holiday settings', 'section': 'config',
+     'lang': 'en'},
+]
+
+
+class LocalSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=2)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.index = self.client.init_index('nav')
+        for record in RECORDS:
+            self.server.index('nav').records[record['objectID']] = \
+                dict(record)
+        self.snapshot = self.index.enable_snapshot(interval=60)
+        self.snapshot.refresh()
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.snapshot.close())
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def fail_hosts(self):
+        self.server.fail_host(0, HOST_DOWN)
+        self.server.fail_host(1, HOST_DOWN)
+
+    def test_served_by_api_while_reachable(self):
+        self.assertEqual(len(self.snapshot), 3)
+        res = self.index.search('ho')
+        self.assertNotIn('servedFromSnapshot', res)
+        self.assertNotIn('_servedFromSnapshot', self.index.get_object('1'))
+
+    def test_search_fallback(self):
+        self.fail_hosts()
+        res = self.index.search('ho')
+        self.assertTrue(res['servedFromSnapshot'])
+        self.assertEqual([h['objectID'] for h in res['hits']], ['1', '3'])
+
+        res = self.index.search('h', {'facetFilters': ['section:nav'],
+                                      'facets': ['lang'], 'hitsPerPage': 1})
+        self.assertEqual(res['nbHits'], 2)
+        self.assertEqual(res['nbPages'], 2)
+        self.assertEqual(res['facets'], {'lang': {'en': 1, 'fr': 1}})
+
+        res = self.index.search('', {'filters': 'section:nav AND NOT lang:fr',
+                                     'attributesToRetrieve': ['title']})
+        self.assertEqual(res['hits'], [{'objectID': '1', 'title': 'Home'}])
+        self.assertEqual(self.snapshot.stats['searches'], 3)
+
+    def test_unsupported_search(self):
+        self.fail_hosts()
+        with self.assertRaisesRegexp(AlgoliaException, 'Unreachable'):
+            self.index.search('', {'filters': 'price > 10'})
+        with self.assertRaisesRegexp(AlgoliaException, 'Unreachable'):
+            self.index.search('', {'aroundLatLng': '48.8,2.3'})
+        self.assertEqual(self.snapshot.stats['refused'], 2)
+
+    def test_get_object_fallback(self):
+        self.fail_hosts()
+        obj = self.index.get_object('2')
+        self.assertEqual(obj['title'], 'Help center')
+        self.assertTrue(obj['_servedFromSnapshot'])
+        with self.assertRaises(AlgoliaException) as cm:
+            self.index.get_object('4')
+        self.assertEqual(cm.exception.status, 404)
+
+    def test_api_errors_are_not_hidden(self):
+        self.server.inject_error(400, count=1, path='/query')
+        with self.assertRaises(AlgoliaException) as cm:
+            self.index.search('ho')
+        self.assertEqual(cm.exception.status, 400)
+
+    def test_failed_refresh_keeps_snapshot(self):
+        self.server.index('nav').records.pop('1')
+        self.fail_hosts()
+        with self.assertRaises(AlgoliaException):
+            self.snapshot.refresh()
+        self.assertEqual(len(self.snapshot), 3)
+        self.assertEqual(self.snapshot.stats['errors'], 1)
+
+        for i in range(2):
+            self.server.restore_host(i)
+        self.snapshot.refresh()
+        self.assertEqual(len(self.snapshot), 2)
+
+    def test_closed_with_client(self):
+        worker = self.snapshot._worker
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertTrue(worker.cancelled())
+        self.assertEqual(self.client._base._transport.closables, [])
+
+    def test_max_records(self):
+        self.snapshot.max_records = 2
+        with self.assertRaisesRegexp(AlgoliaException, 'too many'):
+            self.snapshot.refresh()
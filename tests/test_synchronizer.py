@@ -0,0 +1,102 @@
+import unittest
+
+import asyncio
+
+from algoliasearchasync.synchronizer import (IndexSynchronizer,
+                                             MemoryHashStore, SQLiteHashStore)
+
+
+class RecordingIndex(object):
+    """Index double recording the batches it receives."""
+
+    def __init__(self, records=None):
+        self.batches = []
+        self.records = records or []
+
+    @asyncio.coroutine
+    def browse_from_async(self, params, cursor):
+        return {'hits': self.records}
+
+    @asyncio.coroutine
+    def batch_async(self, requests):
+        self.batches.append(requests['requests'])
+        return {'taskID': len(self.batches)}
+
+
+class SynchronizerTest(unittest.TestCase):
+    def make_store(self):
+        return MemoryHashStore()
+
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.index = RecordingIndex()
+        self.store = self.make_store()
+        self.sync = IndexSynchronizer(self.index, self.store, batch_size=2)
+        self.records = [
+            {'objectID': '1', 'name': 'foo', 'tags': ['a']},
+            {'objectID': '2', 'name': 'bar', 'tags': ['b']},
+            {'objectID': '3', 'name': 'baz', 'tags': ['c']},
+        ]
+
+    def tearDown(self):
+        self.store.close()
+
+    def run_sync(self, records):
+        self.index.batches = []
+        return self.loop.run_until_complete(self.sync.sync_async(records))
+
+    def operations(self):
+        return [op for batch in self.index.batches for op in batch]
+
+    def test_first_sync_sends_everything(self):
+        res = self.run_sync(self.records)
+        self.assertEqual(res['updateObject'], 3)
+        self.assertEqual(len(self.index.batches), 2)
+        self.assertEqual(sorted(res['taskIDs']), [1, 2])
+
+    def test_unchanged_records_are_skipped(self):
+        self.run_sync(self.records)
+        res = self.run_sync(self.records)
+        self.assertEqual(self.index.batches, [])
+        self.assertEqual(res['taskIDs'], [])
+
+    def test_changed_attributes_are_partially_updated(self):
+        self.run_sync(self.records)
+        records = [dict(r) for r in self.records]
+        records[1]['name'] = 'qux'
+        self.run_sync(records)
+        self.assertEqual(self.operations(), [{
+            'action': 'partialUpdateObject',
+            'objectID': '2',
+            'body': {'objectID': '2', 'name': 'qux'},
+        }])
+
+    def test_removed_attribute_triggers_full_update(self):
+        self.run_sync(self.records)
+        records = [dict(r) for r in self.records]
+        del records[0]['tags']
+        self.run_sync(records)
+        ops = self.operations()
+        self.assertEqual(len(ops), 1)
+        self.assertEqual(ops[0]['action'], 'updateObject')
+        self.assertEqual(ops[0]['body'], records[0])
+
+    def test_missing_records_are_deleted(self):
+        self.run_sync(self.records)
+        res = self.run_sync(self.records[:2])
+        self.assertEqual(self.operations(),
+                         [{'action': 'deleteObject', 'objectID': '3'}])
+        self.assertEqual(res['deleteObject'], 1)
+        self.assertNotIn('3', self.store.load())
+
+    def test_seed_from_index(self):
+        self.index.records = self.records
+        self.loop.run_until_complete(self.sync.seed_async())
+        self.assertEqual(sorted(self.store.load()), ['1', '2', '3'])
+        self.run_sync(self.records)
+        self.assertEqual(self.index.batches, [])
+
+
+class SQLiteSynchronizerTest(SynchronizerTest):
+    def make_store(self):
+        return SQLiteHashStore(':memory:')
@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import asyncio
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.testing import (HOST_BLACKHOLE, HOST_DOWN, HOST_ERROR,
+                                        StubServer)
+
+
+class StubServerTest(unittest.TestCase):
+    """Tests running the client against the offline stub server."""
+
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=3)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.index = self.client.init_index('contacts')
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def add_contacts(self):
+        task = self.index.save_objects([
+            {'objectID': '1', 'name': 'Joe Smith', 'city': 'Paris'},
+            {'objectID': '2', 'name': 'Jane Doe', 'city': 'London'},
+            {'objectID': '3', 'name': 'John Doe', 'city': 'Paris'},
+        ])
+        self.index.wait_task(task['taskID'])
+
+    def test_objects(self):
+        self.add_contacts()
+        self.assertEqual(self.index.get_object('2')['name'], 'Jane Doe')
+        res = self.index.get_objects(['3', '1'])
+        self.assertEqual([r['objectID'] for r in res['results']], ['3', '1'])
+
+        self.index.partial_update_object({'objectID': '2', 'city': 'Rome'})
+        self.assertEqual(self.index.get_object('2')['city'], 'Rome')
+
+        self.index.delete_object('2')
+        with self.assertRaisesRegexp(AlgoliaException, 'does not exist'):
+            self.index.get_object('2')
+
+    def test_search(self):
+        self.add_contacts()
+        res = self.index.search('doe')
+        self.assertEqual(res['nbHits'], 2)
+
+        res = self.index.search('', {'hitsPerPage': 2, 'page': 1,
+                                     'facets': ['city']})
+        self.assertEqual(res['nbPages'], 2)
+        self.assertEqual(len(res['hits']), 1)
+        self.assertEqual(res['facets']['city'], {'Paris': 2, 'London': 1})
+
+        res = self.index.search('', {'facetFilters': ['city:Paris']})
+        self.assertEqual(res['nbHits'], 2)
+
+    def test_browse(self):
+        self.add_contacts()
+
+        @asyncio.coroutine
+        def browse():
+            it = self.index.browse_all_async({'hitsPerPage': 2})
+            it = yield from it.__aiter__()
+            ids = []
+            try:
+                while True:
+                    ids.append((yield from it.__anext__())['objectID'])
+            except StopAsyncIteration:
+                return ids
+
+        self.assertEqual(self.loop.run_until_complete(browse()),
+                         ['1', '2', '3'])
+
+    def test_settings_and_indexes(self):
+        self.index.set_settings({'hitsPerPage': 5})
+        self.assertEqual(self.index.get_settings()['hitsPerPage'], 5)
+        self.client.copy_index('contacts', 'contacts_copy')
+        names = [i['name'] for i in self.client.list_indexes()['items']]
+        self.assertEqual(names, ['contacts', 'contacts_copy'])
+        self.client.delete_index('contacts_copy')
+        names = [i['name'] for i in self.client.list_indexes()['items']]
+        self.assertEqual(names, ['contacts'])
+
+    def test_keys(self):
+        key = self.client.add_user_key(['search'])['key']
+        self.assertEqual(self.client.get_user_key_acl(key)['acl'], ['search'])
+        self.client.delete_user_key(key)
+        with self.assertRaises(AlgoliaException):
+            self.client.get_user_key_acl(key)
+
+    def test_failover(self):
+        self.add_contacts()
+        for mode in [HOST_DOWN, HOST_ERROR]:
+            self.server.fail_host(0, mode)
+            self.server.fail_host(1, mode)
+            self.assertEqual(self.index.search('')['nbHits'], 3)
+            self.server.restore_host(0)
+            self.server.restore_host(1)
+
+    def test_blackhole(self):
+        self.client.search_timeout = 0.2
+        self.server.fail_host(0, HOST_BLACKHOLE)
+        self.server.fail_host(1, HOST_BLACKHOLE)
+        start = time.time()
+        self.assertEqual(self.index.search('')['nbHits'], 0)
+        self.assertLess(time.time() - start, 1)
+
+    def test_inject_error(self):
+        self.server.inject_error(status=400, message='Invalid query')
+        with self.assertRaisesRegexp(AlgoliaException, 'Invalid query'):
+            self.index.search('')
+        self.assertEqual(self.index.search('')['nbHits'], 0)
+
+    def test_latency(self):
+        self.server.latency = 0.1
+        start = time.time()
+        self.index.search('')
+        self.assertGreaterEqual(time.time() - start, 0.1)
+
+    def test_fixtures(self):
+        self.add_contacts()
+        self.server.responses.append({
+            'method': 'GET', 'path': '/1/isalive', 'body': {'message': 'ok'}
+        })
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'fixtures.json')
+            self.server.dump_fixtures(path)
+            server = StubServer(fixtures=path)
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(len(server.indexes['contacts'].records), 3)
+        self.assertEqual(len(server.responses), 1)
@@ -0,0 +1,261 @@
+import os
+import random
+import subprocess
+import sys
+import unittest
+
+import asyncio
+
+from algoliasearch.client import RequestOptions
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync import ClientAsync
+from algoliasearchasync.testing import HOST_DOWN, StubServer
+from algoliasearchasync.transport import BaseTransport, Transport
+
+
+class FakeTransport(BaseTransport):
+    """Transport answering from memory, failing on the hosts in `down`."""
+
+    def __init__(self):
+        self.sent = []
+        self.timeouts = []
+        self.down = set()
+        super(FakeTransport, self).__init__(False)
+
+    def _init_session(self):
+        pass
+
+    @asyncio.coroutine
+    def close(self):
+        pass
+
+    @asyncio.coroutine
+    def _send(self, url, meth, params, data, headers, timeout,
+              conn_timeout):
+        self.sent.append((url, meth, headers))
+        self.timeouts.append((timeout, conn_timeout))
+        if any(url.startswith('https://%s/' % h) for h in self.down):
+            raise ConnectionError('down')
+        if '/missing/' in url:
+            raise AlgoliaException('Index does not exist')
+        return {'hits': [], 'nbHits': 0}
+
+
+class TransportTest(unittest.TestCase):
+    """Tests of the transport's host selection against the stub server."""
+
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=3)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.transport = self.client._base._transport
+        self.transport.probe_rate = 0
+        self.index = self.client.init_index('test')
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def search_hosts(self):
+        return [h for h, m, p in self.server.requests if p.endswith('/query')]
+
+    def test_fastest_host_is_preferred(self):
+        hosts = self.server.hosts
+        self.server.host_latency = {0: 0.05, 1: 0.05}
+        self.transport.probe_rate = 1
+        random.seed(42)
+        for i in range(10):
+            self.index.search('')
+
+        ranking = self.client.host_ranking()
+        self.assertEqual(ranking[0]['host'], hosts[2])
+        self.assertLess(ranking[0]['ewma_ms'], ranking[1]['ewma_ms'])
+
+        self.transport.probe_rate = 0
+        self.server.requests = []
+        for i in range(5):
+            self.index.search('')
+        self.assertEqual(self.search_hosts(), [2] * 5)
+
+    def test_failed_host_is_tried_last(self):
+        self.server.fail_host(0, HOST_DOWN)
+        self.index.search('')
+        ranking = self.client.host_ranking()
+        self.assertEqual(ranking[-1]['host'], self.server.hosts[0])
+        self.assertFalse(ranking[-1]['healthy'])
+
+        self.server.requests = []
+        self.index.search('')
+        self.assertEqual(self.search_hosts(), [1])
+
+    def test_writes_keep_host_order(self):
+        self.server.host_latency = {0: 0.05}
+        self.index.search('')
+        self.index.save_object({'objectID': '1'})
+        writes = [h for h, m, p in self.server.requests if m == 'PUT']
+        self.assertEqual(writes, [0])
+
+
+class CustomTransportTest(unittest.TestCase):
+    """Tests of a transport implementing only the HTTP exchange."""
+
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.transport = FakeTransport()
+        self.transport.latency_routing = False
+        self.attempts = []
+        self.transport.listeners.append(
+            lambda *args: self.attempts.append(args))
+        self.client = ClientAsync('app', 'key', ['a', 'b', 'c'],
+                                  transport=self.transport)
+        self.index = self.client.init_index('test')
+
+    def test_client_uses_transport(self):
+        self.assertEqual(self.index.search('')['nbHits'], 0)
+        url, meth, headers = self.transport.sent[0]
+        self.assertEqual(url, 'https://a/1/indexes/test/query')
+        self.assertEqual(meth, 'POST')
+        self.assertIn('async', headers['User-Agent'])
+
+    def test_retries_are_shared(self):
+        self.transport.down = {'a', 'b'}
+        self.index.search('')
+        self.assertEqual([e[0] for e in self.attempts], ['a', 'b', 'c'])
+        self.assertIsInstance(self.attempts[0][4], ConnectionError)
+        self.assertIsNone(self.attempts[2][4])
+
+    def test_timeouts_grow_on_last_hosts(self):
+        self.transport.down = {'a', 'b'}
+        self.index.search('')
+        self.assertEqual(self.transport.timeouts, [(5, 2), (5, 2), (15, 4)])
+        self.assertEqual(self.transport.conn_timeout, 2)
+
+    def test_api_errors_are_not_retried(self):
+        index = self.client.init_index('missing')
+        with self.assertRaises(AlgoliaException):
+            index.search('')
+        self.assertEqual(len(self.transport.sent), 1)
+
+    def test_request_options_headers(self):
+        options = RequestOptions({'forwardedFor': '1.2.3.4'})
+        self.index.search('', request_options=options)
+        headers = self.transport.sent[0][2]
+        self.assertEqual(headers['X-Forwarded-For'], '1.2.3.4')
+
+
+class LazyStartupTest(unittest.TestCase):
+    """Tests keeping the startup of short-lived processes cheap."""
+
+    def test_session_created_on_first_request(self):
+        transport = FakeTransport()
+        client = ClientAsync('app', 'key', ['a'], transport=transport)
+        self.assertIsNone(transport.session)
+        client.init_index('test').search('')
+        self.assertEqual(len(transport.sent), 1)
+
+    def test_import_defers_optional_modules(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        out = subprocess.check_output([sys.executable, '-c', (
+            'import sys, algoliasearchasync\n'
+            'algoliasearchasync.ClientAsync("app", "key").init_index("test")\n'
+            'print(sorted(m for m in sys.modules if m == "aiohttp" or\n'
+            '             m.startswith("algoliasearchasync.")))')], cwd=root)
+        self.assertEqual(eval(out.decode()), [
+            'algoliasearchasync.circuit', 'algoliasearchasync.client',
+            'algoliasearchasync.helpers', 'algoliasearchasync.index',
+            'algoliasearchasync.transport', 'algoliasearchasync.version'])
+
+    def test_aiohttp_session(self):
+        loop = asyncio.get_event_loop()
+        server = StubServer(hosts=1)
+        loop.run_until_complete(server.start())
+        client = server.client()
+        transport = client._base._transport
+        try:
+            self.assertIsNone(transport.session)
+            client.init_index('test').search('')
+            session = transport.session
+            self.assertIsNotNone(session)
+            # Modules are only imported with the session.
+            modules = {m: sys.modules[m] for m in ('aiohttp', 'async_timeout')}
+            sys.modules.update(dict.fromkeys(modules))
+            try:
+                client.init_index('test').search('')
+            finally:
+                sys.modules.update(modules)
+            self.assertIs(transport.session, session)
+        finally:
+            loop.run_until_complete(client.close())
+            loop.run_until_complete(server.close())
+
+    def test_escalated_conn_timeout_without_client_timeout(self):
+        # aiohttp before 3.3 only takes a connect timeout per session.
+        class OldTransport(Transport):
+            def _per_request_timeouts(self):
+                return False
+
+        loop = asyncio.get_event_loop()
+        server = StubServer(hosts=3)
+        loop.run_until_complete(server.start())
+        server.fail_host(0, HOST_DOWN)
+        server.fail_host(1, HOST_DOWN)
+        transport = OldTransport(True)
+        client = server.client(transport=transport)
+        transport.latency_routing = False
+        try:
+            client.init_index('test').search('')
+            self.assertEqual(list(transport._sessions), [4])
+            self.assertEqual(len(server.requests), 1)
+        finally:
+            loop.run_until_complete(client.close())
+            loop.run_until_complete(server.close())
+        self.assertEqual(transport._sessions, {})
+
+
+class Http2TransportTest(unittest.TestCase):
+    """Tests of the HTTP/2 transport against the stub server."""
+
+    def setUp(self):
+        try:
+            import h2  # noqa
+            import httpx  # noqa
+        except ImportError:
+            self.skipTest('httpx[http2] is not installed')
+
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=3, http2=True)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client(http2=True)
+        self.index = self.client.init_index('test')
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def test_requests_are_multiplexed(self):
+        task = self.index.save_objects([{'objectID': str(i), 'n': i}
+                                        for i in range(2000)])
+        self.index.wait_task(task['taskID'])
+        self.server.connections.clear()
+
+        searches = [self.index.search_async('', {'hitsPerPage': 1000})
+                    for _ in range(50)]
+        res = self.loop.run_until_complete(asyncio.gather(*searches))
+        self.assertEqual([r['nbHits'] for r in res], [2000] * 50)
+        # A single connection per host, the latency probes may reach others.
+        hosts = [host for host, _ in self.server.connections]
+        self.assertEqual(len(hosts), len(set(hosts)))
+
+    def test_failover(self):
+        self.server.fail_host(0)
+        self.server.fail_host(1)
+        self.assertEqual(self.index.search('')['nbHits'], 0)
+
+    def test_errors(self):
+        self.server.inject_error(status=404, message='Index does not exist')
+        with self.assertRaisesRegexp(AlgoliaException,
+                                     'Index does not exist') as cm:
+            self.index.search('')
+        self.assertEqual(cm.exception.status, 404)
@@ -0,0 +1,139 @@
+import unittest
+
+import asyncio
+
+from algoliasearch.helpers import AlgoliaException
+
+from algoliasearchasync.testing import StubServer
+from algoliasearchasync.transport import api_error
+from algoliasearchasync.writer import AdaptiveBatchWriter
+
+
+def make_records(n, size=10):
+    return [{'objectID': str(i), 'text': 'x' * size} for i in range(n)]
+
+
+class LatencyIndex(object):
+    """Index double answering batches after a delay growing with their size."""
+
+    def __init__(self, per_record=0.0001, errors=None):
+        self.per_record = per_record
+        self.errors = list(errors or [])
+        self.sizes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @asyncio.coroutine
+    def batch_async(self, requests):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            count = len(requests['requests'])
+            yield from asyncio.sleep(self.per_record * count)
+            if self.errors:
+                raise self.errors.pop(0)
+            self.sizes.append(count)
+            return {'taskID': len(self.sizes)}
+        finally:
+            self.in_flight -= 1
+
+
+class AdaptiveBatchWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+
+    def run_writer(self, index, records, **kwargs):
+        writer = AdaptiveBatchWriter(index, **kwargs)
+        return self.loop.run_until_complete(writer.run_async(records))
+
+    def test_grows_while_fast(self):
+        index = LatencyIndex()
+        res = self.run_writer(index, make_records(5000), batch_size=100,
+                              concurrency=1, increase=50)
+        self.assertEqual(res['objects'], 5000)
+        self.assertEqual(sum(index.sizes), 5000)
+        self.assertGreater(res['batch_size'], 100)
+        self.assertGreater(res['concurrency'], 1)
+        self.assertGreater(res['best']['objects_per_second'], 0)
+        self.assertEqual(len(res['taskIDs']), res['batches'])
+
+    def test_shrinks_when_slow(self):
+        index = LatencyIndex(per_record=0.001)
+        res = self.run_writer(index, make_records(600), batch_size=200,
+                              concurrency=1, target_latency=0.05,
+                              increase=10)
+        self.assertEqual(res['objects'], 600)
+        self.assertEqual(index.sizes[:2], [200, 100])
+        self.assertLess(res['batch_size'], 100)
+
+    def test_throttled(self):
+        index = LatencyIndex(errors=[api_error(429, 'Too many requests')])
+        res = self.run_writer(index, make_records(100), batch_size=10,
+                              concurrency=4, max_concurrency=4, increase=0,
+                              backoff=0.01)
+        self.assertEqual(res['objects'], 100)
+        self.assertEqual(res['errors'], {'429': 1})
+        self.assertEqual(res['retries'], 1)
+        self.assertEqual(sorted(index.sizes), [10] * 10)
+
+    def test_unreachable(self):
+        index = LatencyIndex(errors=[AlgoliaException('Unreachable hosts')])
+        res = self.run_writer(index, make_records(100), batch_size=40,
+                              concurrency=2, increase=0, backoff=0.01)
+        self.assertEqual(res['objects'], 100)
+        self.assertEqual(res['errors'], {'unreachable': 1})
+        self.assertEqual(res['batch_size'], 20)
+
+    def test_gives_up(self):
+        index = LatencyIndex(errors=[api_error(429, 'Too many requests')] * 3)
+        with self.assertRaises(AlgoliaException):
+            self.run_writer(index, make_records(10), max_retries=2,
+                            backoff=0.01)
+
+    def test_other_errors_raise(self):
+        index = LatencyIndex(errors=[api_error(400, 'Bad request')])
+        with self.assertRaises(AlgoliaException):
+            self.run_writer(index, make_records(10))
+        self.assertEqual(index.sizes, [])
+
+    def test_requires_object_ids(self):
+        with self.assertRaises(AlgoliaException):
+            self.run_writer(LatencyIndex(), [{'text': 'x'}])
+
+    def test_progress(self):
+        progress = []
+        self.run_writer(LatencyIndex(), make_records(30), batch_size=10,
+                        increase=0, progress=progress.append)
+        self.assertEqual(len(progress), 3)
+        self.assertEqual(progress[-1]['objects'], 30)
+
+
+class AdaptiveBatchWriterStubTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.server = StubServer(hosts=1, max_body_size=50000)
+        self.loop.run_until_complete(self.server.start())
+        self.client = self.server.client()
+        self.index = self.client.init_index('test')
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+
+    def test_splits_too_large_batches(self):
+        records = make_records(200, size=1000)
+        res = self.index.save_objects_adaptive(
+            records, batch_size=200, max_bytes=10 ** 7, backoff=0.01,
+            wait=True)
+        self.assertEqual(res['objects'], 200)
+        self.assertIn('413', res['errors'])
+        self.assertLess(res['max_bytes'], 50000)
+        self.assertEqual(len(self.server.index('test').records), 200)
+
+    def test_throttled(self):
+        self.server.inject_error(429, count=2, path='/batch')
+        res = self.index.save_objects_adaptive(
+            make_records(100), batch_size=10, concurrency=4, backoff=0.01)
+        self.assertEqual(res['errors'], {'429': 2})
+        self.assertEqual(res['objects'], 100)
+        self.assertEqual(len(self.server.index('test').records), 100)